@@ -0,0 +1,826 @@
+# smartctrlv_backend.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 系统后端抽象层
+- Backend：剪贴板 / 前台窗口与进程 / Explorer 文件夹与选中项 / 按键注入 / 消息框 的统一接口
+- Win32Backend：真实 Windows 实现（win32gui / comtypes / keyboard / pyperclip / mouse）
+- FakeBackend：纯内存、确定性的假后端，不依赖任何桌面环境，
+  可以在 Linux 上无头驱动整个 Ctrl+V 决策流程（压测 / 延迟测试）
+
+smartctrlv_main 里的业务逻辑只通过 get_backend() 访问系统，不再直接 import win32 模块。
+"""
+
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+from smartctrlv_log import get_logger
+
+log = get_logger("SmartCtrlV")
+
+
+# 消息框返回值（与 MB_YESNOCANCEL 的三个按钮一一对应）
+ANSWER_YES = "yes"
+ANSWER_NO = "no"
+ANSWER_CANCEL = "cancel"
+
+# get_clipboard_formats 返回的格式名
+CLIP_FORMAT_TEXT = "text"
+CLIP_FORMAT_FILE_DROP = "file_drop"
+
+
+# ===================== Shell 窗口（COM 对象）工具 =====================
+# 只依赖属性访问，假的 shell 窗口对象也能用
+
+def find_shell_windows(shell, hwnd):
+    """
+    shell.Windows() 里所有 HWND 等于 hwnd 的窗口（Explorer 标签页共用一个 HWND）。
+    shell.Windows() 本身出错（COM 对象已断开）时直接抛出，让调用方重建对象。
+    """
+    matches = []
+    for window in shell.Windows():
+        try:
+            if window and window.HWND == hwnd:
+                matches.append(window)
+        except Exception:
+            continue
+    return matches
+
+
+def explorer_folder_path(windows):
+    """依次试每个窗口，第一个拿得到路径的为准"""
+    for window in windows:
+        path = shell_window_folder_path(window)
+        if path:
+            return path
+    return None
+
+
+def explorer_selected_paths(windows, default=()):
+    """第一个能读到 Document 的窗口的选中项；都读不到返回 default（默认空列表）"""
+    for window in windows:
+        paths = shell_window_selected_paths(window)
+        if paths is not None:
+            return paths
+    return list(default) if default is not None else None
+
+
+def shell_window_folder_path(window):
+    """Shell 窗口当前文件夹：先 Document.Folder.Self.Path，再 LocationURL 兜底"""
+    if window is None:
+        return None
+
+    # 1) Document.Folder.Self.Path
+    try:
+        doc = getattr(window, "Document", None)
+        if doc is not None:
+            folder = getattr(doc, "Folder", None)
+            if folder is not None:
+                self_item = getattr(folder, "Self", None)
+                if self_item is not None:
+                    path = getattr(self_item, "Path", None)
+                    if path:
+                        return path
+    except Exception:
+        pass
+
+    # 2) LocationURL 兜底
+    try:
+        loc = getattr(window, "LocationURL", None)
+        path2 = _convert_location_url_to_path(loc) if loc else None
+        if path2:
+            return path2
+    except Exception:
+        pass
+
+    return None
+
+
+def shell_window_selected_paths(window):
+    """Shell 窗口里选中项的路径列表；读不到 Document 返回 None"""
+    if window is None:
+        return None
+    try:
+        doc = getattr(window, "Document", None)
+        if doc is None:
+            return None
+        items = doc.SelectedItems()
+        paths = []
+        for i in range(items.Count):
+            item = items.Item(i)
+            path = getattr(item, "Path", None)
+            if path:
+                paths.append(path)
+        return paths
+    except Exception:
+        return None
+
+
+class Backend:
+    """
+    后端接口。所有方法都应该“尽量不抛异常”，失败时返回 None / False / []，
+    与 smartctrlv_main 里原来的 try/except 兜底行为保持一致。
+    """
+
+    name = "abstract"
+
+    # 托盘启动后把 icon.notify 挂在这里：fn(title, message)
+    notifier = None
+
+    # ---------- 剪贴板 ----------
+    def get_clipboard_text(self) -> str:
+        raise NotImplementedError
+
+    def set_clipboard_text(self, text: str):
+        raise NotImplementedError
+
+    def is_clipboard_file_drop(self) -> bool:
+        raise NotImplementedError
+
+    def get_clipboard_formats(self) -> frozenset:
+        """剪贴板里有哪些 SmartCtrlV 关心的格式（CLIP_FORMAT_*），不读取内容"""
+        formats = set()
+        if self.is_clipboard_file_drop():
+            formats.add(CLIP_FORMAT_FILE_DROP)
+        if self.get_clipboard_text_length() != 0:
+            formats.add(CLIP_FORMAT_TEXT)
+        return frozenset(formats)
+
+    def get_clipboard_text_length(self):
+        """
+        不读取内容，只探测剪贴板文本有多少个字符（UTF-16 单位）。
+        没有文本返回 0，无法探测返回 None（调用方退回读取前缀）。
+        """
+        return None
+
+    def get_clipboard_text_prefix(self, max_chars: int):
+        """只取剪贴板文本的前 max_chars 个字符，返回 (前缀, 是否被截断)"""
+        text = self.get_clipboard_text()
+        return text[:max_chars], len(text) > max_chars
+
+    def get_clipboard_sequence_number(self):
+        """
+        剪贴板序列号：内容每变一次就加一，用来判断“剪贴板还是不是上次那份”。
+        不支持的后端返回 None（调用方退回按内容哈希判断）。
+        """
+        return None
+
+    # ---------- 前台窗口 / 进程 ----------
+    def get_foreground_window(self):
+        raise NotImplementedError
+
+    def get_window_pid(self, hwnd):
+        raise NotImplementedError
+
+    def get_process_exe_path(self, pid):
+        raise NotImplementedError
+
+    def get_process_creation_time(self, pid):
+        """
+        进程创建时间（只用来比较是否相等，类型随后端而定）。
+        PID 会被复用，同一个 PID 创建时间变了就说明已经是另一个进程；拿不到返回 None。
+        """
+        return None
+
+    def get_focus_class_name(self):
+        raise NotImplementedError
+
+    def is_window(self, hwnd) -> bool:
+        raise NotImplementedError
+
+    def focus_window(self, hwnd):
+        raise NotImplementedError
+
+    def get_parent_window(self, hwnd):
+        raise NotImplementedError
+
+    def window_from_point(self, pos):
+        raise NotImplementedError
+
+    def get_cursor_pos(self):
+        raise NotImplementedError
+
+    def get_screen_size(self):
+        raise NotImplementedError
+
+    # ---------- Explorer ----------
+    def get_explorer_folder_path(self, hwnd):
+        raise NotImplementedError
+
+    def get_explorer_selected_files(self, hwnd):
+        raise NotImplementedError
+
+    def get_explorer_state(self, hwnd):
+        """(当前文件夹, [选中路径])，能一次查完的后端应该覆盖这个方法"""
+        return self.get_explorer_folder_path(hwnd), self.get_explorer_selected_files(hwnd) or []
+
+    # ---------- 按键 / 鼠标 / 热键 ----------
+    def send_keys(self, combo: str):
+        raise NotImplementedError
+
+    def is_key_pressed(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def wait_left_click(self):
+        raise NotImplementedError
+
+    def add_hotkey(self, combo: str, callback, suppress: bool = False):
+        raise NotImplementedError
+
+    def remove_hotkey(self, handle):
+        raise NotImplementedError
+
+    def clear_all_hotkeys(self):
+        raise NotImplementedError
+
+    # ---------- 消息框 / 外部命令 ----------
+    def ask_yes_no_cancel(self, hwnd, message: str, title: str) -> str:
+        """弹出 是/否/取消 对话框，返回 ANSWER_YES / ANSWER_NO / ANSWER_CANCEL"""
+        raise NotImplementedError
+
+    def run_console_command(self, folder: str, command: str):
+        """在 folder 下打开一个新的控制台执行 command"""
+        raise NotImplementedError
+
+    def show_notification(self, title: str, message: str) -> bool:
+        """系统通知（托盘气泡）；没有可用的通知方式返回 False，调用方自己记日志"""
+        notifier = self.notifier
+        if notifier is None:
+            return False
+        try:
+            notifier(title, message)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        """停掉后端自己开的后台线程（热键停止时调用；之后再用到会重新启动）"""
+
+
+# ===================== 工具 =====================
+
+def _convert_location_url_to_path(url: str):
+    if not url or not url.lower().startswith("file:///"):
+        return None
+    path_part = url[8:]
+    path_part = urllib.parse.unquote(path_part)
+    path_part = path_part.replace("/", "\\")
+    return path_part
+
+
+# ===================== Win32 实现 =====================
+
+class Win32Backend(Backend):
+    """
+    真实 Windows 后端：第三方模块在构造时才 import，保证本文件在非 Windows 上也能导入。
+    热键要用的 win32 / keyboard 构造时就加载；pyperclip / mouse / comtypes 第一次用到才加载
+    """
+
+    name = "win32"
+
+    def __init__(self):
+        import win32gui
+        import win32process
+        import win32api
+        import win32con
+        import win32clipboard
+        import keyboard
+
+        self.win32gui = win32gui
+        self.win32process = win32process
+        self.win32api = win32api
+        self.win32con = win32con
+        self.wcb = win32clipboard
+        self.keyboard = keyboard
+        self._pyperclip = None
+
+        # Explorer 查询走常驻 COM 线程，见 smartctrlv_shellcom
+        self.shell_timeout_s = 2.0
+        self._shell_worker = None
+        self._shell_index = None
+        self._shell_lock = threading.Lock()
+
+    @property
+    def pyperclip(self):
+        if self._pyperclip is None:
+            import pyperclip
+            self._pyperclip = pyperclip
+        return self._pyperclip
+
+    # ---------- 剪贴板 ----------
+    def get_clipboard_text(self) -> str:
+        try:
+            return self.pyperclip.paste() or ""
+        except Exception:
+            return ""
+
+    def set_clipboard_text(self, text: str):
+        self.pyperclip.copy(text)
+
+    def is_clipboard_file_drop(self) -> bool:
+        CF_HDROP = 15
+        try:
+            return bool(self.wcb.IsClipboardFormatAvailable(CF_HDROP))
+        except Exception:
+            return False
+
+    def get_clipboard_formats(self) -> frozenset:
+        """IsClipboardFormatAvailable 不需要 OpenClipboard"""
+        CF_UNICODETEXT = 13
+        CF_HDROP = 15
+        formats = set()
+        try:
+            if self.wcb.IsClipboardFormatAvailable(CF_HDROP):
+                formats.add(CLIP_FORMAT_FILE_DROP)
+            if self.wcb.IsClipboardFormatAvailable(CF_UNICODETEXT):
+                formats.add(CLIP_FORMAT_TEXT)
+        except Exception:
+            pass
+        return frozenset(formats)
+
+    def get_clipboard_sequence_number(self):
+        """GetClipboardSequenceNumber 不需要 OpenClipboard，几乎零开销"""
+        try:
+            return int(self.wcb.GetClipboardSequenceNumber())
+        except Exception:
+            return None
+
+    def _kernel32(self):
+        import ctypes
+        k32 = ctypes.windll.kernel32
+        k32.GlobalSize.argtypes = [ctypes.c_void_p]
+        k32.GlobalSize.restype = ctypes.c_size_t
+        k32.GlobalLock.argtypes = [ctypes.c_void_p]
+        k32.GlobalLock.restype = ctypes.c_void_p
+        k32.GlobalUnlock.argtypes = [ctypes.c_void_p]
+        return k32
+
+    def get_clipboard_text_length(self):
+        """GlobalSize 读 CF_UNICODETEXT 句柄大小：不解码、不复制，常数时间"""
+        CF_UNICODETEXT = 13
+        try:
+            self.wcb.OpenClipboard()
+        except Exception:
+            return None
+        try:
+            if not self.wcb.IsClipboardFormatAvailable(CF_UNICODETEXT):
+                return 0
+            handle = self.wcb.GetClipboardDataHandle(CF_UNICODETEXT)
+            size = self._kernel32().GlobalSize(handle)
+            # GlobalSize 可能向上取整，这里得到的是上限；减掉结尾的 \0
+            return max(0, size // 2 - 1)
+        except Exception:
+            return None
+        finally:
+            try:
+                self.wcb.CloseClipboard()
+            except Exception:
+                pass
+
+    def get_clipboard_text_prefix(self, max_chars: int):
+        """GlobalLock 后只把前 max_chars 个字符拷出来，大文本不会整段解码"""
+        import ctypes
+        CF_UNICODETEXT = 13
+        try:
+            self.wcb.OpenClipboard()
+        except Exception:
+            return super().get_clipboard_text_prefix(max_chars)
+        try:
+            if not self.wcb.IsClipboardFormatAvailable(CF_UNICODETEXT):
+                return "", False
+            handle = self.wcb.GetClipboardDataHandle(CF_UNICODETEXT)
+            k32 = self._kernel32()
+            total = k32.GlobalSize(handle) // 2
+            ptr = k32.GlobalLock(handle)
+            if not ptr:
+                return "", False
+            try:
+                chunk = ctypes.wstring_at(ptr, min(max_chars + 1, total))
+            finally:
+                k32.GlobalUnlock(handle)
+            nul = chunk.find("\0")
+            if nul >= 0:
+                chunk = chunk[:nul]
+            return chunk[:max_chars], len(chunk) > max_chars
+        except Exception:
+            return "", False
+        finally:
+            try:
+                self.wcb.CloseClipboard()
+            except Exception:
+                pass
+
+    # ---------- 前台窗口 / 进程 ----------
+    def get_foreground_window(self):
+        return self.win32gui.GetForegroundWindow() or None
+
+    def get_window_pid(self, hwnd):
+        try:
+            _, pid = self.win32process.GetWindowThreadProcessId(hwnd)
+            return pid
+        except Exception:
+            return None
+
+    def get_process_exe_path(self, pid):
+        try:
+            h_process = self.win32api.OpenProcess(
+                self.win32con.PROCESS_QUERY_INFORMATION | self.win32con.PROCESS_VM_READ,
+                False,
+                pid,
+            )
+        except Exception:
+            return None
+
+        try:
+            return self.win32process.GetModuleFileNameEx(h_process, 0)
+        except Exception:
+            return None
+        finally:
+            self.win32api.CloseHandle(h_process)
+
+    def get_process_creation_time(self, pid):
+        """只要 PROCESS_QUERY_LIMITED_INFORMATION，不读目标进程内存，比 GetModuleFileNameEx 便宜"""
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        try:
+            h_process = self.win32api.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        except Exception:
+            return None
+
+        try:
+            return self.win32process.GetProcessTimes(h_process)["CreationTime"]
+        except Exception:
+            return None
+        finally:
+            self.win32api.CloseHandle(h_process)
+
+    def get_focus_class_name(self):
+        try:
+            focus_hwnd = self.win32gui.GetFocus()
+            if not focus_hwnd:
+                return None
+            return self.win32gui.GetClassName(focus_hwnd)
+        except Exception:
+            return None
+
+    def is_window(self, hwnd) -> bool:
+        try:
+            return bool(hwnd and self.win32gui.IsWindow(hwnd))
+        except Exception:
+            return False
+
+    def focus_window(self, hwnd):
+        self.win32gui.SetForegroundWindow(hwnd)
+
+    def get_parent_window(self, hwnd):
+        return self.win32gui.GetParent(hwnd)
+
+    def window_from_point(self, pos):
+        return self.win32gui.WindowFromPoint(pos)
+
+    def get_cursor_pos(self):
+        return self.win32api.GetCursorPos()
+
+    def get_screen_size(self):
+        return self.win32api.GetSystemMetrics(0), self.win32api.GetSystemMetrics(1)
+
+    # ---------- Explorer ----------
+    def _shell(self):
+        """
+        (worker, index)：常驻 STA 线程里的 Shell.Application（第一次用到时才启动）。
+        分发器的多个工作线程 / 预计算线程可能同时第一次用到：加锁，只建一个
+        """
+        with self._shell_lock:
+            if self._shell_worker is None:
+                from smartctrlv_shellcom import ShellComWorker, ShellWindowIndex
+                self._shell_index = ShellWindowIndex()
+                self._shell_worker = ShellComWorker(timeout=self.shell_timeout_s)
+            return self._shell_worker, self._shell_index
+
+    def close(self):
+        """停掉 COM 线程；之后再查 Explorer 会重新建一个"""
+        with self._shell_lock:
+            worker, self._shell_worker = self._shell_worker, None
+            self._shell_index = None
+        if worker is not None:
+            worker.stop()
+
+    def get_explorer_folder_path(self, hwnd):
+        """通过 Shell.Application 找到当前 Explorer 文件夹路径（hwnd 索引，不再遍历所有窗口）"""
+        worker, index = self._shell()
+        return worker.call(
+            lambda shell: index.resolve(shell, hwnd, explorer_folder_path),
+            default=None,
+        )
+
+    def get_explorer_selected_files(self, hwnd):
+        """获取当前 Explorer 窗口选中的文件路径列表"""
+        worker, index = self._shell()
+        return worker.call(
+            lambda shell: index.resolve(
+                shell, hwnd,
+                lambda windows: explorer_selected_paths(windows, default=None),
+                retry_if=lambda paths: paths is None,
+            ),
+            default=[],
+        ) or []
+
+    def get_explorer_state(self, hwnd):
+        """文件夹和选中项在 COM 线程里一次取完（只跨一次线程、只查一次索引）"""
+        worker, index = self._shell()
+
+        def extract(windows):
+            return explorer_folder_path(windows), explorer_selected_paths(windows, default=None)
+
+        folder, selection = worker.call(
+            lambda shell: index.resolve(
+                shell, hwnd, extract,
+                retry_if=lambda state: state[0] is None or state[1] is None,
+            ),
+            default=(None, None),
+        )
+        return folder, selection or []
+
+    # ---------- 按键 / 鼠标 / 热键 ----------
+    def send_keys(self, combo: str):
+        self.keyboard.send(combo)
+
+    def is_key_pressed(self, key: str) -> bool:
+        try:
+            return bool(self.keyboard.is_pressed(key))
+        except Exception:
+            return False
+
+    def wait_left_click(self):
+        import mouse  # 全局鼠标监听
+        mouse.wait(button="left", target_types=("down",))
+
+    def add_hotkey(self, combo: str, callback, suppress: bool = False):
+        return self.keyboard.add_hotkey(combo, callback, suppress=suppress)
+
+    def remove_hotkey(self, handle):
+        self.keyboard.remove_hotkey(handle)
+
+    def clear_all_hotkeys(self):
+        self.keyboard.clear_all_hotkeys()
+
+    # ---------- 消息框 / 外部命令 ----------
+    def ask_yes_no_cancel(self, hwnd, message: str, title: str) -> str:
+        flags = self.win32con.MB_YESNOCANCEL | self.win32con.MB_ICONQUESTION
+        res = self.win32api.MessageBox(hwnd or 0, message, title, flags)
+        if res == self.win32con.IDYES:
+            return ANSWER_YES
+        if res == self.win32con.IDNO:
+            return ANSWER_NO
+        return ANSWER_CANCEL
+
+    def run_console_command(self, folder: str, command: str):
+        import subprocess
+        subprocess.Popen(
+            ["cmd.exe", "/K", command],
+            cwd=folder,
+            creationflags=subprocess.CREATE_NEW_CONSOLE
+        )
+
+
+# ===================== 内存假后端 =====================
+
+class FakeBackend(Backend):
+    """
+    纯内存后端：
+    - 所有“系统状态”都是普通属性，测试/压测脚本直接赋值即可
+    - 所有“副作用”（按键、弹框、开 cmd、改剪贴板）都记录到列表里，方便断言
+    - 消息框的回答从 message_box_answers 队列里依次取，取完用 default_answer
+    """
+
+    name = "fake"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # 剪贴板
+        self.clipboard_text = ""
+        self.clipboard_file_drop = False
+
+        # 窗口 / 进程
+        self.foreground_hwnd = None
+        self.window_pids = {}        # hwnd -> pid
+        self.process_paths = {}      # pid  -> exe 完整路径
+        self.process_start_times = {}  # pid -> 创建时间（换了 exe 就当成新进程）
+        self.process_queries = 0     # get_process_exe_path 被调用的次数
+        self.window_parents = {}     # hwnd -> 父 hwnd
+        self.focus_class_name = None
+        self.cursor_pos = (0, 0)
+        self.screen_size = (1920, 1080)
+
+        # Explorer
+        self.explorer_folders = {}   # hwnd -> 当前文件夹
+        self.explorer_selection = {} # hwnd -> [选中路径]
+        self.explorer_queries = 0    # Explorer 状态查询次数（真实后端每次都是跨进程往返）
+
+        # 输入
+        self.pressed_keys = set()
+        self.message_box_answers = deque()
+        self.default_answer = ANSWER_CANCEL
+
+        # 热键
+        self.hotkeys = {}            # handle -> (combo, callback, suppress)
+        self._next_hotkey_handle = 1
+
+        # 副作用记录
+        self.sent_keys = []
+        self.message_boxes = []      # (hwnd, title, message, answer)
+        self.console_commands = []   # (folder, command)
+        self.clipboard_writes = []
+        self.notifications = []      # (title, message)
+
+    # ---------- 场景搭建 ----------
+    def set_foreground(self, hwnd, exe_path, pid=None, focus_class_name=None):
+        """把 hwnd 设为前台窗口，并登记它所属进程的 exe 路径"""
+        if pid is None:
+            pid = self.window_pids.get(hwnd) or (10000 + len(self.window_pids))
+        self.window_pids[hwnd] = pid
+        if self.process_paths.get(pid) != exe_path or pid not in self.process_start_times:
+            # 同一个 PID 换了 exe：模拟 PID 被新进程复用
+            self.process_start_times[pid] = time.monotonic_ns()
+        self.process_paths[pid] = exe_path
+        self.foreground_hwnd = hwnd
+        self.focus_class_name = focus_class_name
+
+    def open_explorer(self, hwnd, folder, selection=None, pid=None):
+        """模拟一个前台的资源管理器窗口"""
+        self.set_foreground(hwnd, r"C:\Windows\explorer.exe", pid=pid, focus_class_name="DirectUIHWND")
+        self.explorer_folders[hwnd] = folder
+        self.explorer_selection[hwnd] = list(selection or [])
+
+    def clear_events(self):
+        """清空副作用记录（长时间压测时防止列表无限增长）"""
+        with self._lock:
+            self.sent_keys.clear()
+            self.message_boxes.clear()
+            self.console_commands.clear()
+            self.clipboard_writes.clear()
+            self.notifications.clear()
+
+    # ---------- 剪贴板 ----------
+    def get_clipboard_text(self) -> str:
+        return self.clipboard_text or ""
+
+    def set_clipboard_text(self, text: str):
+        with self._lock:
+            self.clipboard_text = text
+            self.clipboard_file_drop = False
+            self.clipboard_writes.append(text)
+
+    def is_clipboard_file_drop(self) -> bool:
+        return bool(self.clipboard_file_drop)
+
+    def get_clipboard_text_length(self):
+        return len(self.clipboard_text or "")
+
+    def get_clipboard_formats(self) -> frozenset:
+        formats = set()
+        if self.clipboard_file_drop:
+            formats.add(CLIP_FORMAT_FILE_DROP)
+        if self.clipboard_text:
+            formats.add(CLIP_FORMAT_TEXT)
+        return frozenset(formats)
+
+    def get_clipboard_text_prefix(self, max_chars: int):
+        text = self.clipboard_text or ""
+        return text[:max_chars], len(text) > max_chars
+
+    # get_clipboard_sequence_number 保持 None：测试里经常直接改 clipboard_text，
+    # 没法可靠地维护序列号，缓存会退回按内容哈希
+
+    # ---------- 前台窗口 / 进程 ----------
+    def get_foreground_window(self):
+        return self.foreground_hwnd
+
+    def get_window_pid(self, hwnd):
+        return self.window_pids.get(hwnd)
+
+    def get_process_exe_path(self, pid):
+        self.process_queries += 1
+        return self.process_paths.get(pid)
+
+    def get_process_creation_time(self, pid):
+        return self.process_start_times.get(pid)
+
+    def get_focus_class_name(self):
+        return self.focus_class_name
+
+    def is_window(self, hwnd) -> bool:
+        return bool(hwnd) and hwnd in self.window_pids
+
+    def focus_window(self, hwnd):
+        if hwnd in self.window_pids:
+            self.foreground_hwnd = hwnd
+
+    def get_parent_window(self, hwnd):
+        return self.window_parents.get(hwnd, 0)
+
+    def window_from_point(self, pos):
+        return self.foreground_hwnd
+
+    def get_cursor_pos(self):
+        return self.cursor_pos
+
+    def get_screen_size(self):
+        return self.screen_size
+
+    # ---------- Explorer ----------
+    def get_explorer_folder_path(self, hwnd):
+        self.explorer_queries += 1
+        return self.explorer_folders.get(hwnd)
+
+    def get_explorer_selected_files(self, hwnd):
+        self.explorer_queries += 1
+        return list(self.explorer_selection.get(hwnd, []))
+
+    def get_explorer_state(self, hwnd):
+        self.explorer_queries += 1
+        return self.explorer_folders.get(hwnd), list(self.explorer_selection.get(hwnd, []))
+
+    # ---------- 按键 / 鼠标 / 热键 ----------
+    def send_keys(self, combo: str):
+        with self._lock:
+            self.sent_keys.append(combo)
+
+    def is_key_pressed(self, key: str) -> bool:
+        return key in self.pressed_keys
+
+    def wait_left_click(self):
+        # 假后端没有鼠标，直接返回，相当于“立刻点了一下”
+        return
+
+    def add_hotkey(self, combo: str, callback, suppress: bool = False):
+        with self._lock:
+            handle = self._next_hotkey_handle
+            self._next_hotkey_handle += 1
+            self.hotkeys[handle] = (combo, callback, suppress)
+        return handle
+
+    def remove_hotkey(self, handle):
+        with self._lock:
+            self.hotkeys.pop(handle, None)
+
+    def clear_all_hotkeys(self):
+        with self._lock:
+            self.hotkeys.clear()
+
+    def press_hotkey(self, combo: str):
+        """模拟用户按下热键：同步调用所有绑定到 combo 的回调"""
+        for registered, callback, _ in list(self.hotkeys.values()):
+            if registered == combo:
+                callback()
+
+    # ---------- 消息框 / 外部命令 ----------
+    def ask_yes_no_cancel(self, hwnd, message: str, title: str) -> str:
+        with self._lock:
+            answer = self.message_box_answers.popleft() if self.message_box_answers else self.default_answer
+            self.message_boxes.append((hwnd, title, message, answer))
+        return answer
+
+    def run_console_command(self, folder: str, command: str):
+        with self._lock:
+            self.console_commands.append((folder, command))
+
+    def show_notification(self, title: str, message: str) -> bool:
+        with self._lock:
+            self.notifications.append((title, message))
+        return True
+
+
+# ===================== 全局后端 =====================
+
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
+
+
+def create_default_backend() -> Backend:
+    """Windows 上用 Win32Backend，其他平台（CI / Linux 压测）退回 FakeBackend"""
+    if os.name == "nt" or sys.platform.startswith("win"):
+        return Win32Backend()
+    log.info("非 Windows 平台，使用内存假后端 FakeBackend。")
+    return FakeBackend()
+
+
+def get_backend() -> Backend:
+    global _BACKEND
+    if _BACKEND is None:
+        with _BACKEND_LOCK:
+            if _BACKEND is None:
+                _BACKEND = create_default_backend()
+    return _BACKEND
+
+
+def set_backend(backend: Backend) -> Backend:
+    """替换全局后端，返回旧的（方便压测脚本用完再换回去）"""
+    global _BACKEND
+    with _BACKEND_LOCK:
+        old = _BACKEND
+        _BACKEND = backend
+    return old
@@ -0,0 +1,474 @@
+# smartctrlv_backup.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 补丁备份库
+- 原来每次补丁都在原文件旁边写一个 <file>.bak：弄乱项目目录、只留最近一份、大文件整份复制
+- 现在备份放在程序目录下的 backups/ 里，按内容寻址：
+  - objects/<sha256 前两位>/<sha256>：同样的内容只存一份（不同文件 / 同一文件反复改回去都去重）
+  - 对象要么是整份（zlib 压缩），要么是相对“同一文件上一个版本”的行级差分（再 zlib 压缩），取小的；
+    差分链最长 MAX_CHAIN，超过就存整份，恢复时最多解 MAX_CHAIN 层
+  - index.jsonl：只追加，每行 {"path", "sha", "size", "ts"}
+- 保留策略：每个文件最多 max_versions 个版本，对象总量超过 max_bytes 就从最旧的版本丢；
+  丢完重写 index（原子替换），没人引用（包括不再被当作差分底版）的对象删掉
+- 恢复：restore(path, version) 把某个版本原子地写回去（写回前先把当前内容也备份一份，恢复本身可以再恢复）
+
+命令行：
+    python smartctrlv_backup.py list <文件>
+    python smartctrlv_backup.py restore <文件> [--version N] [--output 另存路径]
+    python smartctrlv_backup.py stats
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from smartctrlv_fileio import write_bytes_atomic
+from smartctrlv_log import get_logger
+
+log = get_logger("Backup")
+
+INDEX_FILE_NAME = "index.jsonl"
+OBJECT_DIR_NAME = "objects"
+
+# 对象头：b"F" + zlib(整份)；b"D" + 链深度(1 字节) + 底版 sha(64 字节 hex) + zlib(差分)
+_FULL = b"F"
+_DELTA = b"D"
+_SHA_LEN = 64
+
+MAX_CHAIN = 16
+
+# 比这大的文件不做差分（差分要把新旧两版都放进内存），直接流式压缩整份
+DELTA_MAX_BYTES = 16 * 1024 * 1024
+
+# 差分里太短的行（空行、括号）不单独当“拷贝”：一条拷贝指令比这行本身还长
+_MIN_COPY_LINE = 8
+
+_READ_CHUNK = 1024 * 1024
+
+
+# ===================== 行级差分 =====================
+
+def make_delta(base: bytes, new: bytes) -> bytes:
+    """
+    new 相对 base 的差分：一串指令
+      b"C" + <起始行, 行数>   从 base 拷贝连续的行
+      b"I" + <长度> + 数据     插入新内容
+    base 的行建一次 行 -> 第一次出现的位置 索引，new 逐行贪心匹配（线性）
+    """
+    base_lines = base.splitlines(keepends=True)
+    index = {}
+    for i, line in enumerate(base_lines):
+        index.setdefault(line, i)
+
+    out = bytearray()
+    literal = []
+    copy_start = copy_len = 0
+
+    def flush_copy():
+        nonlocal copy_len
+        if copy_len:
+            out.extend(b"C" + struct.pack("<II", copy_start, copy_len))
+            copy_len = 0
+
+    def flush_literal():
+        if literal:
+            data = b"".join(literal)
+            out.extend(b"I" + struct.pack("<I", len(data)) + data)
+            literal.clear()
+
+    n_base = len(base_lines)
+    for line in new.splitlines(keepends=True):
+        nxt = copy_start + copy_len
+        if copy_len and nxt < n_base and base_lines[nxt] == line:
+            copy_len += 1
+            continue
+        pos = index.get(line) if len(line) >= _MIN_COPY_LINE else None
+        if pos is not None:
+            flush_copy()
+            flush_literal()
+            copy_start, copy_len = pos, 1
+        else:
+            flush_copy()
+            literal.append(line)
+    flush_copy()
+    flush_literal()
+    return bytes(out)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    pos = 0
+    while pos < len(delta):
+        op = delta[pos:pos + 1]
+        if op == b"C":
+            start, count = struct.unpack_from("<II", delta, pos + 1)
+            parts.extend(base_lines[start:start + count])
+            pos += 9
+        elif op == b"I":
+            (length,) = struct.unpack_from("<I", delta, pos + 1)
+            parts.append(delta[pos + 5:pos + 5 + length])
+            pos += 5 + length
+        else:
+            raise ValueError(f"差分数据损坏（偏移 {pos}）")
+    return b"".join(parts)
+
+
+# ===================== 备份库 =====================
+
+class BackupStore:
+    """
+    folder: 备份库目录
+    max_versions: 每个文件最多保留几个版本
+    max_bytes: 对象总量上限
+    """
+
+    def __init__(self, folder, max_versions=20, max_bytes=256 * 1024 * 1024, enabled=True):
+        self.folder = folder
+        self.enabled = enabled
+        self.max_versions = max(1, int(max_versions))
+        self.max_bytes = max(1024 * 1024, int(max_bytes))
+
+        self._lock = threading.RLock()
+        self._versions = None       # 懒加载：规范化路径 -> [条目]（旧 -> 新）
+        self._object_bytes = 0
+
+        self.stored = 0
+        self.deduplicated = 0
+        self.deltas = 0
+
+    @property
+    def index_path(self):
+        return os.path.join(self.folder, INDEX_FILE_NAME)
+
+    def configure(self, enabled=None, max_versions=None, max_bytes=None, folder=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if max_versions is not None:
+                self.max_versions = max(1, int(max_versions))
+            if max_bytes is not None:
+                self.max_bytes = max(1024 * 1024, int(max_bytes))
+            if folder is not None and folder != self.folder:
+                self.folder = folder
+                self._versions = None
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _object_path(self, sha):
+        return os.path.join(self.folder, OBJECT_DIR_NAME, sha[:2], sha)
+
+    # ---------- 加载 ----------
+    def _load(self):
+        """调用方持有锁"""
+        if self._versions is not None:
+            return
+        versions = {}
+        try:
+            with open(self.index_path, "rb") as f:
+                for raw in f:
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        continue
+                    versions.setdefault(self._key(entry["path"]), []).append(entry)
+        except OSError:
+            pass
+        self._versions = versions
+        self._object_bytes = sum(size for _, size in self._iter_objects())
+
+    def _iter_objects(self):
+        """(sha, 字节数)"""
+        root = os.path.join(self.folder, OBJECT_DIR_NAME)
+        try:
+            subdirs = list(os.scandir(root))
+        except OSError:
+            return
+        for sub in subdirs:
+            if not sub.is_dir():
+                continue
+            with os.scandir(sub.path) as it:
+                for entry in it:
+                    if len(entry.name) == _SHA_LEN:
+                        yield entry.name, entry.stat().st_size
+
+    # ---------- 对象读写 ----------
+    def _header(self, sha):
+        """(类型, 链深度, 底版 sha)"""
+        with open(self._object_path(sha), "rb") as f:
+            head = f.read(2 + _SHA_LEN)
+        if head[:1] == _DELTA:
+            return _DELTA, head[1], head[2:].decode("ascii")
+        return _FULL, 0, None
+
+    def read_object(self, sha) -> bytes:
+        """还原出某个内容（差分链最多 MAX_CHAIN 层）"""
+        with open(self._object_path(sha), "rb") as f:
+            data = f.read()
+        if data[:1] == _FULL:
+            content = zlib.decompress(data[1:])
+        elif data[:1] == _DELTA:
+            base = self.read_object(data[2:2 + _SHA_LEN].decode("ascii"))
+            content = apply_delta(base, zlib.decompress(data[2 + _SHA_LEN:]))
+        else:
+            raise ValueError(f"备份对象损坏: {sha}")
+        if hashlib.sha256(content).hexdigest() != sha:
+            raise ValueError(f"备份对象校验失败: {sha}")
+        return content
+
+    def _write_object(self, sha, payload):
+        path = self._object_path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_bytes_atomic(path, payload)
+        self._object_bytes += len(payload)
+
+    def _store_large(self, path):
+        """大文件：边读边算 sha、边压缩，写成整份对象（不做差分）"""
+        import tempfile
+
+        digest = hashlib.sha256()
+        comp = zlib.compressobj()
+        os.makedirs(self.folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".object.", suffix=".tmp", dir=self.folder)
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as out, open(path, "rb") as src:
+                out.write(_FULL)
+                for chunk in iter(lambda: src.read(_READ_CHUNK), b""):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(comp.compress(chunk))
+                out.write(comp.flush())
+            sha = digest.hexdigest()
+            target = self._object_path(sha)
+            if os.path.exists(target):
+                self.deduplicated += 1
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                self._object_bytes += os.path.getsize(tmp)
+                os.replace(tmp, target)
+                self.stored += 1
+            return sha, size
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    # ---------- 备份 ----------
+    def backup(self, path):
+        """
+        备份 path 现在的内容，返回 sha（关闭 / 失败返回 None，失败只记日志，不影响调用方继续写）。
+        内容和这个文件上一个版本一样时不新增版本
+        """
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                self._load()
+                return self._backup(path)
+        except Exception as e:
+            log.warning("备份失败 %s: %s", path, e)
+            return None
+
+    def _backup(self, path):
+        key = self._key(path)
+        history = self._versions.get(key) or []
+        prev = history[-1] if history else None
+
+        if os.path.getsize(path) > DELTA_MAX_BYTES:
+            sha, size = self._store_large(path)
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+            sha, size = hashlib.sha256(data).hexdigest(), len(data)
+            if os.path.exists(self._object_path(sha)):
+                self.deduplicated += 1
+            else:
+                self._write_object(sha, self._encode(data, prev))
+                self.stored += 1
+
+        if prev is not None and prev["sha"] == sha:
+            return sha
+
+        entry = {"path": os.path.abspath(path), "sha": sha, "size": size, "ts": round(time.time(), 3)}
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.index_path, "ab") as f:
+            f.write(line)
+        self._versions.setdefault(key, []).append(entry)
+        log.debug("已备份 %s -> %s", path, sha[:12])
+
+        if len(self._versions[key]) > self.max_versions or self._object_bytes > self.max_bytes:
+            self._enforce_retention()
+        return sha
+
+    def _encode(self, data, prev):
+        """整份和相对上一版的差分，取压缩后更小的"""
+        full = _FULL + zlib.compress(data)
+        if prev is None:
+            return full
+        try:
+            _, depth, _ = self._header(prev["sha"])
+            if depth + 1 > MAX_CHAIN:
+                return full
+            base = self.read_object(prev["sha"])
+        except (OSError, ValueError):
+            return full
+        delta = _DELTA + bytes([depth + 1]) + prev["sha"].encode("ascii") + zlib.compress(make_delta(base, data))
+        if len(delta) < len(full):
+            self.deltas += 1
+            return delta
+        return full
+
+    # ---------- 保留策略 ----------
+    def _enforce_retention(self):
+        """调用方持有锁"""
+        dropped = 0
+        for key, history in self._versions.items():
+            if len(history) > self.max_versions:
+                dropped += len(history) - self.max_versions
+                del history[:len(history) - self.max_versions]
+
+        # 总量超限：全局按时间从旧到新丢（每个文件至少留最新一版）
+        sizes = dict(self._iter_objects())
+        if sum(sizes.values()) > self.max_bytes:
+            entries = sorted((e for h in self._versions.values() for e in h[:-1]), key=lambda e: e["ts"])
+            total = sum(sizes.values())
+            for entry in entries:
+                if total <= self.max_bytes * 0.8:
+                    break
+                history = self._versions[self._key(entry["path"])]
+                history.remove(entry)
+                total -= sizes.get(entry["sha"], 0)
+                dropped += 1
+
+        self._versions = {k: h for k, h in self._versions.items() if h}
+        lines = [json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n"
+                 for h in self._versions.values() for e in h]
+        write_bytes_atomic(self.index_path, "".join(lines).encode("utf-8"))
+        removed = self._collect_garbage(sizes)
+        log.debug("备份保留策略：丢弃 %d 个版本，删除 %d 个对象", dropped, removed)
+
+    def _collect_garbage(self, sizes):
+        """删掉没人引用的对象（差分的底版也算被引用）"""
+        live = set()
+        stack = [e["sha"] for h in self._versions.values() for e in h]
+        while stack:
+            sha = stack.pop()
+            if sha in live:
+                continue
+            live.add(sha)
+            try:
+                kind, _, base = self._header(sha)
+            except OSError:
+                continue
+            if kind == _DELTA:
+                stack.append(base)
+
+        removed = 0
+        for sha, size in sizes.items():
+            if sha in live:
+                continue
+            try:
+                os.remove(self._object_path(sha))
+                removed += 1
+            except OSError:
+                pass
+        self._object_bytes = sum(size for _, size in self._iter_objects())
+        return removed
+
+    # ---------- 查询 / 恢复 ----------
+    def versions(self, path):
+        """path 的所有版本（旧 -> 新）"""
+        with self._lock:
+            self._load()
+            return list(self._versions.get(self._key(path)) or [])
+
+    def restore(self, path, version=-1, output=None):
+        """
+        把 path 的第 version 个版本（下标，-1 是最近一次备份）写到 output（默认写回 path）。
+        写回原文件前先备份当前内容。返回恢复的条目
+        """
+        history = self.versions(path)
+        if not history:
+            raise LookupError(f"没有 {path} 的备份")
+        entry = history[version]
+        with self._lock:
+            content = self.read_object(entry["sha"])
+        target = output or path
+        if os.path.exists(target) and self._key(target) == self._key(path):
+            self.backup(target)
+        write_bytes_atomic(target, content)
+        log.info("已把 %s 恢复到 %s 的版本（%s）", target,
+                 time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["ts"])), entry["sha"][:12])
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            return {
+                "files": len(self._versions),
+                "versions": sum(len(h) for h in self._versions.values()),
+                "object_bytes": self._object_bytes,
+                "stored": self.stored,
+                "deduplicated": self.deduplicated,
+                "deltas": self.deltas,
+            }
+
+
+# ===================== 命令行 =====================
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SmartCtrlV 补丁备份")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_list = sub.add_parser("list", help="列出某个文件的备份版本")
+    p_list.add_argument("path")
+    p_restore = sub.add_parser("restore", help="恢复某个版本")
+    p_restore.add_argument("path")
+    p_restore.add_argument("--version", type=int, default=-1, help="版本下标（list 里的编号，默认最近一次）")
+    p_restore.add_argument("--output", help="另存到这个路径，不覆盖原文件")
+    sub.add_parser("stats", help="备份库统计")
+    args = parser.parse_args(argv)
+
+    # 和程序用同一个备份库（目录 / 保留策略都按配置来）
+    import smartctrlv_main
+    smartctrlv_main.load_config()
+    smartctrlv_main.configure_backups(smartctrlv_main.CONFIG.get("backup") or {})
+    store = smartctrlv_main.get_backups()
+
+    if args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+        return 0
+
+    if args.command == "list":
+        history = store.versions(args.path)
+        if not history:
+            print(f"没有 {args.path} 的备份")
+            return 1
+        for i, entry in enumerate(history):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["ts"]))
+            print(f"{i:>4}  {when}  {entry['size']:>10} B  {entry['sha'][:12]}")
+        return 0
+
+    try:
+        entry = store.restore(args.path, args.version, args.output)
+    except (LookupError, IndexError) as e:
+        print(f"恢复失败: {e}")
+        return 1
+    print(f"已恢复 {args.output or args.path}（{entry['sha'][:12]}）")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
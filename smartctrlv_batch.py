@@ -0,0 +1,151 @@
+# smartctrlv_batch.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 批量建文件 / 文件夹
+- 原来按行串行：每行一次 exists 探测 + 一次 open(..., "w") + 一行 print，全在热键线程里跑；
+  SMB / OneDrive 目录每个操作都有几十毫秒延迟，几百行就要等很久
+- 现在分两步：
+  1) 先把整张清单校验完、名字一次分配好（NameAllocator，只列一次目录）
+  2) 再放到有界线程池里并发创建（独占创建，撞名就换下一个号）
+- 返回 BatchResult：建成了哪些、哪些失败了（带原因）、被跳过的行、每项耗时和总耗时；
+  调用方据此只发一条汇总通知，不再每个文件打一行
+"""
+
+import os
+import time
+
+from smartctrlv_names import NameAllocator
+
+KIND_FILE = "file"
+KIND_FOLDER = "folder"
+
+# 少于这么多项就直接在当前线程建，不值得开线程池
+_INLINE_MAX = 4
+
+
+class BatchItem:
+    """name: 要建的名字（不含目录）；content 不为 None 时建文件并写入内容"""
+
+    __slots__ = ("name", "kind", "content")
+
+    def __init__(self, name, kind=KIND_FILE, content=None):
+        self.name = name
+        self.kind = kind
+        self.content = content
+
+    def __repr__(self):
+        return f"BatchItem({self.name!r}, {self.kind})"
+
+
+class BatchResult:
+    """
+    - created: [(路径, 类型)]，按清单顺序
+    - failed: [(名字, 错误信息)]
+    - skipped: 校验没通过的原始行
+    - timings_ms: 每个成功项的创建耗时
+    - elapsed_ms: 整批耗时（含列目录）
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.created = []
+        self.failed = []
+        self.skipped = []
+        self.timings_ms = []
+        self.elapsed_ms = 0.0
+        self.collisions = 0
+        self.workers = 1
+
+    @property
+    def created_paths(self):
+        return [path for path, _ in self.created]
+
+    def count(self, kind) -> int:
+        return sum(1 for _, k in self.created if k == kind)
+
+    def stats(self) -> dict:
+        data = sorted(self.timings_ms)
+        return {
+            "created": len(self.created),
+            "failed": len(self.failed),
+            "skipped": len(self.skipped),
+            "collisions": self.collisions,
+            "workers": self.workers,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+            "item_p50_ms": round(data[len(data) // 2], 3) if data else 0.0,
+            "item_max_ms": round(data[-1], 3) if data else 0.0,
+        }
+
+    def summary(self) -> str:
+        """一句话汇总，给通知 / 日志用"""
+        parts = []
+        files = self.count(KIND_FILE)
+        folders = self.count(KIND_FOLDER)
+        if files:
+            parts.append(f"{files} 个文件")
+        if folders:
+            parts.append(f"{folders} 个文件夹")
+        text = f"已创建 {'、'.join(parts)}" if parts else "没有创建任何条目"
+        if self.failed:
+            text += f"，失败 {len(self.failed)} 个（{self.failed[0][0]}: {self.failed[0][1]}）"
+        if self.skipped:
+            text += f"，跳过 {len(self.skipped)} 行"
+        return f"{text}（{self.elapsed_ms:.0f} ms）"
+
+
+def _create(path, item):
+    if item.kind == KIND_FOLDER:
+        os.mkdir(path)
+    else:
+        with open(path, "x", encoding="utf-8", errors="ignore") as f:
+            if item.content:
+                f.write(item.content)
+
+
+def create_batch(folder, items, workers=8, skipped=()) -> BatchResult:
+    """
+    在 folder 下创建 items（已经校验过的 BatchItem 列表）。
+    workers: 线程池大小；项数很少时直接在当前线程建
+    """
+    t0 = time.perf_counter()
+    result = BatchResult(folder)
+    result.skipped = list(skipped)
+    if not items:
+        result.elapsed_ms = (time.perf_counter() - t0) * 1000
+        return result
+
+    names = NameAllocator(folder)
+    # 先按清单顺序把名字分好，和串行创建时得到的名字一致
+    planned = [names.allocate(item.name) for item in items]
+
+    def run(i):
+        item = items[i]
+        start = time.perf_counter()
+        try:
+            # 列目录之后别人建了同名的：allocator 换下一个号再试
+            path = names.create(item.name, lambda p: _create(p, item), planned[i])
+        except Exception as e:
+            return None, 0.0, e
+        return path, (time.perf_counter() - start) * 1000, None
+
+    n_workers = max(1, min(int(workers), len(items)))
+    if len(items) <= _INLINE_MAX or n_workers == 1:
+        result.workers = 1
+        outcomes = [run(i) for i in range(len(items))]
+    else:
+        result.workers = n_workers
+        from concurrent.futures import ThreadPoolExecutor  # 用到线程池才加载
+
+        with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="SmartCtrlV-Create") as pool:
+            outcomes = list(pool.map(run, range(len(items))))
+
+    result.collisions = names.collisions
+    for item, (path, ms, error) in zip(items, outcomes):
+        if error is not None:
+            result.failed.append((item.name, str(error)))
+            continue
+        result.created.append((path, item.kind))
+        result.timings_ms.append(ms)
+
+    result.elapsed_ms = (time.perf_counter() - t0) * 1000
+    return result
@@ -0,0 +1,1010 @@
+# smartctrlv_bench.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 基准测试（可复现）
+- 用固定随机种子生成各种“剪贴板语料”：文件名列表 / shell 脚本 / AI 回答（原来的写法是/可以改成）/
+  压缩 JSON / 多 MB 日志
+- 分阶段测量：looks_like_filename_list / is_probable_shell_command / fake_ai_analyze_clipboard /
+  normalize_code_block，以及用 FakeBackend 无头驱动的完整 on_ctrl_v_explorer
+  （_repeat 是同一份剪贴板连按、命中剪贴板缓存的情况）
+- 输出 p50 / p95 / p99 延迟和峰值内存（tracemalloc）
+- --save 保存基线 JSON，--compare 和基线对比，超过阈值的视为回退（退出码 1）
+
+用法：
+    python smartctrlv_bench.py pipeline
+    python smartctrlv_bench.py pipeline --quick --save bench_baseline.json
+    python smartctrlv_bench.py pipeline --compare bench_baseline.json --threshold 1.3
+    python smartctrlv_bench.py commands          # 10 万行语料上的命令识别吞吐
+    python smartctrlv_bench.py menu              # 多格式菜单“热键 -> 显示”耗时（需要图形界面）
+    python smartctrlv_bench.py shell             # Explorer 窗口查找：遍历 vs hwnd 索引
+    python smartctrlv_bench.py startup --budget-ms 60   # 冷启动 import 耗时，超预算退出码 1
+    python smartctrlv_bench.py patch             # 10 万行源码上的补丁定位：逐字节 / 规范化行 / 相似匹配
+    python smartctrlv_bench.py patch_apply       # 补丁写盘：整份读写（原来） / mmap 拼接 / 完整 apply_patch_to_file，含峰值内存
+    python smartctrlv_bench.py write             # 文件写入各模式：原地覆盖 / 原子替换 / 追加，各 fsync 策略
+    python smartctrlv_bench.py plan              # 动作计划：200 个文件的脚手架，串行 / 并发，含回滚
+"""
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+DEFAULT_SEED = 20240601
+
+# 语料目标大小（字节，近似）
+CORPUS_SIZES = {
+    "small": 256,
+    "medium": 16 * 1024,
+    "large": 1024 * 1024,
+    "huge": 5 * 1024 * 1024,
+}
+QUICK_SIZES = ("small", "medium", "large")
+
+
+# ===================== 语料生成 =====================
+
+_EXTS = [".txt", ".md", ".py", ".json", ".log", ".cpp", ".yaml", ""]
+_WORDS = [
+    "alpha", "beta", "gamma", "delta", "report", "notes", "main", "utils",
+    "config", "test", "data", "readme", "build", "draft", "todo", "server",
+]
+_COMMANDS = [
+    "cd src", "git status", "git add . && git commit -m \"wip\"", "pip install requests",
+    "python main.py --verbose", "npm install", "npm run build", "cargo build --release",
+    "dir /b", "ls -la | grep py", "make all", "conda activate base", "yarn test",
+]
+_LOG_LEVELS = ["INFO", "DEBUG", "WARN", "ERROR"]
+
+
+def _fill(rng, target_bytes, make_line):
+    lines = []
+    size = 0
+    while size < target_bytes:
+        line = make_line(rng)
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+    return "\n".join(lines)
+
+
+def gen_filenames(rng, target_bytes):
+    def make(rng):
+        return f"{rng.choice(_WORDS)}_{rng.randrange(100000)}{rng.choice(_EXTS)}"
+    return _fill(rng, target_bytes, make)
+
+
+def gen_shell_script(rng, target_bytes):
+    return _fill(rng, target_bytes, lambda rng: rng.choice(_COMMANDS))
+
+
+def gen_ai_chat(rng, target_bytes):
+    """模拟从 AI 聊天窗口复制的回答：说明文字 + 原来的写法是 / 可以改成 两段代码"""
+    def code(rng, fn, call):
+        body = [f"def {fn}():"]
+        for _ in range(rng.randrange(2, 6)):
+            body.append(f"    {call}(\"{rng.choice(_WORDS)}\")")
+        return "\n".join(body)
+
+    parts = []
+    size = 0
+    n = 0
+    while size < target_bytes:
+        fn = f"{rng.choice(_WORDS)}_{n}"
+        part = (
+            f"第 {n} 处修改：这里建议把 print 换成日志。\n"
+            "原来的写法是：\n"
+            f"{code(rng, fn, 'print')}\n"
+            "可以改成：\n"
+            "python\n"
+            "复制代码\n"
+            f"{code(rng, fn, 'logger.info')}\n"
+        )
+        parts.append(part)
+        size += len(part.encode("utf-8"))
+        n += 1
+    return "\n".join(parts)
+
+
+def gen_minified_json(rng, target_bytes):
+    items = []
+    size = 2
+    while size < target_bytes:
+        item = {
+            "id": rng.randrange(10 ** 6),
+            "name": rng.choice(_WORDS),
+            "tags": [rng.choice(_WORDS) for _ in range(3)],
+            "score": round(rng.random(), 4),
+        }
+        s = json.dumps(item, separators=(",", ":"))
+        items.append(s)
+        size += len(s) + 1
+    return "[" + ",".join(items) + "]"
+
+
+def gen_log(rng, target_bytes):
+    def make(rng):
+        ts = f"2025-02-{rng.randrange(1, 28):02d} {rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+        msg = " ".join(rng.choice(_WORDS) for _ in range(rng.randrange(4, 12)))
+        tail = "".join(rng.choice(string.hexdigits) for _ in range(8))
+        return f"{ts} [{rng.choice(_LOG_LEVELS)}] worker-{rng.randrange(16)}: {msg} id={tail}"
+    return _fill(rng, target_bytes, make)
+
+
+CORPUS_KINDS = {
+    "filenames": gen_filenames,
+    "shell": gen_shell_script,
+    "ai_chat": gen_ai_chat,
+    "json": gen_minified_json,
+    "log": gen_log,
+}
+
+
+def generate_corpus(kind: str, size: str, seed: int = DEFAULT_SEED) -> str:
+    """同一个 (kind, size, seed) 每次生成完全相同的文本"""
+    rng = random.Random(f"{seed}:{kind}:{size}")
+    return CORPUS_KINDS[kind](rng, CORPUS_SIZES[size])
+
+
+def generate_lines_corpus(kind: str, n_lines: int, seed: int = DEFAULT_SEED) -> str:
+    """按行数（而不是字节数）生成语料，正好 n_lines 行"""
+    rng = random.Random(f"{seed}:{kind}:{n_lines}lines")
+    target = n_lines * 64
+    while True:
+        lines = CORPUS_KINDS[kind](rng, target).splitlines()
+        if len(lines) >= n_lines:
+            return "\n".join(lines[:n_lines])
+        target *= 2
+
+
+# ===================== 计时 / 统计 =====================
+
+def silence_logs():
+    """
+    被测代码的输出都走 smartctrlv_log：整个基准测试期间既不打到控制台，也不写 / 轮转用户的 smartctrlv.log。
+    smartctrlv_main 导入时会把日志指向 LOG_DIR，所以先导入它再静音
+    """
+    import smartctrlv_log
+    try:
+        import smartctrlv_main  # noqa: F401
+    except ImportError:
+        pass
+    smartctrlv_log.configure(to_file=False, console=False)
+
+
+@contextlib.contextmanager
+def quiet():
+    """日志已经由 silence_logs 静音；这里再压掉被测代码里零星的 print（比如 tkinter 的报错）"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+def time_calls(fn, setup=None, max_iter=200, min_iter=3, budget_s=1.0):
+    """反复调用 fn，返回每次耗时（纳秒）。setup 在每次调用前执行，不计入耗时"""
+    samples = []
+    deadline = time.perf_counter() + budget_s
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while len(samples) < max_iter:
+            if setup is not None:
+                setup()
+            t0 = time.perf_counter_ns()
+            fn()
+            samples.append(time.perf_counter_ns() - t0)
+            if len(samples) >= min_iter and time.perf_counter() > deadline:
+                break
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return samples
+
+
+def percentile(sorted_samples, p):
+    if not sorted_samples:
+        return 0.0
+    k = (len(sorted_samples) - 1) * (p / 100.0)
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+def summarize(samples_ns):
+    s = sorted(samples_ns)
+    return {
+        "n": len(s),
+        "mean_us": round(sum(s) / len(s) / 1000.0, 3) if s else 0.0,
+        "p50_us": round(percentile(s, 50) / 1000.0, 3),
+        "p95_us": round(percentile(s, 95) / 1000.0, 3),
+        "p99_us": round(percentile(s, 99) / 1000.0, 3),
+    }
+
+
+def peak_memory_kib(fn, setup=None):
+    """单独跑一次测峰值内存（tracemalloc 会拖慢执行，所以不和计时混在一起）"""
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024.0, 1)
+
+
+def bench(fn, setup=None, with_memory=True, **kw):
+    result = summarize(time_calls(fn, setup=setup, **kw))
+    if with_memory:
+        result["peak_kib"] = peak_memory_kib(fn, setup=setup)
+    return result
+
+
+# ===================== 套件：Explorer Ctrl+V 决策流程 =====================
+
+PIPELINE_STAGES = (
+    "classify_clipboard_text",
+    "looks_like_filename_list",
+    "is_probable_shell_command",
+    "fake_ai_analyze_clipboard",
+    "normalize_code_block",
+    "on_ctrl_v_explorer",
+    "on_ctrl_v_explorer_repeat",
+)
+
+# 完整流程会真的在临时目录里建文件，超大文件名列表没有意义也太慢
+PIPELINE_MAX_CREATE_SIZE = "medium"
+
+
+@contextlib.contextmanager
+def isolated_stores(m, folder, enabled=None):
+    """
+    撤销日志 / 补丁备份库临时指向 folder 下面：基准测试建的临时文件不进用户的 undo/、backups/
+    （不然跑完一次，Ctrl+Alt+Z 就会提示撤销基准测试的临时文件）；enabled=False 时期间两者都关掉
+    """
+    backups = m.get_backups()
+    saved = [(store, store.folder, store.enabled) for store in (m.JOURNAL, backups)]
+    m.JOURNAL.configure(folder=os.path.join(folder, "undo"), enabled=enabled)
+    backups.configure(folder=os.path.join(folder, "backups"), enabled=enabled)
+    try:
+        yield
+    finally:
+        for store, old_folder, old_enabled in saved:
+            store.configure(folder=old_folder, enabled=old_enabled)
+
+
+def run_pipeline_suite(args):
+    from smartctrlv_backend import FakeBackend, set_backend
+    import smartctrlv_main as m
+
+    sizes = QUICK_SIZES if args.quick else tuple(CORPUS_SIZES)
+    kinds = args.corpora or tuple(CORPUS_KINDS)
+    stages = args.stages or PIPELINE_STAGES
+
+    backend = FakeBackend()
+    old_backend = set_backend(backend)
+    work_dir = tempfile.mkdtemp(prefix="smartctrlv_bench_")
+    state_dir = tempfile.mkdtemp(prefix="smartctrlv_bench_state_")
+    hwnd = 0x1001
+    results = {}
+
+    def reset_work_dir():
+        for name in os.listdir(work_dir):
+            p = os.path.join(work_dir, name)
+            if os.path.isdir(p):
+                shutil.rmtree(p, ignore_errors=True)
+            else:
+                os.remove(p)
+        backend.clear_events()
+
+    try:
+        with isolated_stores(m, state_dir):
+            for kind in kinds:
+                for size in sizes:
+                    text = generate_corpus(kind, size, seed=args.seed)
+                    stripped = text.strip()
+                    for stage in stages:
+                        if stage in ("on_ctrl_v_explorer", "on_ctrl_v_explorer_repeat"):
+                            if kind == "filenames" and list(CORPUS_SIZES).index(size) > list(CORPUS_SIZES).index(PIPELINE_MAX_CREATE_SIZE):
+                                continue
+
+                            # on_ctrl_v_explorer：每次都清空剪贴板缓存（冷启动）；
+                            # _repeat：同一份剪贴板连按，命中缓存
+                            def setup(text=text, cold=(stage == "on_ctrl_v_explorer")):
+                                reset_work_dir()
+                                backend.open_explorer(hwnd, work_dir)
+                                backend.clipboard_text = text
+                                if cold:
+                                    m.CLIPBOARD_CACHE.clear()
+
+                            fn = m.on_ctrl_v_explorer
+                        else:
+                            setup = None
+                            stage_fn = getattr(m, stage)
+
+                            def fn(stage_fn=stage_fn, stripped=stripped):
+                                stage_fn(stripped)
+
+                        with quiet():
+                            r = bench(fn, setup=setup, with_memory=not args.no_memory,
+                                      max_iter=args.max_iter, budget_s=args.budget)
+                        r["bytes"] = len(text.encode("utf-8"))
+                        key = f"{stage}/{kind}/{size}"
+                        results[key] = r
+                        print_row(key, r)
+    finally:
+        set_backend(old_backend)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    return results
+
+
+# ===================== 套件：命令识别吞吐（10 万行） =====================
+
+COMMAND_LINES = 100000
+COMMAND_KINDS = ("shell", "log", "ai_chat", "filenames")
+
+
+def run_commands_suite(args):
+    """
+    命令识别器吞吐：每种语料 10 万行，测
+    - CommandMatcher.command_lines（纯识别器，逐行）
+    - is_probable_shell_command（单遍分类，可能提前结束）
+    - fake_ai_analyze_clipboard（全文提取命令行）
+    结果里额外给出 klines_per_s（按 p50 计算）
+    """
+    from smartctrlv_backend import FakeBackend, set_backend
+    old_backend = set_backend(FakeBackend())
+    import smartctrlv_main as m
+    from smartctrlv_classify import get_command_matcher
+
+    n_lines = args.lines or COMMAND_LINES
+    kinds = args.corpora or COMMAND_KINDS
+    results = {}
+    try:
+        for kind in kinds:
+            text = generate_lines_corpus(kind, n_lines, seed=args.seed)
+            lines = [l.strip() for l in text.splitlines() if l.strip()]
+            matcher = get_command_matcher()
+            cases = {
+                "command_matcher": lambda: matcher.command_lines(lines),
+                "is_probable_shell_command": lambda: m.is_probable_shell_command(text),
+                "fake_ai_analyze_clipboard": lambda: m.fake_ai_analyze_clipboard(text),
+            }
+            for stage, fn in cases.items():
+                if args.stages and stage not in args.stages:
+                    continue
+                with quiet():
+                    r = bench(fn, with_memory=not args.no_memory,
+                              max_iter=args.max_iter, budget_s=args.budget)
+                r["lines"] = n_lines
+                r["klines_per_s"] = round(n_lines / (r["p50_us"] / 1e6) / 1000.0, 1) if r["p50_us"] else 0.0
+                key = f"{stage}/{kind}/{n_lines}lines"
+                results[key] = r
+                print_row(key, r)
+    finally:
+        set_backend(old_backend)
+    return results
+
+
+# ===================== 输出 / 基线 =====================
+
+# ===================== 套件：多格式菜单显示耗时 =====================
+
+MENU_ITERATIONS = 30
+
+
+def run_menu_suite(args):
+    """
+    Ctrl+Alt+V 菜单从“热键”到窗口真正显示（<Map>）的耗时：
+    - menu_cold: 原来的做法，每次新建 tk.Tk() + Toplevel + 全部按钮
+    - menu_warm: 常驻 UI 线程里预先建好的菜单，只挪位置 + 显示
+    需要图形界面；没有的话整个套件跳过。
+    """
+    try:
+        import tkinter as tk
+        tk.Tk().destroy()
+    except Exception as e:
+        print(f"[bench] 没有可用的图形界面，跳过 menu 套件: {e}")
+        return {}
+
+    import smartctrlv_main as m
+    from smartctrlv_menu_ui import PersistentMenu
+
+    n = min(args.max_iter, MENU_ITERATIONS)
+    key = m._menu_key()
+    screen = (1920, 1080)
+    results = {}
+
+    cold = []
+    with quiet():
+        for _ in range(n):
+            t0 = time.perf_counter_ns()
+            root = tk.Tk()
+            root.withdraw()
+            win = tk.Toplevel(root)
+            win.overrideredirect(True)
+            m._build_menu(win, key)
+            win.update_idletasks()
+            win.geometry(f"+{100}+{100}")
+            win.wait_visibility()
+            cold.append(time.perf_counter_ns() - t0)
+            root.destroy()
+    results["menu_cold"] = summarize(cold)
+    print_row("menu_cold", results["menu_cold"])
+
+    ui = PersistentMenu(m._build_menu)
+    if not ui.start():
+        print("[bench] 常驻菜单启动失败，跳过 menu_warm")
+        return results
+    ui.prebuild(key)
+    warm = []
+    with quiet():
+        for _ in range(n):
+            before = len(ui.samples)
+            t0 = time.perf_counter_ns()
+            ui.show(100, 100, key, screen, t0)
+            deadline = time.perf_counter() + 2.0
+            while len(ui.samples) == before and time.perf_counter() < deadline:
+                time.sleep(0.0005)
+            if len(ui.samples) > before:
+                warm.append(int(ui.samples[-1] * 1e6))
+            ui.hide()
+            time.sleep(0.02)
+    ui.stop()
+    if warm:
+        results["menu_warm"] = summarize(warm)
+        print_row("menu_warm", results["menu_warm"])
+    return results
+
+
+# ===================== 套件：Explorer 窗口查找 =====================
+
+SHELL_WINDOW_COUNTS = (5, 20, 100)
+
+
+def run_shell_suite(args):
+    """
+    在假的 Shell.Application 上比较“找当前 Explorer 文件夹”：
+    - shell_linear: 原来的做法，遍历 shell.Windows() 逐个读 HWND
+    - shell_index:  ShellWindowIndex，hwnd 字典 + 每次只读 Windows().Count
+    额外报告每次查找的“COM 属性读取”次数（真 COM 下每次都是跨进程调用）
+    """
+    from smartctrlv_backend import explorer_folder_path, find_shell_windows
+    from smartctrlv_shellcom import FakeShellApplication, ShellWindowIndex
+
+    results = {}
+    for n in SHELL_WINDOW_COUNTS:
+        shell = FakeShellApplication()
+        for hwnd in range(1, n + 1):
+            shell.add_window(hwnd, f"C:\\work\\dir{hwnd}")
+        target = n  # 最坏情况：在列表最后
+
+        index = ShellWindowIndex(max_age_s=3600)
+        index.resolve(shell, target, explorer_folder_path)  # 预先建好索引
+
+        cases = {
+            "shell_linear": lambda: explorer_folder_path(find_shell_windows(shell, target)),
+            "shell_index": lambda: index.resolve(shell, target, explorer_folder_path),
+        }
+        for name, fn in cases.items():
+            before = shell.property_reads
+            fn()
+            reads = shell.property_reads - before
+            r = bench(fn, with_memory=not args.no_memory, max_iter=args.max_iter, budget_s=args.budget)
+            r["com_reads"] = reads
+            key = f"{name}/{n}_windows"
+            results[key] = r
+            print_row(key, r)
+    return results
+
+
+# ===================== 套件：补丁定位 =====================
+
+PATCH_LINES = 100000
+
+
+def gen_python_source(rng, n_lines):
+    """按函数生成 Python 源码：def + 若干缩进行，函数之间空一行，正好 n_lines 行"""
+    lines = []
+    n = 0
+    while len(lines) < n_lines:
+        lines.append(f"def {rng.choice(_WORDS)}_{n}(value):")
+        for _ in range(rng.randrange(3, 9)):
+            lines.append(f"    {rng.choice(_WORDS)} = value.{rng.choice(_WORDS)}({rng.randrange(1000)})")
+        lines.append(f"    return {rng.choice(_WORDS)}")
+        lines.append("")
+        n += 1
+    return "\n".join(lines[:n_lines])
+
+
+def run_patch_suite(args):
+    """
+    apply_patch_to_file 的定位 + 替换（不写文件）：
+    - count_replace:  原来逐字节一致时的做法（参照），content.count 一遍再 content.replace 一遍；
+                      现在的 mmap 拼接写盘见 patch_apply 套件
+    - index_build:    BlockMatcher 规范化整个文件
+    - reindented:     旧块缩进 / 空白和文件不同（AI 粘贴常见），建索引 + 定位 + 重新缩进替换
+    - similar:        旧块里有一行被改过，按相似度定位
+    结果里额外给出 klines_per_s（按 p50 计算）
+    """
+    from smartctrlv_patchmatch import BlockMatcher
+
+    n_lines = args.lines or PATCH_LINES
+    rng = random.Random(f"{args.seed}:patch:{n_lines}")
+    content = gen_python_source(rng, n_lines)
+    lines = content.split("\n")
+
+    # 旧块取文件中间的一个函数
+    start = lines.index("", len(lines) // 2) + 1
+    end = lines.index("", start)
+    old_block = "\n".join(lines[start:end])
+    new_block = old_block.replace("return", "return None or")
+    # 缩进改成 Tab、行尾多空格：逐字节对不上
+    reindented = "\n".join(l.replace("    ", "\t") + "  " for l in lines[start:end])
+    similar = "\n".join(lines[start:end - 2] + ["    changed = value.changed(0)", lines[end - 1]])
+
+    def count_replace():
+        if content.count(old_block):
+            return content.replace(old_block, new_block, 1)
+
+    def locate(block):
+        matcher = BlockMatcher(content)
+        matches = matcher.find(block)
+        assert matches, "没有定位到旧代码块"
+        return matcher.replace(matches[:1], block, new_block)
+
+    cases = {
+        "count_replace": count_replace,
+        "index_build": lambda: BlockMatcher(content),
+        "reindented": lambda: locate(reindented),
+        "similar": lambda: locate(similar),
+    }
+    results = {}
+    for stage, fn in cases.items():
+        if args.stages and stage not in args.stages:
+            continue
+        r = bench(fn, with_memory=not args.no_memory, max_iter=args.max_iter, budget_s=args.budget)
+        r["lines"] = n_lines
+        r["klines_per_s"] = round(n_lines / (r["p50_us"] / 1e6) / 1000.0, 1) if r["p50_us"] else 0.0
+        key = f"patch_{stage}/{n_lines}lines"
+        results[key] = r
+        print_row(key, r)
+    return results
+
+
+# ===================== 套件：补丁写盘 =====================
+
+PATCH_APPLY_MIB = 10
+
+
+def _legacy_patch(path, old_block, new_block):
+    """原来的写法（参照）：整个读成 str -> count -> replace 出完整新内容 -> copyfile 出 .bak -> 整个写回"""
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        content = f.read()
+    if content.count(old_block) != 1:
+        raise AssertionError("没有定位到旧代码块")
+    new_content = content.replace(old_block, new_block, 1)
+    shutil.copyfile(path, path + ".bak")
+    with open(path, "w", encoding="utf-8", errors="ignore") as f:
+        f.write(new_content)
+
+
+def run_patch_apply_suite(args):
+    """
+    一处逐字节一致的补丁真正写盘（临时目录，每次从原文件开始，setup 不计时）：
+    - legacy:   _legacy_patch（整份 str + .bak 复制，参照）
+    - splice:   MappedFile.find_all + write_spliced 写进 AtomicFile 再换上去
+                （apply_patch_to_file 的写入部分，内存只和改动大小有关）
+    - apply:    完整的 apply_patch_to_file（FakeBackend；撤销日志和备份库关掉，只看写入路径）
+    文件：--lines 行（默认 10 万行）的源码，和约 PATCH_APPLY_MIB MiB 的源码；峰值内存是 Python 分配的部分
+    （mmap 映射不计入）
+    """
+    from smartctrlv_backend import FakeBackend, set_backend
+    from smartctrlv_fileio import AtomicFile
+    from smartctrlv_patchfile import MappedFile, edits_for
+    import smartctrlv_main as m
+
+    n_lines = args.lines or PATCH_LINES
+    rng = random.Random(f"{args.seed}:patch_apply:{n_lines}")
+    small = gen_python_source(rng, n_lines)
+    target = PATCH_APPLY_MIB * 1024 * 1024
+    big = gen_python_source(rng, int(n_lines * target / len(small) * 1.1) + 1)
+    big = big[:big.find("\n\n", target) + 1]
+
+    folder = tempfile.mkdtemp(prefix="smartctrlv_bench_")
+    old_backend = set_backend(FakeBackend())
+    results = {}
+    try:
+        with isolated_stores(m, folder, enabled=False):
+            for size_name, content in ((f"{n_lines}lines", small), (f"{PATCH_APPLY_MIB}MiB", big)):
+                lines = content.split("\n")
+                start = lines.index("", len(lines) // 2) + 1
+                end = lines.index("", start)
+                old_block = "\n".join(lines[start:end])
+                new_block = old_block.replace("return", "return None or")
+                path = os.path.join(folder, f"target_{size_name}.py")
+                data = content.encode("utf-8")
+
+                def reset():
+                    with open(path, "wb") as f:
+                        f.write(data)
+
+                def splice():
+                    old = old_block.encode("utf-8")
+                    out = AtomicFile(path)
+                    with MappedFile(path) as source:
+                        offsets = source.find_all(old)
+                        assert len(offsets) == 1, "没有定位到旧代码块"
+                        source.write_spliced(out, edits_for(offsets, len(old), new_block.encode("utf-8")))
+                        out.close()
+                    out.commit()
+
+                def apply():
+                    assert m.apply_patch_to_file(path, old_block, new_block)
+
+                cases = (
+                    ("legacy", lambda: _legacy_patch(path, old_block, new_block)),
+                    ("splice", splice),
+                    ("apply", apply),
+                )
+                for stage, fn in cases:
+                    if args.stages and stage not in args.stages:
+                        continue
+                    with quiet():
+                        r = bench(fn, setup=reset, with_memory=not args.no_memory,
+                                  max_iter=args.max_iter, budget_s=args.budget)
+                    r["bytes"] = len(data)
+                    key = f"patch_apply_{stage}/{size_name}"
+                    results[key] = r
+                    print_row(key, r)
+    finally:
+        set_backend(old_backend)
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+# ===================== 套件：文件写入 =====================
+
+WRITE_SIZES = {"1KiB": 1024, "1MiB": 1024 * 1024}
+
+
+def _legacy_append(path, text):
+    """原来的追加：exists + getsize + 打开读最后一个字节 + 再打开一次追加"""
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) not in (b"\n", b"\r")
+    with open(path, "a", encoding="utf-8", errors="ignore") as f:
+        if needs_newline:
+            f.write("\n")
+        f.write(text)
+
+
+def run_write_suite(args):
+    """
+    smartctrlv_fileio 的各写入模式（临时目录里真实写盘）：
+    - overwrite_inplace:  原来的 open(path, "w")（参照，读者可能看到半个文件）
+    - overwrite_atomic:   AtomicFile 临时文件 + os.replace，分 fsync=never / replace
+    - append_legacy:      原来的追加（参照）
+    - append:             append_text 一次打开，分 fsync=never / always
+    追加用例每次都从同一个初始文件开始（setup 里重建，不计时）
+    """
+    import smartctrlv_fileio as fio
+
+    old_policy = fio.get_fsync_policy()
+    rng = random.Random(f"{args.seed}:write")
+    folder = tempfile.mkdtemp(prefix="smartctrlv_bench_")
+    results = {}
+    try:
+        for size_name, size in WRITE_SIZES.items():
+            text = gen_log(rng, size)
+            path = os.path.join(folder, f"target_{size_name}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+
+            def reset_target():
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("seed line without newline")
+
+            def inplace():
+                with open(path, "w", encoding="utf-8", errors="ignore") as f:
+                    f.write(text)
+
+            cases = (
+                ("overwrite_inplace", None, inplace, None),
+                ("overwrite_atomic", fio.FSYNC_NEVER, lambda: fio.write_text_atomic(path, text), None),
+                ("overwrite_atomic", fio.FSYNC_REPLACE, lambda: fio.write_text_atomic(path, text), None),
+                ("append_legacy", None, lambda: _legacy_append(path, text), reset_target),
+                ("append", fio.FSYNC_NEVER, lambda: fio.append_text(path, text), reset_target),
+                ("append", fio.FSYNC_ALWAYS, lambda: fio.append_text(path, text), reset_target),
+            )
+            for stage, policy, fn, setup in cases:
+                name = stage if policy is None else f"{stage}[fsync={policy}]"
+                if args.stages and stage not in args.stages and name not in args.stages:
+                    continue
+                fio.set_fsync_policy(policy or fio.FSYNC_NEVER)
+                r = bench(fn, setup=setup, with_memory=not args.no_memory,
+                          max_iter=args.max_iter, budget_s=args.budget)
+                key = f"write_{name}/{size_name}"
+                results[key] = r
+                print_row(key, r)
+    finally:
+        fio.set_fsync_policy(old_policy)
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def gen_scaffold_plan(rng, n_files):
+    """n_files 个文件分在十来个包里的脚手架计划，再加一个追加和一个覆盖"""
+    actions = []
+    for i in range(n_files):
+        body = "".join(f"def f{j}():\n    return {rng.randint(0, 999)}\n\n" for j in range(rng.randint(2, 20)))
+        actions.append({"type": "create_file", "path": f"pkg{i % 12}/mod_{i}.py", "content": body})
+    actions.append({"type": "write_file", "path": "README.md", "mode": "append", "content": "more\n"})
+    actions.append({"type": "write_file", "path": "setup.cfg", "mode": "overwrite", "content": "[metadata]\n"})
+    return {"actions": actions}
+
+
+def run_plan_suite(args):
+    """
+    smartctrlv_plan 执行一份 200 个文件的脚手架计划（临时目录里真实写盘，每次从空目录开始，setup 不计时）：
+    - validate:  只解析 + 校验
+    - serial:    workers=1
+    - parallel:  workers=8（按路径分组并发）
+    - rollback:  最后一个动作失败，前面的全部回滚
+    """
+    import smartctrlv_plan as plan
+
+    rng = random.Random(f"{args.seed}:plan")
+    data = gen_scaffold_plan(rng, 200)
+    base = tempfile.mkdtemp(prefix="smartctrlv_bench_")
+    root = os.path.join(base, "root")
+    results = {}
+
+    def reset():
+        shutil.rmtree(root, ignore_errors=True)
+        os.mkdir(root)
+        for name in ("README.md", "setup.cfg"):
+            with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+                f.write("seed\n")
+
+    def apply(workers):
+        return lambda: plan.execute_plan(plan.parse_plan(data, root), root, workers=workers)
+
+    def rollback():
+        # 校验时挑不出来的失败：最后再“新建”已经存在的 setup.cfg，执行到它才撞上
+        actions = plan.parse_plan(data, root)
+        actions.append(plan.PlanAction(len(actions) + 1, plan.ACTION_CREATE_FILE,
+                                       os.path.join(root, "setup.cfg"), "setup.cfg"))
+        assert plan.execute_plan(actions, root, workers=8).rolled_back
+
+    try:
+        reset()
+        cases = (
+            ("validate", lambda: plan.parse_plan(data, root), None),
+            ("serial", apply(1), reset),
+            ("parallel", apply(8), reset),
+            ("rollback", rollback, reset),
+        )
+        for stage, fn, setup in cases:
+            if args.stages and stage not in args.stages:
+                continue
+            r = bench(fn, setup=setup, with_memory=not args.no_memory,
+                      max_iter=args.max_iter, budget_s=args.budget)
+            key = f"plan_{stage}/200"
+            results[key] = r
+            print_row(key, r)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+    return results
+
+
+# ===================== 冷启动 import =====================
+
+# 托盘启动时要加载的模块（按顺序测，装不上的跳过）
+STARTUP_MODULES = ("smartctrlv_main", "smartctrlv_tray")
+
+# 这些只在某个功能第一次用到时才 import，启动时出现在 sys.modules 里就算回退
+STARTUP_LAZY_MODULES = (
+    "tkinter",
+    "xml.dom.minidom",
+    "difflib",
+    "shutil",
+    "comtypes",
+    "comtypes.client",
+    "pyperclip",
+    "mouse",
+    "concurrent.futures",
+    "mmap",
+    "zlib",
+)
+
+
+def _import_time_us(module):
+    """新开一个解释器跑 python -X importtime -c "import module"，返回 module 的累计耗时（微秒）"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SCRIPT_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        return None
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module and not parts[2].startswith("  "):
+            try:
+                return int(parts[1])
+            except ValueError:
+                return None
+    return None
+
+
+def _eager_lazy_modules(module):
+    code = (
+        "import json, sys\n"
+        f"import {module}\n"
+        f"print(json.dumps([m for m in {list(STARTUP_LAZY_MODULES)!r} if m in sys.modules]))"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], cwd=SCRIPT_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_startup_suite(args):
+    """
+    冷启动 import 耗时（相当于 python -X importtime），每次都是新进程，
+    再检查“按需 import”的模块有没有被提前加载。
+    超过 --budget-ms 或者提前加载了 -> 记到 args.failures，退出码 1
+    """
+    results = {}
+    runs = 3 if args.quick else 7
+    for module in STARTUP_MODULES:
+        samples = [_import_time_us(module) for _ in range(runs)]
+        if any(x is None for x in samples):
+            print(f"{module:<58} 跳过（当前环境导入失败，可能缺少依赖）")
+            continue
+        r = summarize([x * 1000 for x in samples])
+        key = f"startup/{module}"
+        results[key] = r
+        print_row(key, r)
+
+        if r["p50_us"] > args.budget_ms * 1000:
+            args.failures.append(f"{module} 冷启动 {r['p50_us'] / 1000:.1f} ms > 预算 {args.budget_ms} ms")
+        eager = _eager_lazy_modules(module)
+        if eager:
+            args.failures.append(f"{module} 启动时就加载了: {', '.join(eager)}")
+    return results
+
+
+SUITES = {
+    "pipeline": run_pipeline_suite,
+    "commands": run_commands_suite,
+    "menu": run_menu_suite,
+    "shell": run_shell_suite,
+    "startup": run_startup_suite,
+    "patch": run_patch_suite,
+    "patch_apply": run_patch_apply_suite,
+    "write": run_write_suite,
+    "plan": run_plan_suite,
+}
+
+
+def print_header():
+    print(f"{'benchmark':<58} {'n':>5} {'p50(us)':>12} {'p95(us)':>12} {'p99(us)':>12} {'peak(KiB)':>10}")
+
+
+def print_row(key, r):
+    peak = r.get("peak_kib")
+    peak_s = f"{peak:>10.1f}" if peak is not None else f"{'-':>10}"
+    extra = f"  {r['klines_per_s']:.0f} klines/s" if "klines_per_s" in r else ""
+    if "com_reads" in r:
+        extra += f"  {r['com_reads']} COM reads"
+    print(f"{key:<58} {r['n']:>5} {r['p50_us']:>12.1f} {r['p95_us']:>12.1f} {r['p99_us']:>12.1f} {peak_s}{extra}")
+
+
+def make_report(suite, results, args):
+    return {
+        "meta": {
+            "suite": suite,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare_with_baseline(results, baseline, threshold, metric="p50_us", min_abs_us=5.0):
+    """
+    和基线对比：新值 / 旧值 > threshold 且绝对差值超过 min_abs_us 才算回退
+    （微秒级的小项抖动很大，不然全是噪声）。返回回退列表。
+    """
+    regressions = []
+    base_results = baseline.get("results", {})
+    print()
+    print(f"{'benchmark':<58} {'base':>12} {'now':>12} {'ratio':>8}")
+    for key, r in results.items():
+        b = base_results.get(key)
+        if not b or metric not in b:
+            continue
+        old, new = b[metric], r[metric]
+        ratio = (new / old) if old > 0 else float("inf")
+        flag = ""
+        if ratio > threshold and (new - old) > min_abs_us:
+            flag = "  <-- REGRESSION"
+            regressions.append((key, old, new, ratio))
+        print(f"{key:<58} {old:>12.1f} {new:>12.1f} {ratio:>8.2f}{flag}")
+    return regressions
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="SmartCtrlV benchmarks")
+    parser.add_argument("suite", nargs="?", default="pipeline", choices=sorted(SUITES))
+    parser.add_argument("--quick", action="store_true", help="跳过最大的语料")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--corpora", nargs="*", choices=sorted(CORPUS_KINDS))
+    parser.add_argument("--stages", nargs="*")
+    parser.add_argument("--lines", type=int, help="commands / patch 套件的语料行数（默认 100000）")
+    parser.add_argument("--max-iter", type=int, default=200)
+    parser.add_argument("--budget", type=float, default=1.0, help="每项最多计时多少秒")
+    parser.add_argument("--no-memory", action="store_true", help="不测峰值内存")
+    parser.add_argument("--save", metavar="PATH", help="把结果保存为基线 JSON")
+    parser.add_argument("--compare", metavar="PATH", help="和已保存的基线对比")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 变慢超过这个倍数算回退")
+    parser.add_argument("--budget-ms", type=float, default=60.0, help="startup 套件：冷启动 import 预算（毫秒）")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    args.failures = []
+
+    silence_logs()
+    print_header()
+    results = SUITES[args.suite](args)
+    report = make_report(args.suite, results, args)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n[Bench] 基线已保存到 {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n[Bench] 发现 {len(regressions)} 项性能回退（阈值 x{args.threshold}）。")
+            return 1
+        print("\n[Bench] 没有发现性能回退。")
+
+    if args.failures:
+        print()
+        for msg in args.failures:
+            print(f"[Bench] 超出预算: {msg}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
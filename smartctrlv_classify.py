@@ -0,0 +1,267 @@
+# smartctrlv_classify.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 剪贴板文本分类（单遍扫描）
+- 原来一次 Explorer Ctrl+V 会对整段文本 splitlines + strip 好几遍：
+  looks_like_filename_list 一遍，is_probable_shell_command 一遍（里面又调一次 looks_like_filename_list），
+  create_empty_files_by_clipboard_text 再来一遍
+- 这里只走一遍文本，不复制整段内容；能确定结论时立刻停下
+- 返回 ClipVerdict，里面带着每个非空行的 (起, 止) 偏移，后面的动作直接用，不用再扫
+"""
+
+import re
+
+VERDICT_EMPTY = "empty"          # 没有任何非空行
+VERDICT_FILENAMES = "filenames"  # 每一行都像文件名
+VERDICT_COMMAND = "command"      # 像 shell 命令 / 命令脚本
+VERDICT_TEXT = "text"            # 其他普通文本（忽略）
+
+# 与 str.splitlines() 的换行符集合保持一致
+_LINEBREAK_RE = re.compile(r"\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+# 只由 \w - . 组成的“干净文件名”，天然排除了空格、路径符号和 Windows 非法字符
+FILENAME_RE = re.compile(r"[\w\-.]+(\.[\w\-.]+)?")
+
+CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+
+SHELL_TOKENS = ("&&", "||", "|", ">", "<")
+COMMAND_PREFIXES = (
+    "cd ", "dir", "ls ", "git ", "pip ", "python", "py ",
+    "conda ", "npm ", "yarn ", "cargo ", "mvn ", "gradle ",
+    "clang", "gcc", "g++", "make ",
+)
+
+
+def iter_line_spans(text: str, start: int = 0):
+    """
+    逐行产出 (起, 止) 偏移：已经去掉首尾空白，跳过空行。
+    不做 splitlines，只在需要判断的时候切出当前这一行。
+    """
+    pos = start
+    n = len(text)
+    finder = _LINEBREAK_RE.finditer(text, start)
+    while pos <= n:
+        m = next(finder, None)
+        end = m.start() if m else n
+        if end > pos:
+            line = text[pos:end]
+            stripped = line.strip()
+            if stripped:
+                s = pos + (len(line) - len(line.lstrip()))
+                yield s, s + len(stripped)
+        if m is None:
+            return
+        pos = m.end()
+
+
+def is_filename_line(line: str) -> bool:
+    """line 已经 strip 过"""
+    return FILENAME_RE.fullmatch(line) is not None
+
+
+class CommandMatcher:
+    """
+    预编译的命令行识别器：
+    - 命令前缀（行首，忽略大小写）编进一条锚定在行首的 alternation 正则，一次 match 搞定
+    - shell 操作符是纯字面量，去掉被别的操作符包含的（"||" 里有 "|"）之后直接用 in 查找
+    - 原来每行都要 any(startswith) + any(in) 把所有前缀/操作符挨个试一遍
+    - 只在词表变化时重建（见 configure_command_matcher）
+    """
+
+    def __init__(self, prefixes=COMMAND_PREFIXES, shell_tokens=SHELL_TOKENS):
+        self.prefixes = tuple(dict.fromkeys(p.lower() for p in prefixes if p))
+        self.shell_tokens = tuple(dict.fromkeys(t for t in shell_tokens if t))
+
+        if self.prefixes:
+            alt = "|".join(re.escape(p) for p in sorted(self.prefixes, key=len, reverse=True))
+            self._prefix_match = re.compile(f"(?ai:{alt})").match
+        else:
+            self._prefix_match = lambda line: None
+
+        # 只要包含更短的操作符，长的就一定也能被短的命中
+        self._tokens = tuple(
+            t for t in self.shell_tokens
+            if not any(o != t and o in t for o in self.shell_tokens)
+        )
+
+    def is_command_line(self, line: str) -> bool:
+        """line 已经 strip 过：含 shell 操作符，或以常见命令开头"""
+        if self._prefix_match(line) is not None:
+            return True
+        for tok in self._tokens:
+            if tok in line:
+                return True
+        return False
+
+    def command_lines(self, lines):
+        """从（已 strip 的）行里挑出像命令的行，保持原顺序"""
+        return list(filter(self.is_command_line, lines))
+
+
+_COMMAND_MATCHER = CommandMatcher()
+
+
+def get_command_matcher() -> CommandMatcher:
+    return _COMMAND_MATCHER
+
+
+def configure_command_matcher(extra_prefixes=()) -> CommandMatcher:
+    """用“默认词表 + 用户在配置里追加的命令前缀”重建识别器；词表没变就什么都不做"""
+    global _COMMAND_MATCHER
+    prefixes = COMMAND_PREFIXES + tuple(p for p in (extra_prefixes or ()) if isinstance(p, str) and p)
+    wanted = tuple(dict.fromkeys(p.lower() for p in prefixes))
+    if wanted != _COMMAND_MATCHER.prefixes:
+        _COMMAND_MATCHER = CommandMatcher(prefixes, SHELL_TOKENS)
+    return _COMMAND_MATCHER
+
+
+def is_command_line(line: str) -> bool:
+    """line 已经 strip 过：含 shell 操作符，或以常见命令开头"""
+    return _COMMAND_MATCHER.is_command_line(line)
+
+
+class ClipVerdict:
+    """
+    分类结果：
+    - kind: VERDICT_EMPTY / VERDICT_FILENAMES / VERDICT_COMMAND / VERDICT_TEXT
+    - spans: 已扫描到的非空行偏移；complete=False 时说明提前结束，iter_lines() 会从断点继续
+    """
+
+    __slots__ = ("kind", "text", "spans", "complete", "scanned_to", "_lines")
+
+    def __init__(self, kind, text, spans, complete, scanned_to):
+        self.kind = kind
+        self.text = text
+        self.spans = spans
+        self.complete = complete
+        self.scanned_to = scanned_to
+        self._lines = None
+
+    @property
+    def is_filename_list(self) -> bool:
+        return self.kind == VERDICT_FILENAMES
+
+    @property
+    def is_command(self) -> bool:
+        return self.kind == VERDICT_COMMAND
+
+    def lines(self):
+        """
+        所有非空行（已 strip）。已扫描部分直接按偏移切；
+        提前结束时只对断点之后的剩余部分做一次 splitlines，不会从头再来。
+        """
+        if self._lines is None:
+            text = self.text
+            lines = [text[s:e] for s, e in self.spans]
+            if not self.complete:
+                rest = text[self.scanned_to:]
+                lines.extend(l.strip() for l in rest.splitlines() if l.strip())
+            self._lines = lines
+        return self._lines
+
+    def iter_lines(self):
+        return iter(self.lines())
+
+    def __repr__(self):
+        return f"ClipVerdict(kind={self.kind!r}, lines={len(self.spans)}, complete={self.complete})"
+
+
+def classify_clipboard_text(text: str, detect_commands: bool = True, max_lines: int = None) -> ClipVerdict:
+    """
+    一遍扫描判断整段文本是“文件名列表 / 命令 / 普通文本”，规则与原来的
+    looks_like_filename_list + is_probable_shell_command 完全一致：
+    - 每一行都像文件名 -> 文件名列表（就算某行是 dir / python 这种也不算命令）
+    - 否则多行：任意一行含 shell 操作符或命令前缀 -> 命令
+    - 否则单行：含中文 -> 普通文本；含空格 -> 命令
+    detect_commands=False 时只关心是不是文件名列表，遇到第一行不像文件名就停。
+    max_lines: 非空行超过这个数还没有结论 -> 直接判为普通文本（防止几千行变几千个文件）。
+    """
+    text = text or ""
+    spans = []
+    has_command_line = False
+
+    for s, e in iter_line_spans(text):
+        if max_lines is not None and len(spans) >= max_lines:
+            return ClipVerdict(VERDICT_TEXT, text, spans, False, s)
+        spans.append((s, e))
+        line = text[s:e]
+
+        if not is_filename_line(line):
+            # 第一行不像文件名的地方：已经不可能是文件名列表
+            if not detect_commands:
+                return ClipVerdict(VERDICT_TEXT, text, spans, False, e)
+            if has_command_line or is_command_line(line):
+                # 又出现过命令行 -> 结论确定，提前结束
+                return ClipVerdict(VERDICT_COMMAND, text, spans, False, e)
+            return _classify_rest(text, spans, e, max_lines)
+
+        if detect_commands and not has_command_line and is_command_line(line):
+            has_command_line = True
+
+    if not spans:
+        return ClipVerdict(VERDICT_EMPTY, text, spans, True, len(text))
+
+    # 每一行都像文件名
+    return ClipVerdict(VERDICT_FILENAMES, text, spans, True, len(text))
+
+
+def _classify_rest(text: str, spans, start: int, max_lines):
+    """
+    已经确定不是文件名列表、前面也没有命令行：剩下只需要找“后面还有没有命令行”，
+    不再需要逐行偏移，直接交给 C 层的 splitlines 批量处理。
+    """
+    count = len(spans)
+    is_cmd = _COMMAND_MATCHER.is_command_line
+    for raw in text[start:].splitlines():
+        ln = raw.strip()
+        if not ln:
+            continue
+        count += 1
+        if max_lines is not None and count > max_lines:
+            return ClipVerdict(VERDICT_TEXT, text, spans, False, start)
+        if is_cmd(ln):
+            return ClipVerdict(VERDICT_COMMAND, text, spans, False, start)
+
+    if count == 1:
+        line = text[spans[0][0]:spans[0][1]]
+        # 如果包含中文，就不要因为“有空格”而当成命令（大概率是自然语言）
+        if not CJK_RE.search(line) and " " in line:
+            return ClipVerdict(VERDICT_COMMAND, text, spans, True, len(text))
+
+    return ClipVerdict(VERDICT_TEXT, text, spans, False, start)
+
+
+def prescreen_clipboard_sample(sample: str, total_chars, max_command_chars: int,
+                               max_command_lines: int, max_lines: int) -> bool:
+    """
+    只看剪贴板文本的前缀样本，判断整段文本“绝不可能”是文件名列表或短命令。
+    返回 True 表示可以直接拒绝，不必读取 / 扫描整段文本。
+
+    - 短命令：总长度不超过 max_command_chars 且行数不超过 max_command_lines
+    - 文件名列表：样本里每个完整行都像文件名，且行数不超过 max_lines
+    样本最后一行可能被截断，只作为“行数”统计，不参与文件名判断。
+    """
+    could_be_command = total_chars is None or total_chars <= max_command_chars
+    could_be_filenames = True
+
+    # 截断点所在的那一行不完整，不拿它判断
+    cut = max(sample.rfind("\n"), sample.rfind("\r"))
+    complete = sample[:cut] if cut >= 0 else ""
+
+    line_count = 0
+    for s, e in iter_line_spans(complete):
+        line_count += 1
+        if could_be_filenames and not is_filename_line(complete[s:e]):
+            could_be_filenames = False
+        if line_count > max_command_lines:
+            could_be_command = False
+        if line_count > max_lines:
+            could_be_filenames = False
+        if not (could_be_command or could_be_filenames):
+            return True
+
+    # 一整个样本都没有换行：一行就有这么长，不可能是文件名
+    if cut < 0 and sample:
+        could_be_filenames = False
+
+    return not (could_be_command or could_be_filenames)
@@ -0,0 +1,168 @@
+# smartctrlv_clipcache.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 剪贴板分析缓存
+- 用户经常对同一份剪贴板连按几次 Ctrl+V（换个 Explorer 窗口、取消了写入对话框……）
+- 每次都重新读剪贴板、跑分类器、跑 fake_ai_analyze_clipboard 完全是浪费
+- 这里按“剪贴板序列号”缓存：解码后的文本 / 分类结果 / AI 解析计划
+  * Win32：GetClipboardSequenceNumber，命中时连剪贴板都不用读
+  * 没有序列号的后端（FakeBackend）：退回按内容哈希做 key
+- 序列号一变（剪贴板被改过）旧条目全部作废；条目数和总字符数都有上限
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from smartctrlv_classify import classify_clipboard_text
+
+
+class ClipboardEntry:
+    """
+    一份剪贴板内容的分析结果：
+    - text: strip 过的文本；reject_reason 不为 None 时是 None（超预算，没读）
+    - verdict(...) / plan(...) 第一次调用时计算，之后直接复用
+    """
+
+    __slots__ = ("key", "text", "reject_reason", "_verdicts", "_plan", "_lock")
+
+    def __init__(self, key, text, reject_reason=None):
+        self.key = key
+        self.text = text
+        self.reject_reason = reject_reason
+        self._verdicts = {}
+        self._plan = None
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.text) if self.text else 0
+
+    def verdict(self, detect_commands: bool = True, max_lines: int = None):
+        """classify_clipboard_text 的结果，按参数分别缓存（配置开关不同结论也不同）"""
+        params = (detect_commands, max_lines)
+        v = self._verdicts.get(params)
+        if v is None:
+            with self._lock:
+                v = self._verdicts.get(params)
+                if v is None:
+                    v = classify_clipboard_text(self.text or "", detect_commands=detect_commands, max_lines=max_lines)
+                    self._verdicts[params] = v
+        return v
+
+    def plan(self, analyze):
+        """analyze 一般是 fake_ai_analyze_clipboard；同一份文本只解析一次"""
+        if self._plan is None:
+            with self._lock:
+                if self._plan is None:
+                    self._plan = analyze(self.text or "")
+        return self._plan
+
+
+class ClipboardCache:
+    """
+    LRU 缓存：
+    - max_entries: 最多保留几份剪贴板内容（按内容哈希时同样的内容可能重复出现）
+    - max_chars: 所有条目文本加起来的字符上限；单条超过上限的不缓存
+    """
+
+    def __init__(self, max_entries: int = 8, max_chars: int = 8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries = OrderedDict()
+        self._total_chars = 0
+        self._last_seq = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def total_chars(self) -> int:
+        return self._total_chars
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "chars": self._total_chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_chars = 0
+            self._last_seq = None
+
+    def get(self, backend, loader) -> ClipboardEntry:
+        """
+        取当前剪贴板对应的条目。
+        loader() -> (text, reject_reason)：真正去读剪贴板，只在未命中时调用
+        （按内容哈希时必须先读出来才知道 key，所以也会调用）。
+        """
+        seq = None
+        try:
+            seq = backend.get_clipboard_sequence_number()
+        except Exception:
+            seq = None
+
+        if seq is not None:
+            key = ("seq", seq)
+            with self._lock:
+                if seq != self._last_seq:
+                    # 剪贴板变过：旧序列号永远不会再出现，对应条目全部作废
+                    self._drop_where(lambda k: k[0] == "seq")
+                    self._last_seq = seq
+                entry = self._lookup(key)
+            if entry is not None:
+                return entry
+            text, reject_reason = loader()
+        else:
+            text, reject_reason = loader()
+            if reject_reason is not None:
+                # 超预算的内容没读出来，没法算哈希，也没什么可缓存的
+                self.misses += 1
+                return ClipboardEntry(None, None, reject_reason)
+            key = ("hash", hashlib.blake2b((text or "").encode("utf-8", "surrogatepass"), digest_size=16).digest())
+            with self._lock:
+                entry = self._lookup(key)
+            if entry is not None:
+                return entry
+
+        entry = ClipboardEntry(key, text, reject_reason)
+        with self._lock:
+            self._store(entry)
+        return entry
+
+    # ---------- 内部（调用方持有 self._lock） ----------
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def _store(self, entry: ClipboardEntry):
+        if entry.size > self.max_chars:
+            return
+        old = self._entries.pop(entry.key, None)
+        if old is not None:
+            self._total_chars -= old.size
+        self._entries[entry.key] = entry
+        self._total_chars += entry.size
+        while self._entries and (len(self._entries) > self.max_entries or self._total_chars > self.max_chars):
+            _, evicted = self._entries.popitem(last=False)
+            self._total_chars -= evicted.size
+            self.evictions += 1
+
+    def _drop_where(self, pred):
+        for k in [k for k in self._entries if pred(k)]:
+            self._total_chars -= self._entries.pop(k).size
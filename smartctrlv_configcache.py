@@ -0,0 +1,138 @@
+# smartctrlv_configcache.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 配置快照
+- 原来每按一次 Ctrl+Alt+V 都要 load_config()：读盘 + 解析 JSON + 深拷贝默认配置 + 重建白名单
+- 现在配置只在文件真的变了（mtime / 大小变化，或者收到“文件已修改”通知）时才重新加载
+- 加载后生成一个只读的 ConfigSnapshot：白名单是 frozenset，菜单项是算好的元组，
+  热键路径直接用，最多一次 stat（后台监视线程开着时一次都不用）
+"""
+
+import os
+import threading
+
+# mark_loaded 的“现取一次”（文件不存在时 stamp 本身就是 None，不能拿 None 当默认值）
+_STAMP_NOW = object()
+
+# 多格式菜单的选项名，也是菜单里按钮的顺序
+MENU_ITEM_ORDER = ("raw", "plain", "markdown", "structured", "collapse_blank", "python_dedent")
+
+
+def file_stamp(path):
+    """(mtime_ns, size)；文件不存在返回 None。只做一次 stat"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ConfigSnapshot:
+    """
+    从合并好的配置 dict 派生出来的只读快照（创建后不能再改属性）。
+    config 本身仍是原 dict，调用方约定只读。
+    """
+
+    __slots__ = (
+        "config",
+        "ui_lang",
+        "menu_enabled",
+        "menu_hotkey",
+        "whitelist_enabled",
+        "whitelist_processes",
+        "menu_items",
+        "text_ext_whitelist",
+    )
+
+    def __init__(self, config: dict, ui_lang: str = "en"):
+        menu = config.get("menu", {})
+        opts = menu.get("options", {})
+        explorer = config.get("explorer", {})
+
+        set_ = object.__setattr__
+        set_(self, "config", config)
+        set_(self, "ui_lang", ui_lang)
+        set_(self, "menu_enabled", bool(menu.get("enabled", True)))
+        set_(self, "menu_hotkey", menu.get("hotkey", "ctrl+alt+v"))
+        set_(self, "whitelist_enabled", bool(menu.get("whitelist_enabled", True)))
+        set_(self, "whitelist_processes", frozenset(p.lower() for p in menu.get("whitelist_processes") or ()))
+        # 默认都 True，这样旧配置也能用
+        set_(self, "menu_items", tuple(name for name in MENU_ITEM_ORDER if opts.get(name, True)))
+        set_(self, "text_ext_whitelist", frozenset(e.lower() for e in explorer.get("text_ext_whitelist") or ()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot 是只读的")
+
+    def menu_allowed(self, exe_name) -> bool:
+        """这个进程能不能弹多格式菜单"""
+        if not self.whitelist_enabled:
+            return True
+        return bool(exe_name) and exe_name in self.whitelist_processes
+
+
+class ConfigFileWatcher:
+    """
+    记录上次加载时配置文件的 (mtime_ns, size)。
+    - changed(): 没开后台线程时做一次 stat 比较；开了的话只看标记，不碰磁盘
+    - invalidate(): 外部通知“文件改了”（比如托盘刚写完），下次 changed() 一定为 True
+    - start(): 后台线程每 poll_interval 秒 stat 一次
+    """
+
+    def __init__(self, path, poll_interval=1.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._stamp = None
+        self._loaded = False
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.stats_calls = 0
+        self.reloads = 0
+
+    @property
+    def watching(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stamp_now(self):
+        self.stats_calls += 1
+        return file_stamp(self.path)
+
+    def mark_loaded(self, stamp=_STAMP_NOW):
+        """
+        刚按 stamp 加载完（stamp 应该在读文件之前取，加载过程中文件又变了下次还能发现）；
+        不传就现取一次（例如自己刚写完配置文件）
+        """
+        self._stamp = self.stamp_now() if stamp is _STAMP_NOW else stamp
+        self._loaded = True
+        self._dirty = False
+        self.reloads += 1
+
+    def invalidate(self):
+        self._dirty = True
+
+    def changed(self) -> bool:
+        if not self._loaded or self._dirty:
+            return True
+        if self.watching:
+            return False
+        return self.stamp_now() != self._stamp
+
+    # ---------- 后台监视 ----------
+    def start(self):
+        if self.watching:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch_loop, name="SmartCtrlV-ConfigWatch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_interval + 1.0)
+        self._thread = None
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            if self._loaded and not self._dirty and self.stamp_now() != self._stamp:
+                self._dirty = True
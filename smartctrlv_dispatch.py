@@ -0,0 +1,215 @@
+# smartctrlv_dispatch.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 热键事件分发
+- 原来每按一次 Ctrl+V 就新开一个 threading.Thread；按住不放 / 连按时线程数没有上限，
+  它们同时改全局的 is_simulating / CONFIG，互相踩
+- 现在热键回调只把事件丢进一个有界队列，由固定数量的工作线程处理：
+  - 同一个热键的事件串行执行（不会有两个 Ctrl+V 处理同时跑）
+  - 合并：同一个热键已经在排队，或者距上一次被接受不到 coalesce_s，新来的不再排队
+  - 被合并 / 队列满 / 分发器没在跑：都执行 fallback（一般是原生 Ctrl+V）；
+    Ctrl+V 是 suppress 注册的，不执行 fallback 这次按键就等于被吞了
+- suppress 的热键回调是在键盘钩子里同步调用的：钩子里注入按键会被自己再次拦截。
+  所以钩子回调只 route(fn) 入队（O(1)），分流 / fallback 都在单独的 router 线程里跑，
+  fallback 也从不在调用 submit 的线程里执行
+- stats(): 队列深度 / 最大深度 / 合并数 / 丢弃数等计数
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+from smartctrlv_log import get_logger
+
+log = get_logger("Dispatch")
+
+
+class _Event:
+    __slots__ = ("key", "fn", "queued_at")
+
+    def __init__(self, key, fn, queued_at):
+        self.key = key
+        self.fn = fn
+        self.queued_at = queued_at
+
+
+class HotkeyDispatcher:
+    """
+    - workers: 工作线程数
+    - max_queue: 最多排队多少个事件（不含正在执行的）
+    - coalesce_s: 同一个热键在这段时间内重复触发只算一次
+    """
+
+    def __init__(self, workers=2, max_queue=8, coalesce_s=0.15, clock=time.monotonic,
+                 name="SmartCtrlV-Hotkey"):
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.coalesce_s = coalesce_s
+        self.name = name
+        self._clock = clock
+
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._pending_keys = {}     # key -> 排队中的个数
+        self._running_keys = set()
+        self._last_accepted = {}    # key -> 上一次被接受的时间
+        self._threads = []
+        self._router_queue = queue.SimpleQueue()
+        self._router = None
+        self._stopping = False
+
+        self.submitted = 0
+        self.executed = 0
+        self.coalesced = 0          # 被合并，走了 fallback
+        self.dropped = 0            # 队列满 / 没在跑，走了 fallback
+        self.errors = 0
+        self.max_depth = 0
+
+    # ---------- 生命周期 ----------
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        if self.running:
+            return
+        with self._cond:
+            self._stopping = False
+        self._threads = [
+            threading.Thread(target=self._work_loop, name=f"{self.name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+        self._router = threading.Thread(target=self._route_loop, name=f"{self.name}-Router", daemon=True)
+        self._router.start()
+
+    def stop(self, timeout=1.0):
+        """不再接受新事件；排队中的事件丢掉（不执行）"""
+        with self._cond:
+            self._stopping = True
+            self._pending.clear()
+            self._pending_keys.clear()
+            self._cond.notify_all()
+        self._router_queue.put(None)
+        for t in self._threads:
+            t.join(timeout)
+        if self._router is not None:
+            self._router.join(timeout)
+        self._threads = []
+        self._router = None
+
+    # ---------- 钩子回调入口 ----------
+    def route(self, fn):
+        """
+        钩子回调里调用：只把 fn 放进 router 队列就返回（O(1)）。
+        fn 在 router 线程里执行（看前台、决定原生粘贴还是 submit 之类）；router 没在跑时开一个临时线程
+        """
+        router = self._router
+        if router is not None and router.is_alive():
+            self._router_queue.put(fn)
+        else:
+            threading.Thread(target=self._run_safely, args=(fn,), name=f"{self.name}-Route", daemon=True).start()
+
+    def _route_loop(self):
+        while True:
+            fn = self._router_queue.get()
+            if fn is None:
+                return
+            self._run_safely(fn)
+
+    @staticmethod
+    def _run_safely(fn):
+        try:
+            fn()
+        except Exception as e:
+            log.error("router 执行失败: %s", e)
+
+    # ---------- 提交 ----------
+    def submit(self, key, fn, fallback=None) -> bool:
+        """
+        在工作线程里执行 fn()。返回 True 表示已排队；
+        被合并 / 队列满 / 已停止时返回 False，fallback 交给 router 线程执行（不在调用方线程里跑）
+        """
+        now = self._clock()
+        with self._cond:
+            self.submitted += 1
+            stopping = self._stopping or not self._threads
+            reason = "分发器未运行"
+            if not stopping:
+                last = self._last_accepted.get(key)
+                if self._pending_keys.get(key) or (last is not None and now - last < self.coalesce_s):
+                    self.coalesced += 1
+                    reason = None
+                elif len(self._pending) < self.max_queue:
+                    self._pending.append(_Event(key, fn, now))
+                    self._pending_keys[key] = self._pending_keys.get(key, 0) + 1
+                    self._last_accepted[key] = now
+                    self.max_depth = max(self.max_depth, len(self._pending))
+                    self._cond.notify()
+                    return True
+                else:
+                    reason = "事件队列已满"
+            if reason is not None:
+                self.dropped += 1
+
+        if reason is None:
+            log.debug("%s 连按被合并，退回默认行为", key)
+        else:
+            log.warning("%s，%s 退回默认行为", reason, key)
+        if fallback is not None:
+            self.route(fallback)
+        return False
+
+    # ---------- 执行 ----------
+    def _take(self):
+        """取第一个“同一热键没有在执行”的事件；调用方持有锁"""
+        for i, ev in enumerate(self._pending):
+            if ev.key not in self._running_keys:
+                del self._pending[i]
+                n = self._pending_keys.get(ev.key, 0) - 1
+                if n > 0:
+                    self._pending_keys[ev.key] = n
+                else:
+                    self._pending_keys.pop(ev.key, None)
+                self._running_keys.add(ev.key)
+                return ev
+        return None
+
+    def _work_loop(self):
+        while True:
+            with self._cond:
+                ev = None
+                while not self._stopping:
+                    ev = self._take()
+                    if ev is not None:
+                        break
+                    self._cond.wait()
+                if ev is None:
+                    return
+            try:
+                ev.fn()
+            except Exception as e:
+                self.errors += 1
+                log.error("%s 处理失败: %s", ev.key, e)
+            finally:
+                with self._cond:
+                    self._running_keys.discard(ev.key)
+                    self.executed += 1
+                    # 同一热键的下一个事件可能在等它
+                    self._cond.notify_all()
+
+    # ---------- 统计 ----------
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "queue_depth": len(self._pending),
+                "running": len(self._running_keys),
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "errors": self.errors,
+            }
@@ -0,0 +1,110 @@
+# smartctrlv_explorerctx.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 一次热键里的 Explorer 上下文快照
+- 原来 on_ctrl_v_explorer 依次单独查：选中项、当前文件夹、焦点控件类名、剪贴板格式，
+  每个都是一次跨进程调用；on_ai_smart_paste 换个顺序再查一遍，回退到 on_ctrl_v_explorer 时又全部重查
+- 现在热键入口抓一次 ExplorerContext，往下传，同一次热键里每样东西最多查一次：
+  - 焦点类名 / 剪贴板格式：抓快照时就取（本地调用，很便宜）
+  - 文件夹 + 选中项：第一次用到时一次 Shell 往返一起取回（前面的判断已经决定不接管时就不查）
+  - 剪贴板文本长度：第一次用到时取
+"""
+
+import threading
+
+from smartctrlv_backend import CLIP_FORMAT_FILE_DROP
+
+_UNSET = object()
+
+
+def is_text_input_class(class_name) -> bool:
+    """粗略判断焦点控件是不是 Edit 类控件（地址栏/搜索框/重命名）"""
+    if not class_name:
+        return False
+    return "Edit" in class_name or "EDIT" in class_name
+
+
+class ExplorerContext:
+    """
+    hwnd / exe_path: 前台窗口和它的 exe（拿不到是 None）
+    只在一次热键处理里使用，不跨热键复用（选中项、剪贴板随时会变）
+    """
+
+    __slots__ = (
+        "backend",
+        "hwnd",
+        "exe_path",
+        "exe_name",
+        "is_explorer",
+        "focus_class",
+        "clipboard_formats",
+        "_folder",
+        "_selection",
+        "_text_length",
+        "_lock",
+        "shell_queries",
+    )
+
+    def __init__(self, backend, hwnd, exe_path, exe_name=None):
+        self.backend = backend
+        self.hwnd = hwnd
+        self.exe_path = exe_path
+        if exe_name is None and exe_path:
+            exe_name = exe_path.replace("\\", "/").rsplit("/", 1)[-1].lower()
+        self.exe_name = exe_name
+        self.is_explorer = bool(exe_path) and "explorer.exe" in exe_path.lower()
+
+        self.focus_class = None
+        self.clipboard_formats = frozenset()
+        if self.is_explorer:
+            self.focus_class = backend.get_focus_class_name()
+            self.clipboard_formats = backend.get_clipboard_formats()
+
+        self._folder = _UNSET
+        self._selection = _UNSET
+        self._text_length = _UNSET
+        self._lock = threading.Lock()
+        self.shell_queries = 0
+
+    def __repr__(self):
+        return (f"ExplorerContext(hwnd={self.hwnd!r}, exe={self.exe_name!r}, "
+                f"focus={self.focus_class!r}, formats={sorted(self.clipboard_formats)})")
+
+    # ---------- 本地状态 ----------
+    @property
+    def text_input_focused(self) -> bool:
+        return is_text_input_class(self.focus_class)
+
+    @property
+    def clipboard_file_drop(self) -> bool:
+        return CLIP_FORMAT_FILE_DROP in self.clipboard_formats
+
+    @property
+    def clipboard_text_length(self):
+        """剪贴板文本字符数（同 Backend.get_clipboard_text_length），第一次用到时才查"""
+        if self._text_length is _UNSET:
+            self._text_length = self.backend.get_clipboard_text_length()
+        return self._text_length
+
+    # ---------- Shell 状态（一次往返） ----------
+    def _load_shell_state(self):
+        with self._lock:
+            if self._folder is _UNSET:
+                self.shell_queries += 1
+                folder, selection = None, []
+                if self.is_explorer and self.hwnd:
+                    folder, selection = self.backend.get_explorer_state(self.hwnd)
+                self._folder = folder
+                self._selection = list(selection or [])
+
+    @property
+    def folder(self):
+        if self._folder is _UNSET:
+            self._load_shell_state()
+        return self._folder
+
+    @property
+    def selection(self) -> list:
+        if self._selection is _UNSET:
+            self._load_shell_state()
+        return self._selection
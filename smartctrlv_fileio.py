@@ -0,0 +1,200 @@
+# smartctrlv_fileio.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 统一的文件写入
+- 覆盖写：原来 open(path, "w") 原地截断再写，编辑器自动重载 / 文件监视 / OneDrive 同步
+  正好在中间读到的就是半个文件；崩溃时文件直接坏掉
+  现在一律先写同目录的临时文件，再 os.replace 一步换上去（别人要么看到旧的、要么看到新的）
+- 追加：原来 exists + getsize + 打开读最后一个字节 + 再打开一次追加，每次 3~4 次系统调用 / 两次打开
+  现在只打开一次：同一个句柄上看最后一个字节要不要补换行，然后直接写
+- fsync 策略（配置 files.fsync）：
+  - "never":   都不 fsync（最快，断电可能丢最近的写入）
+  - "replace": 只有原子替换前 fsync 临时文件（默认；保证换上去的不会是空文件）
+  - "always":  追加也 fsync
+- 文本写入的换行规则和原来的文本模式一样：\\n 按系统换行写出
+"""
+
+import io
+import os
+import stat
+
+FSYNC_NEVER = "never"
+FSYNC_REPLACE = "replace"
+FSYNC_ALWAYS = "always"
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_REPLACE, FSYNC_ALWAYS)
+
+_fsync_policy = FSYNC_REPLACE
+
+
+def set_fsync_policy(policy):
+    global _fsync_policy
+    policy = str(policy).strip().lower()
+    _fsync_policy = policy if policy in FSYNC_POLICIES else FSYNC_REPLACE
+
+
+def get_fsync_policy() -> str:
+    return _fsync_policy
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+# ===================== 覆盖写：临时文件 + os.replace =====================
+
+def link_or_copy(src, dst):
+    """dst = src 的一个硬链接（不复制数据）；不支持时退回复制。已有的 dst 会被覆盖"""
+    try:
+        os.remove(dst)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(src, dst)
+    except OSError:
+        import shutil
+        shutil.copyfile(src, dst)
+
+
+class AtomicFile:
+    """
+    写到 path 同目录的临时文件，commit() 时一步替换 path；
+    - binary=False 时 file 是文本句柄（encoding / errors，换行和 open(path, "w") 一致）
+    - 用 with 时正常退出自动 commit，出异常自动 discard
+    - 源文件还被占用（比如 mmap 映射着）时可以先 close() 写完临时文件，之后再 commit()
+    """
+
+    def __init__(self, path, binary=True, encoding="utf-8", errors="strict"):
+        import tempfile
+
+        self.path = path
+        folder, name = os.path.split(os.path.abspath(path))
+        fd, self.tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=folder)
+        try:
+            if binary:
+                self.file = os.fdopen(fd, "wb")
+            else:
+                self.file = os.fdopen(fd, "w", encoding=encoding, errors=errors)
+        except Exception:
+            os.close(fd)
+            self._remove_tmp()
+            raise
+        self._closed = False
+        self._done = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def close(self):
+        """写完临时文件（按策略 fsync）；可以重复调用"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if _fsync_policy != FSYNC_NEVER:
+                _fsync(self.file)
+        finally:
+            self.file.close()
+
+    def commit(self, backup_path=None) -> bool:
+        """
+        换上去。backup_path 不为 None 时先让它指向旧文件（硬链接 / 复制）；
+        返回备份是否成功（备份失败照样替换，由调用方记日志）
+        """
+        try:
+            self.close()
+            try:
+                # 保留原文件的权限位（只读之类）
+                os.chmod(self.tmp, stat.S_IMODE(os.stat(self.path).st_mode))
+            except FileNotFoundError:
+                pass
+            backed_up = False
+            if backup_path:
+                try:
+                    link_or_copy(self.path, backup_path)
+                    backed_up = True
+                except OSError:
+                    pass
+            os.replace(self.tmp, self.path)
+        except Exception:
+            self.discard()
+            raise
+        self._done = True
+        return backed_up
+
+    def discard(self):
+        if self._done:
+            return
+        self._done = True
+        try:
+            self.close()
+        except Exception:
+            pass
+        self._remove_tmp()
+
+    def _remove_tmp(self):
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+
+def write_text_atomic(path, text, encoding="utf-8", errors="ignore"):
+    """整个替换 path 的内容"""
+    with AtomicFile(path, binary=False, encoding=encoding, errors=errors) as f:
+        f.write(text)
+
+
+def write_bytes_atomic(path, data):
+    with AtomicFile(path) as f:
+        f.write(data)
+
+
+# ===================== 追加：一次打开 =====================
+
+def append_text(path, text, encoding="utf-8", errors="ignore", smart_newline=True, before_write=None):
+    """
+    把 text 追加到 path 末尾，返回 (追加前的字节长度, 是否新建)；
+    smart_newline: 文件非空且最后一个字节不是换行时先补一个换行；
+    before_write(offset, created, mtime_ns): 真正写之前回调（撤销日志在这里记原长度 / 修改时间，不用再 stat 一次）
+    """
+    created = False
+    try:
+        f = open(path, "r+b")
+    except FileNotFoundError:
+        f = open(path, "xb")
+        created = True
+    with f:
+        st = os.fstat(f.fileno())
+        offset = f.seek(0, os.SEEK_END)
+        needs_newline = False
+        if smart_newline and offset > 0:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) not in (b"\n", b"\r")
+            f.seek(0, os.SEEK_END)
+
+        if before_write is not None:
+            before_write(offset, created, st.st_mtime_ns)
+
+        # 和文本模式的 "a" 一样按系统换行写出
+        out = io.TextIOWrapper(f, encoding=encoding, errors=errors)
+        try:
+            if needs_newline:
+                out.write("\n")
+            out.write(text)
+            out.flush()
+            if _fsync_policy == FSYNC_ALWAYS:
+                os.fsync(f.fileno())
+        finally:
+            out.detach()
+    return offset, created
@@ -0,0 +1,393 @@
+# smartctrlv_journal.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 粘贴操作的撤销日志
+- 原来 Explorer 里的写入 / 追加 / 建文件都没法撤销，只有补丁会留一个 .bak
+- 现在每次粘贴动作是一个事务，提交时往 journal.jsonl 末尾追加一行（只追加，不改旧行）：
+  - create:    新建的文件 / 文件夹 -> 撤销时删除（文件夹只在为空时删）
+  - append:    追加前的字节长度 offset -> 撤销时截断回去，不复制整个文件
+  - overwrite: 覆盖前的内容存一份到 blobs/ -> 撤销时写回
+- 每个操作提交时记下当时的大小和修改时间；撤销前先比对，
+  之后又被别的程序改过的文件不动（跳过并报告），不会把用户的新改动抹掉
+- 撤销本身也是追加一行 {"undo": id}
+- 保留策略：日志 + blobs 总量超过 max_bytes 时，从最旧的记录开始丢，
+  重写日志（write_bytes_atomic：临时文件 + os.replace）并删掉没人引用的 blob
+"""
+
+import json
+import os
+import threading
+import time
+
+from smartctrlv_fileio import write_bytes_atomic
+from smartctrlv_log import get_logger
+
+log = get_logger("Undo")
+
+JOURNAL_FILE_NAME = "journal.jsonl"
+BLOB_DIR_NAME = "blobs"
+
+OP_CREATE = "create"
+OP_APPEND = "append"
+OP_OVERWRITE = "overwrite"
+
+
+def _stamp(path):
+    """(大小, mtime_ns)；文件不存在返回 (None, None)"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    return st.st_size, st.st_mtime_ns
+
+
+class _Transaction:
+    __slots__ = ("label", "ops", "depth")
+
+    def __init__(self, label):
+        self.label = label
+        self.ops = []
+        self.depth = 0
+
+
+class _TransactionScope:
+    """with journal.transaction(...)：最外层退出时提交；嵌套的并进外层"""
+
+    __slots__ = ("journal", "label")
+
+    def __init__(self, journal, label):
+        self.journal = journal
+        self.label = label
+
+    def __enter__(self):
+        local = self.journal._local
+        tx = getattr(local, "tx", None)
+        if tx is None:
+            tx = local.tx = _Transaction(self.label)
+        tx.depth += 1
+        return tx
+
+    def __exit__(self, exc_type, exc, tb):
+        local = self.journal._local
+        tx = local.tx
+        tx.depth -= 1
+        if tx.depth == 0:
+            local.tx = None
+            # 出了异常也提交：已经落盘的改动照样能撤销
+            self.journal._commit(tx)
+        return False
+
+
+class UndoJournal:
+    """
+    folder: 日志目录（里面放 journal.jsonl 和 blobs/）
+    max_bytes: 日志 + blobs 的总量上限
+    max_blob_bytes: 单个覆盖前快照的上限，更大的文件覆盖后不可撤销（会记日志提示）
+    记录接口都要在改动之前调用（先记后写），提交时再补上改动之后的大小 / 修改时间
+    """
+
+    def __init__(self, folder, max_bytes=8 * 1024 * 1024, max_blob_bytes=None, enabled=True):
+        self.folder = folder
+        self.enabled = enabled
+        self.max_bytes = max(64 * 1024, int(max_bytes))
+        self.max_blob_bytes = max_blob_bytes if max_blob_bytes is not None else self.max_bytes // 4
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._entries = None        # 懒加载：[dict]，按 id 递增
+        self._next_id = 1
+        self._journal_bytes = 0
+        self._blob_bytes = 0
+
+        self.committed = 0
+        self.compactions = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.folder, JOURNAL_FILE_NAME)
+
+    @property
+    def blob_dir(self):
+        return os.path.join(self.folder, BLOB_DIR_NAME)
+
+    def configure(self, enabled=None, max_bytes=None, folder=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if max_bytes is not None:
+                self.max_bytes = max(64 * 1024, int(max_bytes))
+                self.max_blob_bytes = self.max_bytes // 4
+            if folder is not None and folder != self.folder:
+                self.folder = folder
+                self._entries = None
+
+    # ---------- 加载 ----------
+    def _load(self):
+        """第一次用到时读一遍日志；调用方持有锁"""
+        if self._entries is not None:
+            return
+        entries = {}
+        self._journal_bytes = 0
+        try:
+            with open(self.path, "rb") as f:
+                for raw in f:
+                    self._journal_bytes += len(raw)
+                    try:
+                        rec = json.loads(raw)
+                    except ValueError:
+                        # 写到一半断电的最后一行：忽略
+                        continue
+                    if "undo" in rec:
+                        entry = entries.get(rec["undo"])
+                        if entry is not None:
+                            entry["undone"] = True
+                    else:
+                        entries[rec["id"]] = rec
+        except OSError:
+            pass
+        self._entries = [entries[k] for k in sorted(entries)]
+        self._next_id = (self._entries[-1]["id"] + 1) if self._entries else 1
+
+        self._blob_bytes = 0
+        try:
+            with os.scandir(self.blob_dir) as it:
+                for entry in it:
+                    self._blob_bytes += entry.stat().st_size
+        except OSError:
+            pass
+
+    # ---------- 记录（改动之前调用） ----------
+    def transaction(self, label):
+        return _TransactionScope(self, label)
+
+    def _current(self):
+        if not self.enabled:
+            return None
+        return getattr(self._local, "tx", None)
+
+    def record_create(self, path, kind="file"):
+        """新建了 path（在创建之后调用也可以：撤销就是删掉它）"""
+        tx = self._current()
+        if tx is not None:
+            tx.ops.append({"op": OP_CREATE, "path": path, "kind": kind})
+
+    def record_append(self, path, offset=None, created=False, mtime=None):
+        """
+        马上要往 path 末尾追加：记下现在的长度和修改时间；文件还不存在（created）就当作新建。
+        offset / mtime 已知（写入层在同一个句柄上 fstat 过）时直接传进来，不再 stat
+        """
+        tx = self._current()
+        if tx is None:
+            return
+        if offset is None:
+            offset, mtime = _stamp(path)
+        if created or offset is None:
+            tx.ops.append({"op": OP_CREATE, "path": path, "kind": "file"})
+        else:
+            tx.ops.append({"op": OP_APPEND, "path": path, "offset": offset, "before": mtime})
+
+    def record_overwrite(self, path, replaced=False):
+        """
+        马上要覆盖 path：把现在的内容存成 blob；文件还不存在就当作新建。
+        replaced=True 表示调用方会用 os.replace 整个换掉（旧文件的数据不会被原地改写），
+        这时 blob 直接硬链接到旧文件，不复制
+        """
+        tx = self._current()
+        if tx is None:
+            return
+        size, before = _stamp(path)
+        if size is None:
+            tx.ops.append({"op": OP_CREATE, "path": path, "kind": "file"})
+            return
+        if size > self.max_blob_bytes:
+            log.warning("%s 有 %d 字节，超过快照上限，这次覆盖不可撤销", path, size)
+            return
+        blob = f"{time.time_ns():x}-{threading.get_ident():x}-{len(tx.ops)}.bin"
+        blob_path = os.path.join(self.blob_dir, blob)
+        try:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            linked = False
+            if replaced:
+                try:
+                    os.link(path, blob_path)
+                    linked = True
+                except OSError:
+                    pass
+            if not linked:
+                import shutil
+                shutil.copyfile(path, blob_path)
+        except OSError as e:
+            log.warning("保存覆盖前内容失败 %s: %s", path, e)
+            return
+        with self._lock:
+            self._blob_bytes += size
+        tx.ops.append({"op": OP_OVERWRITE, "path": path, "blob": blob, "before": before})
+
+    # ---------- 提交 ----------
+    def _commit(self, tx):
+        if not tx.ops:
+            return
+        for op in tx.ops:
+            op["size"], op["mtime"] = _stamp(op["path"])
+        with self._lock:
+            self._load()
+            entry = {"id": self._next_id, "ts": round(time.time(), 3), "label": tx.label, "ops": tx.ops}
+            self._next_id += 1
+            try:
+                self._append_line(entry)
+            except OSError as e:
+                log.error("写撤销日志失败: %s", e)
+                return
+            self._entries.append(entry)
+            self.committed += 1
+            if self._journal_bytes + self._blob_bytes > self.max_bytes:
+                self._compact()
+        log.debug("撤销日志 #%d %s: %d 个操作", entry["id"], tx.label, len(tx.ops))
+
+    def _append_line(self, rec):
+        data = (json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(data)
+        self._journal_bytes += len(data)
+
+    # ---------- 保留策略 ----------
+    def _entry_blob_bytes(self, entry):
+        total = 0
+        for op in entry["ops"]:
+            if op["op"] == OP_OVERWRITE:
+                try:
+                    total += os.path.getsize(os.path.join(self.blob_dir, op["blob"]))
+                except OSError:
+                    pass
+        return total
+
+    def _compact(self):
+        """丢最旧的记录直到总量降到 max_bytes 的一半；调用方持有锁"""
+        target = self.max_bytes // 2
+        lines = [json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in self._entries]
+        sizes = [len(line.encode("utf-8")) for line in lines]
+        blob_sizes = [self._entry_blob_bytes(e) for e in self._entries]
+
+        total = sum(sizes) + sum(blob_sizes)
+        drop = 0
+        while drop < len(self._entries) and total > target:
+            total -= sizes[drop] + blob_sizes[drop]
+            drop += 1
+
+        kept = self._entries[drop:]
+        write_bytes_atomic(self.path, "".join(lines[drop:]).encode("utf-8"))
+        self._entries = kept
+        self._journal_bytes = sum(sizes[drop:])
+
+        # 删掉没人引用的 blob（被丢弃的记录 / 写到一半没提交的）
+        referenced = {op["blob"] for e in kept for op in e["ops"] if op["op"] == OP_OVERWRITE and not e.get("undone")}
+        self._blob_bytes = 0
+        try:
+            with os.scandir(self.blob_dir) as it:
+                for entry in it:
+                    if entry.name in referenced:
+                        self._blob_bytes += entry.stat().st_size
+                    else:
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        self.compactions += 1
+        log.info("撤销日志已压缩：丢弃 %d 条，保留 %d 条", drop, len(kept))
+
+    # ---------- 撤销 ----------
+    def last_entry(self):
+        """最近一条还没撤销的记录（没有返回 None）"""
+        with self._lock:
+            self._load()
+            for entry in reversed(self._entries):
+                if not entry.get("undone"):
+                    return entry
+        return None
+
+    def _undo_op(self, op):
+        """撤销一个操作；返回 None 表示成功，否则返回跳过的原因"""
+        path = op["path"]
+        size, mtime = _stamp(path)
+        kind = op.get("kind")
+
+        if op["op"] == OP_CREATE and kind == "folder":
+            if size is None:
+                return "已不存在"
+            try:
+                os.rmdir(path)
+            except OSError:
+                return "文件夹不为空"
+            return None
+
+        if size is None:
+            return "已不存在"
+        if (size, mtime) != (op.get("size"), op.get("mtime")):
+            return "之后又被修改过"
+
+        if op["op"] == OP_CREATE:
+            os.remove(path)
+        elif op["op"] == OP_APPEND:
+            with open(path, "r+b") as f:
+                f.truncate(op["offset"])
+        elif op["op"] == OP_OVERWRITE:
+            import shutil
+            blob_path = os.path.join(self.blob_dir, op["blob"])
+            blob_size = os.path.getsize(blob_path)
+            shutil.copyfile(blob_path, path)
+            try:
+                os.remove(blob_path)
+            except OSError:
+                pass
+            with self._lock:
+                self._blob_bytes -= blob_size
+
+        # 修改时间也还原：更早的那条记录撤销时才认得出这个文件
+        before = op.get("before")
+        if before is not None:
+            os.utime(path, ns=(time.time_ns(), before))
+        return None
+
+    def undo_last(self):
+        """
+        把最近一次粘贴倒着撤销。返回 (entry, undone, skipped)：
+        undone 是撤销成功的路径，skipped 是 [(路径, 原因)]；没有可撤销的返回 (None, [], [])
+        """
+        entry = self.last_entry()
+        if entry is None:
+            return None, [], []
+
+        undone = []
+        skipped = []
+        for op in reversed(entry["ops"]):
+            try:
+                reason = self._undo_op(op)
+            except OSError as e:
+                reason = str(e)
+            if reason is None:
+                undone.append(op["path"])
+            else:
+                skipped.append((op["path"], reason))
+
+        with self._lock:
+            entry["undone"] = True
+            try:
+                self._append_line({"undo": entry["id"], "ts": round(time.time(), 3)})
+            except OSError as e:
+                log.error("写撤销日志失败: %s", e)
+        log.info("已撤销 #%d %s：%d 个成功，%d 个跳过", entry["id"], entry["label"], len(undone), len(skipped))
+        return entry, undone, skipped
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            return {
+                "entries": len(self._entries),
+                "journal_bytes": self._journal_bytes,
+                "blob_bytes": self._blob_bytes,
+                "committed": self.committed,
+                "compactions": self.compactions,
+            }
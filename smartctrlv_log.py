@@ -0,0 +1,270 @@
+# smartctrlv_log.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 异步日志
+- 原来到处是 print()：打包成无窗口 exe 后输出直接丢了；有控制台时，控制台一卡热键线程也跟着卡
+- 现在调用方只把记录丢进队列（不做 IO），后台写线程成批取出：
+  写进 LOG_DIR 下按大小轮转的日志文件（smartctrlv.log -> .1 -> .2 ...），有控制台时顺便打印
+- 级别：DEBUG / INFO / WARNING / ERROR，可以按分类（SmartCtrlV / MultiPaste / ShellCOM ...）单独调
+- 级别没开的调用只做一次整数比较；参数用 %s 占位，真正要写的时候才格式化
+- 队列满了（写线程跟不上）就丢弃并计数，绝不阻塞调用方
+"""
+
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARN", ERROR: "ERROR"}
+_LEVELS_BY_NAME = {"debug": DEBUG, "info": INFO, "warning": WARNING, "warn": WARNING, "error": ERROR}
+
+LOG_FILE_NAME = "smartctrlv.log"
+
+
+def parse_level(value, default=INFO) -> int:
+    if isinstance(value, int):
+        return value
+    return _LEVELS_BY_NAME.get(str(value).strip().lower(), default)
+
+
+class Logger:
+    """某个分类的日志入口；threshold 由 LogSink.configure 统一下发"""
+
+    __slots__ = ("category", "threshold", "_sink")
+
+    def __init__(self, sink, category, threshold):
+        self._sink = sink
+        self.category = category
+        self.threshold = threshold
+
+    def enabled(self, level) -> bool:
+        return level >= self.threshold
+
+    def log(self, level, msg, *args):
+        if level < self.threshold:
+            return
+        self._sink.emit(level, self.category, msg, args)
+
+    def debug(self, msg, *args):
+        if DEBUG >= self.threshold:
+            self._sink.emit(DEBUG, self.category, msg, args)
+
+    def info(self, msg, *args):
+        if INFO >= self.threshold:
+            self._sink.emit(INFO, self.category, msg, args)
+
+    def warning(self, msg, *args):
+        if WARNING >= self.threshold:
+            self._sink.emit(WARNING, self.category, msg, args)
+
+    def error(self, msg, *args):
+        if ERROR >= self.threshold:
+            self._sink.emit(ERROR, self.category, msg, args)
+
+
+class LogSink:
+    """
+    - level / categories: 全局级别，和按分类覆盖的级别（{"ShellCOM": "debug"}）
+    - path: 日志文件路径（None 表示不写文件）
+    - max_bytes / backups: 文件超过 max_bytes 就轮转，保留 backups 个旧文件
+    - console: 有 stdout 时是否也打印（打包成无窗口 exe 时 stdout 是 None，自动不打印）
+    - max_pending: 队列上限
+    """
+
+    def __init__(self, level=INFO, max_pending=10000, batch=256):
+        self.level = parse_level(level)
+        self.categories = {}
+        self.path = None
+        self.max_bytes = 1024 * 1024
+        self.backups = 3
+        self.console = True
+        self.batch = batch
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._loggers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file = None
+        self._file_size = 0
+        self._reopen = False
+
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    # ---------- 配置 ----------
+    def get_logger(self, category) -> Logger:
+        with self._lock:
+            logger = self._loggers.get(category)
+            if logger is None:
+                logger = Logger(self, category, self._threshold(category))
+                self._loggers[category] = logger
+            return logger
+
+    def _threshold(self, category):
+        return parse_level(self.categories.get(category, self.level), self.level)
+
+    def configure(self, level=None, categories=None, path=None, max_bytes=None, backups=None, console=None,
+                  to_file=None):
+        """只改传进来的项；文件路径变了下一批记录开始写新文件；to_file=False 不再写文件（基准测试用）"""
+        with self._lock:
+            if to_file is False:
+                self.path = None
+            if level is not None:
+                self.level = parse_level(level)
+            if categories is not None:
+                self.categories = dict(categories)
+            if max_bytes is not None:
+                self.max_bytes = max(4096, int(max_bytes))
+            if backups is not None:
+                self.backups = max(0, int(backups))
+            if console is not None:
+                self.console = bool(console)
+            if path is not None and path != self.path:
+                self.path = path
+                self._reopen = True
+            for category, logger in self._loggers.items():
+                logger.threshold = self._threshold(category)
+
+    # ---------- 调用方 ----------
+    def emit(self, level, category, msg, args):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((time.time(), level, category, msg, args))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=2.0) -> bool:
+        """等队列里现有的记录写完（退出前 / 测试用）"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    # ---------- 后台写线程 ----------
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="SmartCtrlV-Log", daemon=True)
+                self._thread.start()
+
+    def _write_loop(self):
+        while True:
+            records = [self._queue.get()]
+            try:
+                while len(records) < self.batch:
+                    records.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            lines = []
+            events = []
+            for rec in records:
+                if isinstance(rec, threading.Event):
+                    events.append(rec)
+                    continue
+                lines.append(self._format(rec))
+            if lines:
+                self._write("".join(lines))
+            for ev in events:
+                ev.set()
+
+    def _format(self, rec):
+        ts, level, category, msg, args = rec
+        if args:
+            try:
+                msg = msg % args
+            except Exception:
+                msg = " ".join([str(msg)] + [str(a) for a in args])
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+        return f"{stamp}.{int(ts * 1000) % 1000:03d} {_LEVEL_NAMES.get(level, level):<5} [{category}] {msg}\n"
+
+    def _write(self, data):
+        if self.console and sys.stdout is not None:
+            try:
+                sys.stdout.write(data)
+                sys.stdout.flush()
+            except Exception:
+                pass
+
+        path = self.path
+        if not path:
+            if self._file is not None:
+                self._close()
+            return
+        try:
+            if self._file is None or self._reopen:
+                self._open(path)
+            encoded = data.encode("utf-8")
+            if self._file_size and self._file_size + len(encoded) > self.max_bytes:
+                self._rotate(path)
+            self._file.write(encoded)
+            self._file.flush()
+            self._file_size += len(encoded)
+            self.written += data.count("\n")
+        except Exception:
+            self.errors += 1
+            self._close()
+
+    def _open(self, path):
+        self._close()
+        self._reopen = False
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "ab")
+        self._file_size = self._file.tell()
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except Exception:
+                pass
+        self._file = None
+        self._file_size = 0
+
+    def _rotate(self, path):
+        self._close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{path}.{i + 1}")
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+        self._open(path)
+
+    def stats(self) -> dict:
+        return {"pending": self._queue.qsize(), "written": self.written,
+                "dropped": self.dropped, "errors": self.errors}
+
+
+# 全进程共用一个
+SINK = LogSink()
+atexit.register(SINK.flush)
+
+
+def get_logger(category) -> Logger:
+    return SINK.get_logger(category)
+
+
+def configure(log_dir=None, **kwargs):
+    """
+    log_dir: 日志目录（文件名固定 smartctrlv.log；None 表示不改）；其余参数同 LogSink.configure，
+    比如 configure(to_file=False, console=False) 整个静音
+    """
+    path = os.path.join(log_dir, LOG_FILE_NAME) if log_dir else None
+    SINK.configure(path=path, **kwargs)
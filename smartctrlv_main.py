@@ -4,29 +4,60 @@ import json
 import threading
 import re
 import textwrap
-import tkinter as tk
-import urllib.parse
-import tkinter.messagebox as messagebox
 import sys
-import os
-import keyboard
-import pyperclip
-
-import subprocess
-import shutil  # 文件顶部如果还没 import 的话记得加上
-import difflib
 import locale
 
-import win32gui
-import win32process
-import win32api
-import win32con
-import win32clipboard as wcb
+# tkinter / xml.dom.minidom / shutil 只有用到对应功能（菜单、设置窗口、XML 格式化、备份）时才 import，
+# 托盘启动时不加载；见 smartctrlv_bench.py startup
 
-import mouse  # 全局鼠标监听
-import comtypes
-import comtypes.client
-import xml.dom.minidom as minidom
+# 所有 win32 / comtypes / keyboard / pyperclip / mouse 调用都走后端，
+# 这样本模块在 Linux 上也能导入，用 FakeBackend 无头驱动
+from smartctrlv_backend import (
+    get_backend,
+    ANSWER_YES,
+    ANSWER_NO,
+    ANSWER_CANCEL,
+)
+from smartctrlv_classify import (
+    classify_clipboard_text,
+    iter_line_spans,
+    is_filename_line,
+    prescreen_clipboard_sample,
+    configure_command_matcher,
+    get_command_matcher,
+    VERDICT_FILENAMES,
+    VERDICT_COMMAND,
+)
+from smartctrlv_clipcache import ClipboardCache
+from smartctrlv_precompute import ClipboardPrecomputer, MISS
+from smartctrlv_menu_ui import PersistentMenu
+from smartctrlv_configcache import ConfigSnapshot, ConfigFileWatcher
+from smartctrlv_procinfo import ProcessIdentityCache
+from smartctrlv_explorerctx import ExplorerContext, is_text_input_class
+from smartctrlv_dispatch import HotkeyDispatcher
+# smartctrlv_batch / smartctrlv_backup / smartctrlv_plan / smartctrlv_patchfile 第一次用到才 import
+# （会连带加载 concurrent.futures、zlib、hashlib、mmap），托盘启动不付这份钱
+from smartctrlv_journal import UndoJournal
+from smartctrlv_patchmatch import BlockMatcher
+from smartctrlv_fileio import AtomicFile, append_text, set_fsync_policy, write_text_atomic
+from smartctrlv_trace import (
+    TRACER,
+    STAGE_FOREGROUND,
+    STAGE_CLIPBOARD,
+    STAGE_COM,
+    STAGE_CLASSIFY,
+    STAGE_ACTION,
+    STAGE_INJECT,
+)
+import smartctrlv_log
+from smartctrlv_log import get_logger
+
+log = get_logger("SmartCtrlV")
+menu_log = get_logger("MultiPaste")
+ai_log = get_logger("AI Paste")
+patch_log = get_logger("AI Patch")
+precompute_log = get_logger("Precompute")
+dispatch_log = get_logger("Dispatch")
 
 # ========= 配置相关 =========
 
@@ -39,6 +70,10 @@ def get_base_dir():
 
 SCRIPT_DIR = get_base_dir()
 CONFIG_PATH = os.path.join(SCRIPT_DIR, "smartctrlv_config.json")
+LOG_DIR = SCRIPT_DIR
+
+# 先把日志文件位置定下来，加载配置时的输出也能进文件
+smartctrlv_log.configure(LOG_DIR)
 
 CONFIG_DEFAULT = {
     "explorer": {
@@ -51,6 +86,18 @@ CONFIG_DEFAULT = {
             ".json", ".yaml", ".yml", ".ini", ".cfg",
             ".py", ".js", ".ts", ".java", ".c", ".cpp", ".cs",
         ],
+        # 大剪贴板的快速拒绝预算（按字符数 / 非空行数）
+        "max_clipboard_chars": 2 * 1024 * 1024,  # 超过直接忽略，不读取内容
+        "max_clipboard_lines": 5000,             # 文件名列表最多这么多行
+        "max_command_chars": 16 * 1024,          # “短命令”最长多少字符
+        "max_command_lines": 200,                # “短命令”最多多少行
+        "sample_chars": 4096,                    # 前缀采样大小
+        # 额外的“命令前缀”，会追加到内置词表（cd / git / pip / npm ...）后面，例如 ["docker ", "kubectl "]
+        "extra_command_prefixes": [],
+        # 按行批量建文件 / 文件夹时的并发线程数（网络目录上能明显快很多）
+        "create_workers": 8,
+        # 剪贴板是一份动作计划（{"actions": [...]}，AI_Plan_config.json 格式）时：预览确认后整批执行
+        "enable_plan_from_clipboard": True,
     },
     "menu": {
         "whitelist_enabled": True,
@@ -76,14 +123,70 @@ CONFIG_DEFAULT = {
             "collapse_blank": True,
             "python_dedent": True,
         },
+
+        # 剪贴板一变化就在后台把启用的菜单变换先算好（默认关闭）
+        "precompute": {
+            "enabled": False,
+            "poll_ms": 100,               # 检查剪贴板序列号的间隔
+            "cpu_ms_per_item": 50,        # 每个变换的 CPU 时间上限，预计超限的不预计算
+            "max_chars": 1024 * 1024,     # 超过这个长度的剪贴板不预计算
+        },
     },
     "hotkeys": {
         "explorer_ctrl_v": "ctrl+v",
-    }
+        "undo_paste": "ctrl+alt+z",   # 撤销上一次 Explorer 粘贴
+    },
+    # 热键事件分发：固定几个工作线程 + 有界队列，不再每按一次开一个线程
+    "dispatch": {
+        "workers": 2,          # 工作线程数
+        "max_queue": 8,        # 排队上限，满了直接原生粘贴
+        "coalesce_ms": 150,    # 同一热键在这段时间内重复触发只处理一次
+    },
+    # 日志：写到 LOG_DIR/smartctrlv.log，按大小轮转
+    "log": {
+        "level": "info",       # debug / info / warning / error
+        "categories": {},      # 按分类单独调级别，例如 {"ShellCOM": "debug"}
+        "max_kb": 1024,        # 单个日志文件上限，超过就轮转
+        "backups": 3,          # 保留几个旧文件
+        "console": True,       # 有控制台时是否也打印
+    },
+    # 热键分阶段耗时记录（环形缓冲区，托盘里可以看汇总 / 导出 Chrome trace）
+    "trace": {
+        "enabled": True,
+        "capacity": 4096,      # 最多保留多少条 span
+    },
+    # 文件写入：覆盖一律临时文件 + os.replace；fsync 策略 never / replace / always
+    "files": {
+        "fsync": "replace",    # replace: 只在原子替换前 fsync；always: 追加也 fsync
+    },
+    # 粘贴操作的撤销日志（UNDO_DIR 下只追加的 journal.jsonl + 覆盖前快照）
+    "undo": {
+        "enabled": True,
+        "max_kb": 8192,        # 日志 + 快照总量上限，超过就丢最旧的记录
+    },
+    # 补丁前的备份（BACKUP_DIR 下按内容寻址、去重、相对上一版存差分；不再在文件旁边写 .bak）
+    "backup": {
+        "enabled": True,
+        "max_versions": 20,    # 每个文件最多保留几个版本
+        "max_mb": 256,         # 备份总量上限，超过就丢最旧的版本
+    },
 }
 
 CONFIG = CONFIG_DEFAULT.copy()
 
+UNDO_DIR = os.path.join(SCRIPT_DIR, "undo")
+JOURNAL = UndoJournal(UNDO_DIR)
+BACKUP_DIR = os.path.join(SCRIPT_DIR, "backups")
+# 补丁备份库：第一次打补丁时才创建（见 get_backups），在那之前配置先记在 _BACKUP_SETTINGS 里
+_BACKUPS = None
+_BACKUP_SETTINGS = {}
+_BACKUPS_LOCK = threading.Lock()
+
+# 配置文件的 mtime / 大小：没变就不重新加载
+CONFIG_WATCHER = ConfigFileWatcher(CONFIG_PATH)
+# 从 CONFIG 派生的只读快照（白名单 frozenset / 菜单项 / 界面语言），见 get_config_snapshot
+CONFIG_SNAPSHOT = None
+
 # ========= hooks 运行状态（给托盘用） =========
 # ========= hooks 运行状态 =========
 HOOKS_STARTED = False
@@ -121,7 +224,7 @@ def emergency_exit():
     try:
         for h in HOOK_HANDLES:
             try:
-                keyboard.remove_hotkey(h)
+                get_backend().remove_hotkey(h)
             except Exception:
                 pass
         HOOK_HANDLES = []
@@ -129,13 +232,14 @@ def emergency_exit():
 
         # 兜底再清一次（可能也会影响别的用 keyboard 的脚本，但我们只有一个的话没关系）
         try:
-            keyboard.clear_all_hotkeys()
+            get_backend().clear_all_hotkeys()
         except Exception:
             pass
     except Exception:
         pass
 
-    print("[SmartCtrlV] emergency_exit: 所有 hotkey 已卸载，进程将退出。")
+    log.warning("emergency_exit: 所有 hotkey 已卸载，进程将退出。")
+    flush_logs()
     os._exit(0)  # 直接硬退出，保证钩子被清理
 
 
@@ -155,6 +259,9 @@ def deep_update_dict(base: dict, override: dict):
 
 def load_config():
     global CONFIG
+    # 先记下文件状态再读：读的过程中文件又被改了，下次检查还能发现
+    stamp = CONFIG_WATCHER.stamp_now()
+    CONFIG_WATCHER.mark_loaded(stamp)
     try:
         if os.path.exists(CONFIG_PATH):
             with open(CONFIG_PATH, "r", encoding="utf-8") as f:
@@ -162,11 +269,11 @@ def load_config():
             cfg = json.loads(json.dumps(CONFIG_DEFAULT))  # 深拷贝一份默认
             deep_update_dict(cfg, user_cfg)
             CONFIG = cfg
-            print(f"[SmartCtrlV] 已加载配置文件: {CONFIG_PATH}")
+            log.info("已加载配置文件: %s", CONFIG_PATH)
         else:
-            print(f"[SmartCtrlV] 未找到配置文件，使用默认配置。")
+            log.info("未找到配置文件，使用默认配置。")
     except Exception as e:
-        print(f"[SmartCtrlV] 读取配置失败，使用默认配置。错误: {e}")
+        log.error("读取配置失败，使用默认配置。错误: %s", e)
         CONFIG = CONFIG_DEFAULT
 
 load_config
@@ -174,11 +281,13 @@ load_config
 def save_config():
     """把当前 CONFIG 写回 smartctrlv_config.json"""
     try:
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(CONFIG, f, indent=2, ensure_ascii=False)
-        print(f"[SmartCtrlV] 配置已保存到 {CONFIG_PATH}")
+        # 原子替换：配置监视线程不会读到写了一半的 JSON
+        write_text_atomic(CONFIG_PATH, json.dumps(CONFIG, indent=2, ensure_ascii=False), errors="strict")
+        # 自己刚写的，内存里的 CONFIG 已经是最新的，不需要再读回来
+        CONFIG_WATCHER.mark_loaded()
+        log.info("配置已保存到 %s", CONFIG_PATH)
     except Exception as e:
-        print(f"[SmartCtrlV] 保存配置失败: {e}")
+        log.error("保存配置失败: %s", e)
 
 # 给 Explorer Ctrl+V 用的标记，避免递归
 is_simulating = False
@@ -186,7 +295,6 @@ is_simulating = False
 # 多格式菜单用的状态
 last_foreground_hwnd = None
 menu_window = None
-root = None
 menu_visible = False
 
 
@@ -194,102 +302,51 @@ menu_visible = False
 ENABLE_EXPLORER_COMMAND = CONFIG["explorer"]["enable_command_from_clipboard"]
 ENABLE_EXPLORER_CREATE_FILES = CONFIG["explorer"]["enable_create_files_from_clipboard"]
 ENABLE_EXPLORER_WRITE_FILE = CONFIG["explorer"]["enable_write_file_from_clipboard"]
+ENABLE_EXPLORER_PLAN = CONFIG["explorer"]["enable_plan_from_clipboard"]
 
-def get_foreground_exe_path_and_hwnd():
-    hwnd = win32gui.GetForegroundWindow()
+# pid -> exe 路径 / 文件名（按进程创建时间校验），前台进程没变时不用再 OpenProcess
+PROCESS_CACHE = ProcessIdentityCache()
+
+
+def get_foreground_process():
+    """(ProcessInfo 或 None, hwnd)；两个“前台 exe”查询都走这里"""
+    backend = get_backend()
+    hwnd = backend.get_foreground_window()
     if not hwnd:
         return None, None
+    return PROCESS_CACHE.lookup(backend, hwnd), hwnd
 
-    _, pid = win32process.GetWindowThreadProcessId(hwnd)
-    try:
-        h_process = win32api.OpenProcess(
-            win32con.PROCESS_QUERY_INFORMATION | win32con.PROCESS_VM_READ,
-            False,
-            pid,
-        )
-    except Exception:
-        return None, hwnd
 
-    try:
-        exe_path = win32process.GetModuleFileNameEx(h_process, 0)
-    except Exception:
-        exe_path = None
-    finally:
-        win32api.CloseHandle(h_process)
-
-    return exe_path, hwnd
+def get_foreground_exe_path_and_hwnd():
+    info, hwnd = get_foreground_process()
+    if info is None:
+        return None, hwnd
+    return info.exe_path, hwnd
 
 
 def is_clipboard_file_drop():
-    CF_HDROP = 15
-    try:
-        return bool(wcb.IsClipboardFormatAvailable(CF_HDROP))
-    except Exception:
-        return False
-
-
-def _convert_location_url_to_path(url: str):
-    if not url or not url.lower().startswith("file:///"):
-        return None
-    path_part = url[8:]
-    path_part = urllib.parse.unquote(path_part)
-    path_part = path_part.replace("/", "\\")
-    return path_part
+    return get_backend().is_clipboard_file_drop()
 
 
 def get_explorer_folder_path(foreground_hwnd):
-    """通过 Shell.Application 找到当前 Explorer 文件夹路径"""
-    comtypes.CoInitialize()
-    try:
-        shell = comtypes.client.CreateObject("Shell.Application")
-        for window in shell.Windows():
-            try:
-                if not window or window.HWND != foreground_hwnd:
-                    continue
-
-                # 1) Document.Folder.Self.Path
-                try:
-                    doc = getattr(window, "Document", None)
-                    if doc is not None:
-                        folder = getattr(doc, "Folder", None)
-                        if folder is not None:
-                            self_item = getattr(folder, "Self", None)
-                            if self_item is not None:
-                                path = getattr(self_item, "Path", None)
-                                if path:
-                                    return path
-                except Exception:
-                    pass
-
-                # 2) LocationURL 兜底
-                try:
-                    loc = getattr(window, "LocationURL", None)
-                    path2 = _convert_location_url_to_path(loc) if loc else None
-                    if path2:
-                        return path2
-                except Exception:
-                    pass
-
-            except Exception:
-                continue
-
-        return None
-    finally:
-        comtypes.CoUninitialize()
+    """通过后端（Win32 下是 Shell.Application）找到当前 Explorer 文件夹路径"""
+    return get_backend().get_explorer_folder_path(foreground_hwnd)
 
 
 def is_explorer_text_input_focused():
     """粗略判断当前焦点是不是 Edit 类控件（地址栏/搜索框/重命名）"""
-    try:
-        focus_hwnd = win32gui.GetFocus()
-        if not focus_hwnd:
-            return False
-        class_name = win32gui.GetClassName(focus_hwnd)
-        if "Edit" in class_name or "EDIT" in class_name:
-            return True
-    except Exception:
-        pass
-    return False
+    return is_text_input_class(get_backend().get_focus_class_name())
+
+
+def capture_explorer_context():
+    """
+    本次热键的前台上下文快照（ExplorerContext）。
+    热键入口抓一次往下传，文件夹 / 选中项 / 焦点 / 剪贴板格式在同一次热键里不重复查询
+    """
+    info, hwnd = get_foreground_process()
+    if info is None:
+        return ExplorerContext(get_backend(), hwnd, None)
+    return ExplorerContext(get_backend(), hwnd, info.exe_path, info.exe_name)
 
 
 # ---------- 文件名 / 命令 判断 ----------
@@ -331,10 +388,9 @@ def looks_like_filename_list(text: str) -> bool:
     - 至少一行
     - 每一行都 looks_like_filename
     """
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    if not lines:
-        return False
-    return all(looks_like_filename(l) for l in lines)
+    # 单遍扫描，遇到第一行不像文件名就停
+    verdict = classify_clipboard_text(text, detect_commands=False)
+    return verdict.kind == VERDICT_FILENAMES
 
 def normalize_code_block(block: str) -> str:
     """
@@ -391,61 +447,8 @@ def is_probable_shell_command(text: str) -> bool:
             - 像纯文件名 => False
             - 含空格 / shell 操作符 / 常见命令前缀 => True
     """
-    text = text.strip()
-    if not text:
-        return False
-
-    # 整体是文件名列表 -> 绝不是命令
-    if looks_like_filename_list(text):
-        return False
-
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    if not lines:
-        return False
-
-    shell_tokens = ["&&", "||", "|", ">", "<"]
-    prefixes = [
-        "cd ", "dir", "ls ", "git ", "pip ", "python", "py ",
-        "conda ", "npm ", "yarn ", "cargo ", "mvn ", "gradle ",
-        "clang", "gcc", "g++", "make ",
-    ]
-
-    # 多行：只要有一行明显像命令，就认为是命令脚本
-    if len(lines) > 1:
-        for ln in lines:
-            low = ln.lower()
-            if any(tok in ln for tok in shell_tokens):
-                return True
-            if any(low.startswith(p) for p in prefixes):
-                return True
-        # 多行且没有明显命令特征 -> 不当命令（比如几千行代码）
-        return False
-
-    # 单行情况
-    line = lines[0]
-
-    # 单行如果像文件名 -> 不是命令
-    if looks_like_filename(line):
-        return False
-
-    # shell 特征：操作符
-    if any(tok in line for tok in shell_tokens):
-        return True
-
-    low = line.lower()
-    # 常见命令前缀
-    if any(low.startswith(p) for p in prefixes):
-        return True
-
-    # 如果包含中文，就不要因为“有空格”而当成命令（大概率是自然语言）
-    if re.search(r"[\u4e00-\u9fff]", line):
-        return False
-
-    # 对纯英文/符号的情况，保留“有空格大概率是命令”的经验规则
-    if " " in line:
-        return True
-
-    return False
+    # 规则的具体实现见 smartctrlv_classify.classify_clipboard_text（单遍扫描 + 提前结束）
+    return classify_clipboard_text(text).kind == VERDICT_COMMAND
 
 
 
@@ -517,108 +520,171 @@ def fake_ai_analyze_clipboard(text: str):
         })
 
     # -------- 3) 提取“明显像命令”的行 --------
-    shell_tokens = ["&&", "||", "|", ">", "<"]
-    prefixes = [
-        "cd ", "dir", "ls ", "git ", "pip ", "python", "py ",
-        "conda ", "npm ", "yarn ", "cargo ", "mvn ", "gradle ",
-        "clang", "gcc", "g++", "make ",
-    ]
+    # 和 is_probable_shell_command 共用同一个预编译识别器
     lang_words = {"python", "rust", "cpp", "c++", "java", "go"}
+    has_copy_button = "复制代码" in text
 
     lines = [l.strip() for l in text.splitlines() if l.strip()]
-    for ln in lines:
-        low = ln.lower()
-
+    for ln in get_command_matcher().command_lines(lines):
         # 如果全文包含“复制代码”，那单独的 "python" / "rust" 多半是按钮，不是命令
-        if low in lang_words and "复制代码" in text:
+        if has_copy_button and ln.lower() in lang_words:
             continue
-
-        if any(tok in ln for tok in shell_tokens) or any(low.startswith(p) for p in prefixes):
-            plan["commands"].append(ln)
+        plan["commands"].append(ln)
 
     return plan
 
 
 
 
-def run_shell_command_in_folder(folder: str, cmd_text: str):
+def run_shell_command_in_folder(folder: str, cmd_text: str, verdict=None):
     """
     在指定文件夹打开 cmd 并执行命令：
     - 支持多行：每一行当一条命令，用 && 串起来
+    - 传入 verdict（classify_clipboard_text 的结果）时直接复用里面的行偏移
     """
     try:
-        lines = [l.strip() for l in cmd_text.splitlines() if l.strip()]
+        if verdict is not None:
+            lines = verdict.lines()
+        else:
+            lines = [cmd_text[s:e] for s, e in iter_line_spans(cmd_text)]
         if not lines:
             return
 
         combined = " && ".join(lines)
-        print(f"[SmartCtrlV] 在 {folder} 打开 cmd 并执行: {combined}")
+        log.info("在 %s 打开 cmd 并执行: %s", folder, combined)
 
-        subprocess.Popen(
-            ["cmd.exe", "/K", combined],
-            cwd=folder,
-            creationflags=subprocess.CREATE_NEW_CONSOLE
-        )
+        get_backend().run_console_command(folder, combined)
     except Exception as e:
-        print(f"[SmartCtrlV] 打开 cmd 失败: {e}")
+        log.error("打开 cmd 失败: %s", e)
+
+
+def notify_user(title, message):
+    """一条汇总提示：写日志，托盘在的话再弹一个系统通知"""
+    log.info("%s: %s", title, message)
+    try:
+        get_backend().show_notification(title, message)
+    except Exception as e:
+        log.debug("通知失败: %s", e)
+
+
+def _create_workers():
+    return CONFIG["explorer"].get("create_workers", 8)
+
+
+def _report_batch(result):
+    """逐项结果只进 debug 日志，最后给用户一条汇总"""
+    from smartctrlv_batch import KIND_FOLDER
+
+    for path, kind in result.created:
+        log.debug("已创建%s: %s", "文件夹" if kind == KIND_FOLDER else "文件", path)
+    for name, error in result.failed:
+        log.error("创建失败 %s: %s", os.path.join(result.folder, name), error)
+    log.debug("批量创建统计: %s", result.stats())
+    if result.created or result.failed:
+        notify_user("SmartCtrlV", result.summary())
+
+
+def _create_batch_journaled(folder, items, skipped=()):
+    """create_batch + 撤销日志 + 汇总通知（批量创建在线程池里跑，建完再统一记日志）"""
+    from smartctrlv_batch import create_batch
+
+    with JOURNAL.transaction("create_files"):
+        result = create_batch(folder, items, workers=_create_workers(), skipped=skipped)
+        for path, kind in result.created:
+            JOURNAL.record_create(path, kind)
+    _report_batch(result)
+    return result
+
+
+def _looks_like_plan(text):
+    """smartctrlv_plan.looks_like_plan，第一次粘贴时才 import"""
+    from smartctrlv_plan import looks_like_plan
+
+    return looks_like_plan(text)
 
 
-def create_empty_files_by_clipboard_text(folder_path, text):
+def run_plan_in_folder(hwnd, folder, text):
+    """
+    剪贴板里的动作计划：先整份校验，弹预览让用户确认，再整批执行
+    （文件动作按路径并发、失败整批回滚；命令最后在该目录的 cmd 里跑）
+    """
+    from smartctrlv_plan import PlanError, execute_plan, parse_plan
+
+    try:
+        actions = parse_plan(text, folder)
+    except PlanError as e:
+        for index, message in e.errors:
+            log.warning("计划第 %d 个动作: %s", index, message)
+        notify_user("SmartCtrlV", f"计划没有执行：{e}")
+        return None
+
+    preview = execute_plan(actions, folder, dry_run=True).preview
+    lines = preview[:15]
+    if len(preview) > 15:
+        lines.append(f"……共 {len(preview)} 个动作")
+    msg = f"在 {folder} 执行这份计划？任何一步失败会整批回滚。\n\n" + "\n".join(lines)
+    if get_backend().ask_yes_no_cancel(hwnd, msg, "SmartCtrlV - 执行计划") != ANSWER_YES:
+        return None
+
+    result = execute_plan(
+        actions,
+        folder,
+        workers=_create_workers(),
+        run_command=get_backend().run_console_command,
+    )
+    for action, ms in result.applied:
+        log.debug("计划第 %d 个动作 %.2f ms: %s", action.index, ms, action.describe())
+    log.debug("计划执行统计: %s", result.stats())
+    notify_user("SmartCtrlV", result.summary())
+    return result
+
+
+def create_empty_files_by_clipboard_text(folder_path, text, verdict=None):
     """
     从剪贴板文本按行创建文件或文件夹：
     - 只对 looks_like_filename 的行建文件/文件夹
     - 有后缀名的 -> 创建文件
     - 无后缀名且长度合理 -> 创建文件夹
     - 其他奇怪内容（例如代码）全部跳过
+    - 传入 verdict（classify_clipboard_text 的结果）时直接复用里面的行偏移
+    - 先整张清单校验完，再交给 create_batch 并发创建；返回 BatchResult
     """
     if not folder_path:
-        return
+        return None
 
-    lines = [line.strip() for line in text.splitlines()]
-    lines = [line for line in lines if line]
+    from smartctrlv_batch import BatchItem, KIND_FILE, KIND_FOLDER
 
-    if not lines:
-        return
+    if verdict is not None:
+        lines = verdict.iter_lines()
+    else:
+        lines = (text[s:e] for s, e in iter_line_spans(text))
 
-    created_count = 0
     MAX_FOLDER_NAME_LEN = 100  # 文件夹名最大长度限制
 
+    items = []
+    skipped = []
     for name in lines:
-        if not looks_like_filename(name):
+        if not is_filename_line(name):
             # 不像正常文件名的行直接跳过，避免几千行代码变几千个文件
+            skipped.append(name)
             continue
 
-        base, ext = os.path.splitext(name)
+        _, ext = os.path.splitext(name)
 
         # 无后缀名：创建文件夹（长度需合理）
         is_folder = not ext and len(name) <= MAX_FOLDER_NAME_LEN
+        items.append(BatchItem(name, KIND_FOLDER if is_folder else KIND_FILE))
 
-        candidate = os.path.join(folder_path, base + ext)
-        index = 1
-        while os.path.exists(candidate):
-            candidate_name = f"{base} ({index}){ext}"
-            candidate = os.path.join(folder_path, candidate_name)
-            index += 1
-
-        try:
-            if is_folder:
-                os.makedirs(candidate)
-                print(f"[SmartCtrlV] 已创建文件夹: {candidate}")
-            else:
-                with open(candidate, "w", encoding="utf-8"):
-                    pass
-                print(f"[SmartCtrlV] 已创建文件: {candidate}")
-            created_count += 1
-        except Exception as e:
-            print(f"[SmartCtrlV] 创建失败 {candidate}: {e}")
+    if not items:
+        log.info("文本中没有合法文件名，不进行创建。")
+        return None
 
-    if created_count == 0:
-        print("[SmartCtrlV] 文本中没有合法文件名，不进行创建。")
+    return _create_batch_journaled(folder_path, items, skipped=skipped)
 
 
 # ---------- 选中文件获取 + 追加写入 ----------
 
-TEXT_EXT_WHITELIST = set(
+TEXT_EXT_WHITELIST = frozenset(
     ext.lower() for ext in CONFIG["explorer"]["text_ext_whitelist"]
 )
 
@@ -627,29 +693,7 @@ def get_explorer_selected_files(foreground_hwnd):
     """
     获取当前 Explorer 窗口选中的文件路径列表
     """
-    comtypes.CoInitialize()
-    try:
-        shell = comtypes.client.CreateObject("Shell.Application")
-        for window in shell.Windows():
-            try:
-                if not window or window.HWND != foreground_hwnd:
-                    continue
-                doc = getattr(window, "Document", None)
-                if doc is None:
-                    continue
-                items = doc.SelectedItems()
-                paths = []
-                for i in range(items.Count):
-                    item = items.Item(i)
-                    path = getattr(item, "Path", None)
-                    if path:
-                        paths.append(path)
-                return paths
-            except Exception:
-                continue
-        return []
-    finally:
-        comtypes.CoUninitialize()
+    return get_backend().get_explorer_selected_files(foreground_hwnd) or []
 
 def confirm_write_to_file(hwnd, file_path: str, text_len: int):
     """
@@ -670,12 +714,11 @@ def confirm_write_to_file(hwnd, file_path: str, text_len: int):
     )
     title = "SmartCtrlV - 写入文件"
 
-    flags = win32con.MB_YESNOCANCEL | win32con.MB_ICONQUESTION
-    res = win32api.MessageBox(hwnd, msg, title, flags)
+    res = get_backend().ask_yes_no_cancel(hwnd, msg, title)
 
-    if res == win32con.IDYES:
+    if res == ANSWER_YES:
         return "overwrite"
-    elif res == win32con.IDNO:
+    elif res == ANSWER_NO:
         return "append"
     else:
         return None
@@ -684,35 +727,31 @@ def confirm_write_to_file(hwnd, file_path: str, text_len: int):
 def write_text_to_file(file_path: str, text: str, mode: str):
     """
     按模式写入文本：
-    - mode == "overwrite": 覆盖写入
+    - mode == "overwrite": 覆盖写入（临时文件 + os.replace，别人不会读到半个文件）
     - mode == "append":    追加写入（智能补一个换行）
+    写之前先记撤销日志（覆盖存原内容，追加只记原长度）
     """
     try:
         if mode == "overwrite":
-            with open(file_path, "w", encoding="utf-8", errors="ignore") as f:
-                f.write(text)
-            print(f"[SmartCtrlV] 覆盖写入 {len(text)} 字符到 {file_path}")
+            with JOURNAL.transaction("write_file"):
+                JOURNAL.record_overwrite(file_path, replaced=True)
+                write_text_atomic(file_path, text)
+            log.info("覆盖写入 %d 字符到 %s", len(text), file_path)
         else:
-            # 追加逻辑 = 原来的 append_text_to_file
-            needs_newline = False
-            if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                with open(file_path, "rb") as f:
-                    try:
-                        f.seek(-1, os.SEEK_END)
-                        last = f.read(1)
-                        if last not in (b"\n", b"\r"):
-                            needs_newline = True
-                    except OSError:
-                        pass
-
-            with open(file_path, "a", encoding="utf-8", errors="ignore") as f:
-                if needs_newline:
-                    f.write("\n")
-                f.write(text)
-
-            print(f"[SmartCtrlV] 追加写入 {len(text)} 字符到 {file_path}")
+            # 追加逻辑 = append_text_to_file
+            _append_journaled(file_path, text)
+            log.info("追加写入 %d 字符到 %s", len(text), file_path)
     except Exception as e:
-        print(f"[SmartCtrlV] 写入失败 {file_path}: {e}")
+        log.error("写入失败 %s: %s", file_path, e)
+
+
+def _append_journaled(file_path: str, text: str):
+    """一次打开：同一个句柄上判断要不要补换行、记下原长度给撤销日志，然后追加"""
+    with JOURNAL.transaction("append_file"):
+        append_text(
+            file_path, text,
+            before_write=lambda offset, created, mtime: JOURNAL.record_append(file_path, offset, created, mtime),
+        )
 
 
 def append_text_to_file(file_path: str, text: str):
@@ -721,27 +760,10 @@ def append_text_to_file(file_path: str, text: str):
     - 如果文件非空且最后一字节不是换行，就先补一个换行
     """
     try:
-        needs_newline = False
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            with open(file_path, "rb") as f:
-                try:
-                    f.seek(-1, os.SEEK_END)
-                    last = f.read(1)
-                    if last not in (b"\n", b"\r"):
-                        needs_newline = True
-                except OSError:
-                    # 很小的文件之类，忽略
-                    pass
-
-        with open(file_path, "a", encoding="utf-8", errors="ignore") as f:
-            if needs_newline:
-                f.write("\n")
-            f.write(text)
-
-        print(f"[SmartCtrlV] 已追加 {len(text)} 字符到 {file_path}")
+        _append_journaled(file_path, text)
+        log.info("已追加 %d 字符到 %s", len(text), file_path)
     except Exception as e:
-        print(f"[SmartCtrlV] 追加写入失败 {file_path}: {e}")
-
+        log.error("追加写入失败 %s: %s", file_path, e)
 
 
 def _infer_substitution(old_block: str, new_block: str):
@@ -846,35 +868,82 @@ def apply_patch_to_file(file_path: str, old_block: str, new_block: str) -> bool:
 
     额外处理：
       - 自动对齐 Windows 文件的换行符(\r\n) 与 AI 文本中的(\n)，避免匹配不到。
-      - 任何写入前都会先生成 .bak 备份。
+      - 逐字节对不上时按规范化行匹配（缩进 / 行尾空白 / Tab 不同都算一致），
+        新代码按匹配处的缩进重新缩进；只是相似的位置要用户确认。
+      - 用 mmap 在原文件上找字节偏移，新文件 = 没改的字节区间 + 替换内容，
+        写进 AtomicFile 后一步换上去；替换前旧内容进备份库（BACKUP_DIR，
+        python smartctrlv_backup.py restore <文件> 可以恢复）。
     """
+    from smartctrlv_patchfile import MappedFile
+
     try:
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            content = f.read()
+        source = MappedFile(file_path)
     except Exception as e:
-        print(f"[AI Patch] 读取文件失败: {file_path}, {e}")
+        patch_log.error("读取文件失败: %s, %s", file_path, e)
         return False
 
+    # 在映射上定位、算出编辑（[(起, 止, 替换字节)]），写成临时文件；映射关掉之后再换上去
+    try:
+        with source:
+            edits = _plan_patch_edits(source, old_block, new_block)
+            if edits is None:
+                return False
+            out = AtomicFile(file_path)
+            try:
+                source.write_spliced(out, edits)
+                out.close()
+            except Exception:
+                out.discard()
+                raise
+    except Exception as e:
+        patch_log.error("写入文件失败: %s", e)
+        return False
+
+    # ---------- 原子替换（带备份） ----------
+
+    try:
+        backups = get_backups()
+        if backups.enabled:
+            if backups.backup(file_path):
+                patch_log.info("已备份: %s", file_path)
+            else:
+                patch_log.warning("备份失败: %s，但仍然写入。", file_path)
+        with JOURNAL.transaction("apply_patch"):
+            JOURNAL.record_overwrite(file_path, replaced=True)
+            out.commit()
+        patch_log.info("已成功将补丁/替换应用到: %s", file_path)
+        return True
+    except Exception as e:
+        patch_log.error("写入文件失败: %s", e)
+        return False
+
+
+def _plan_patch_edits(source, old_block: str, new_block: str):
+    """
+    apply_patch_to_file 的定位部分：返回按位置排序的编辑列表，用户取消 / 找不到返回 None。
+    逐字节能对上的（子串替换 / 代码块）直接在 mmap 上找偏移，只有按规范化行匹配时才解码全文。
+    """
+    from smartctrlv_patchfile import edits_for
+
     # ---------- 检测文件的换行风格，并对齐 old/new block ----------
 
-    if "\r\n" in content:
-        newline = "\r\n"
-    elif "\n" in content:
-        newline = "\n"
-    else:
-        newline = os.linesep  # 极少数奇怪文件，退回系统默认
+    newline = source.newline()
+
+    def _to_file_bytes(text):
+        # 把换行统一换成文件的换行风格
+        return text.replace("\r\n", "\n").replace("\n", newline).encode("utf-8")
 
-    # 把 old_block/new_block 中的换行统一换成文件的换行风格
-    ob_norm = old_block.replace("\r\n", "\n").replace("\n", newline)
-    nb_norm = new_block.replace("\r\n", "\n").replace("\n", newline)
+    ob_bytes = _to_file_bytes(old_block)
+    nb_bytes = _to_file_bytes(new_block)
 
     # ---------- 先尝试推断“子串替换模式”（多改一） ----------
 
     old_sub, new_sub = _infer_substitution(old_block, new_block)
-    use_substitution = False
 
     if old_sub and new_sub:
-        sub_count = content.count(old_sub)
+        sub_bytes = _to_file_bytes(old_sub)
+        sub_offsets = source.find_all(sub_bytes)
+        sub_count = len(sub_offsets)
         if sub_count > 1:
             def _preview(s: str, max_len: int = 40):
                 s = s.replace("\r", "\\r").replace("\n", "\\n")
@@ -894,95 +963,151 @@ def apply_patch_to_file(file_path: str, old_block: str, new_block: str) -> bool:
             )
             title = "SmartCtrlV - 子串替换模式（多改一）"
 
-            res = win32api.MessageBox(
-                0,
-                msg,
-                title,
-                win32con.MB_YESNOCANCEL | win32con.MB_ICONQUESTION
+            res = get_backend().ask_yes_no_cancel(0, msg, title)
+
+            if res == ANSWER_CANCEL:
+                patch_log.info("用户取消了子串替换/补丁操作。")
+                return None
+            elif res == ANSWER_YES:
+                # ---------- 分支 A：用户选择“子串全局替换”（多改一） ----------
+                patch_log.info("按“多改一”模式，对整个文件做子串全局替换。")
+                return edits_for(sub_offsets, len(sub_bytes), _to_file_bytes(new_sub))
+
+    # ---------- 分支 B：按“代码块补丁”处理（一改一 / 多改多） ----------
+
+    # 先找逐字节一致的；找不到再按规范化行匹配（缩进 / 空白不同也能对上）
+    offsets = source.find_all(ob_bytes)
+    block_count = len(offsets)
+    matcher = None
+    if block_count == 0:
+        matcher = BlockMatcher(source.text(), newline)
+        matches = matcher.find(old_block)
+        if not matches:
+            patch_log.warning("文件中没有找到要替换的旧代码块。（规范化缩进 / 空白后也对不上）")
+            return None
+        if not matches[0].exact:
+            # 只是相似：告诉用户在哪、像到什么程度，让用户确认
+            best = matches[0]
+            msg = (
+                "没有找到完全一致的旧代码块，但找到了一处相似的位置：\n\n"
+                f"  第 {best.start + 1} - {best.end} 行，相似度 {best.score:.0%}\n\n"
+                "是否按这个位置替换？（新代码会按该处的缩进对齐）"
             )
+            res = get_backend().ask_yes_no_cancel(0, msg, "SmartCtrlV - 代码块补丁（相似匹配）")
+            if res != ANSWER_YES:
+                patch_log.info("用户取消了相似位置的补丁操作。")
+                return None
+            matches = [best]
+        block_count = len(matches)
+        patch_log.info("旧代码块按规范化行匹配到 %d 处（缩进 / 空白不同）。", block_count)
+
+    def _edits(first_only):
+        if matcher is None:
+            return edits_for(offsets[:1] if first_only else offsets, len(ob_bytes), nb_bytes)
+        # 规范化行匹配是在解码后的全文上做的：整个文件作为一个编辑重写
+        new_content = matcher.replace(matches[:1] if first_only else matches, old_block, new_block)
+        return [(0, source.size, new_content.encode("utf-8"))]
+
+    if block_count == 1:
+        # 一改一：只出现一次，直接替换这一处
+        patch_log.info("旧代码块在文件中仅出现一次，按“一改一”模式替换。")
+        return _edits(True)
+
+    # 多改多：旧块出现多次，让用户选择
+    msg = (
+        "检测到旧代码块在文件中出现了多次。\n\n"
+        f"出现次数: {block_count}\n\n"
+        "你想如何应用这次补丁？\n\n"
+        "是(Y): 只替换第一个匹配（1 改 1）\n"
+        f"否(N): 替换全部 {block_count} 处（多改多）\n"
+        "取消: 不进行任何修改"
+    )
+    title = "SmartCtrlV - 代码块补丁（多改多）"
 
-            if res == win32con.IDCANCEL:
-                print("[AI Patch] 用户取消了子串替换/补丁操作。")
-                return False
-            elif res == win32con.IDYES:
-                use_substitution = True
-            else:
-                use_substitution = False
+    res = get_backend().ask_yes_no_cancel(0, msg, title)
 
-    # ---------- 分支 A：用户选择“子串全局替换”（多改一） ----------
+    if res == ANSWER_CANCEL:
+        patch_log.info("用户取消了多处补丁操作。")
+        return None
+    elif res == ANSWER_YES:
+        patch_log.info("用户选择“只改第一个”（1 改 1）。")
+        return _edits(True)
+    patch_log.info("用户选择“全部替换”（多改多，%d 处）。", block_count)
+    return _edits(False)
 
-    if use_substitution and old_sub and new_sub:
-        new_content = content.replace(old_sub, new_sub)
-        print("[AI Patch] 按“多改一”模式，对整个文件做子串全局替换。")
 
-    else:
-        # ---------- 分支 B：按“代码块补丁”处理（一改一 / 多改多） ----------
 
-        block_count = content.count(ob_norm)
-        if block_count == 0:
-            print("[AI Patch] 文件中没有找到要替换的旧代码块。（可能是缩进或内容不完全一致）")
-            return False
+# ---------- Ctrl+V：Explorer 中的智能行为 ----------
 
-        if block_count == 1:
-            # 一改一：只出现一次，直接替换这一处
-            new_content = content.replace(ob_norm, nb_norm, 1)
-            print("[AI Patch] 旧代码块在文件中仅出现一次，按“一改一”模式替换。")
-        else:
-            # 多改多：旧块出现多次，让用户选择
-            msg = (
-                "检测到旧代码块在文件中出现了多次。\n\n"
-                f"出现次数: {block_count}\n\n"
-                "你想如何应用这次补丁？\n\n"
-                "是(Y): 只替换第一个匹配（1 改 1）\n"
-                f"否(N): 替换全部 {block_count} 处（多改多）\n"
-                "取消: 不进行任何修改"
-            )
-            title = "SmartCtrlV - 代码块补丁（多改多）"
+def read_clipboard_text_bounded(backend, text_len):
+    """
+    在预算内读取剪贴板文本，返回 (text, reject_reason)：
+    - 已知长度超过 max_clipboard_chars -> 直接拒绝，不读取
+    - 先读 sample_chars 的前缀：整段都在前缀里就直接返回
+    - 前缀像一份动作计划（{"actions": [...]}）-> 不做采样判定，按计划读完（几百个文件的脚手架动辄几十 KB）
+    - 否则用前缀采样判断“绝不可能是文件名列表 / 短命令” -> 拒绝
+    - 最后最多读 max_clipboard_chars 个字符，还没读完说明超预算 -> 拒绝
+    整个过程读取量有上限，50 MB 的日志也不会卡住热键。
+    """
+    cfg = CONFIG["explorer"]
+    max_chars = cfg["max_clipboard_chars"]
+
+    if text_len is not None and text_len > max_chars:
+        return None, f"{text_len} 字符 > {max_chars}"
+
+    sample, truncated = backend.get_clipboard_text_prefix(cfg["sample_chars"])
+    if not truncated:
+        return sample, None
+
+    is_plan = ENABLE_EXPLORER_PLAN and _looks_like_plan(sample)
+    if not is_plan and prescreen_clipboard_sample(
+        sample,
+        text_len,
+        max_command_chars=cfg["max_command_chars"],
+        max_command_lines=cfg["max_command_lines"],
+        max_lines=cfg["max_clipboard_lines"],
+    ):
+        return None, f"前 {len(sample)} 字符采样判定"
 
-            res = win32api.MessageBox(
-                0,
-                msg,
-                title,
-                win32con.MB_YESNOCANCEL | win32con.MB_ICONQUESTION
-            )
+    text, truncated = backend.get_clipboard_text_prefix(max_chars)
+    if truncated:
+        return None, f"超过 {max_chars} 字符"
+    return text, None
 
-            if res == win32con.IDCANCEL:
-                print("[AI Patch] 用户取消了多处补丁操作。")
-                return False
-            elif res == win32con.IDYES:
-                new_content = content.replace(ob_norm, nb_norm, 1)
-                print("[AI Patch] 用户选择“只改第一个”（1 改 1）。")
-            else:
-                new_content = content.replace(ob_norm, nb_norm)
-                print(f"[AI Patch] 用户选择“全部替换”（多改多，{block_count} 处）。")
 
-    # ---------- 写回文件（带备份） ----------
+# 同一份剪贴板内容（按序列号 / 内容哈希）只读取、分类、解析一次
+CLIPBOARD_CACHE = ClipboardCache()
 
-    backup_path = file_path + ".bak"
-    try:
-        shutil.copyfile(file_path, backup_path)
-        print(f"[AI Patch] 已创建备份文件: {backup_path}")
-    except Exception as e:
-        print(f"[AI Patch] 创建备份失败: {e}，但仍尝试写入。")
 
-    try:
-        with open(file_path, "w", encoding="utf-8", errors="ignore") as f:
-            f.write(new_content)
-        print(f"[AI Patch] 已成功将补丁/替换应用到: {file_path}")
-        return True
-    except Exception as e:
-        print(f"[AI Patch] 写入文件失败: {e}")
-        return False
+def load_clipboard_entry(backend, text_len=None):
+    """
+    当前剪贴板对应的缓存条目（text 已 strip）。
+    未命中时按 read_clipboard_text_bounded 的预算读取；超预算时 entry.reject_reason 不为 None。
+    """
+    def loader():
+        n = backend.get_clipboard_text_length() if text_len is None else text_len
+        if n == 0:
+            return "", None
+        text, reject_reason = read_clipboard_text_bounded(backend, n)
+        if reject_reason:
+            return None, reject_reason
+        return (text or "").strip(), None
 
+    return CLIPBOARD_CACHE.get(backend, loader)
 
 
-# ---------- Ctrl+V：Explorer 中的智能行为 ----------
+def flush_logs(timeout=2.0):
+    """等日志写完（进程马上要退出时用）"""
+    smartctrlv_log.SINK.flush(timeout)
+
 
 def simulate_native_ctrl_v():
-    keyboard.send("ctrl+v")
+    with TRACER.span(STAGE_INJECT):
+        get_backend().send_keys("ctrl+v")
 
 
-def on_ctrl_v_explorer():
+@TRACER.traced("explorer_ctrl_v")
+def on_ctrl_v_explorer(ctx=None):
     """
     在资源管理器里的 Ctrl+V 智能行为：
     1) 如果选中单个文本文件 & 剪贴板是普通文本：
@@ -1003,50 +1128,49 @@ def on_ctrl_v_explorer():
         return
 
     # Alt + Ctrl + V：强制原生粘贴（逃生键）
-    if keyboard.is_pressed("alt"):
+    if get_backend().is_key_pressed("alt"):
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
         return
 
-    exe_path, hwnd = get_foreground_exe_path_and_hwnd()
-    if not exe_path or not hwnd:
+    # ctx：调用方（例如 AI 智能粘贴回退过来）已经抓好的上下文，直接复用
+    if ctx is None:
+        with TRACER.span(STAGE_FOREGROUND):
+            ctx = capture_explorer_context()
+    hwnd = ctx.hwnd
+    if not ctx.exe_path or not hwnd:
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
         return
 
-    exe_lower = exe_path.lower()
-
     # 非 explorer：直接原生粘贴
-    if "explorer.exe" not in exe_lower:
+    if not ctx.is_explorer:
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
         return
 
     # Explorer 中的输入框（重命名 / 地址栏 / 搜索框）：不接管
-    if is_explorer_text_input_focused():
+    if ctx.text_input_focused:
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
         return
 
     # 剪贴板是文件（复制文件/文件夹）：不接管
-    if is_clipboard_file_drop():
+    if ctx.clipboard_file_drop:
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
         return
 
-    # 先拿剪贴板文本
-    try:
-        text = pyperclip.paste()
-    except Exception:
-        text = ""
-
-    text = (text or "").strip()
-    if not text:
+    # 先只探测剪贴板文本有多大（不读取内容）
+    backend = ctx.backend
+    with TRACER.span(STAGE_CLIPBOARD):
+        text_len = ctx.clipboard_text_length
+    if text_len == 0:
         # 没文本就退回原生行为
         is_simulating = True
         simulate_native_ctrl_v()
@@ -1054,7 +1178,9 @@ def on_ctrl_v_explorer():
         return
 
     # ========= ① 优先检查：是否选中了单个“文本文件” =========
-    selected = get_explorer_selected_files(hwnd) or []
+    # 选中项和后面的当前文件夹是一次 Shell 往返一起取回来的
+    with TRACER.span(STAGE_COM):
+        selected = ctx.selection
     if ENABLE_EXPLORER_WRITE_FILE and len(selected) == 1:
         file_path = selected[0]
         if os.path.isfile(file_path):
@@ -1062,43 +1188,88 @@ def on_ctrl_v_explorer():
             ext = ext.lower()
 
             if ext in TEXT_EXT_WHITELIST:
-                # 选中文本文件时，无论内容长什么样，都按“写入文件”处理（由用户确认）
+                # 选中文本文件时，无论内容长什么样（多大都行），都按“写入文件”处理（由用户确认）
+                with TRACER.span(STAGE_CLIPBOARD):
+                    entry = load_clipboard_entry(backend, text_len)
+                    if entry.reject_reason is None:
+                        text = entry.text
+                    else:
+                        # 超出预算的大文本不进缓存，这里照样整段读出来写入
+                        text = (backend.get_clipboard_text() or "").strip()
+                if not text:
+                    is_simulating = True
+                    simulate_native_ctrl_v()
+                    is_simulating = False
+                    return
                 mode = confirm_write_to_file(hwnd, file_path, len(text))
                 if mode is None:
                     # 用户点取消 -> 什么都不做（最安全）
                     return
-                write_text_to_file(file_path, text, mode)
+                with TRACER.span(STAGE_ACTION):
+                    write_text_to_file(file_path, text, mode)
                 return
 
     # ========= ② 没有合适的“选中文本文件”，走原来的逻辑 =========
 
-    # 获取当前文件夹
-    folder = get_explorer_folder_path(hwnd)
+    # 大文本快速拒绝：超过预算的内容不可能是文件名列表或短命令，读都不读
+    with TRACER.span(STAGE_CLIPBOARD):
+        entry = load_clipboard_entry(backend, text_len)
+    if entry.reject_reason:
+        log.info("剪贴板文本过大（%s），不可能是文件名列表或短命令，忽略。", entry.reject_reason)
+        return
+
+    text = entry.text
+    if not text:
+        # 没文本就退回原生行为
+        is_simulating = True
+        simulate_native_ctrl_v()
+        is_simulating = False
+        return
+
+    # 获取当前文件夹（和选中项一起取回来了，这里一般不会再跨进程）
+    with TRACER.span(STAGE_COM):
+        folder = ctx.folder
     if not folder:
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
         return
 
+    # 动作计划（{"actions": [...]}）：预览确认后整批执行
+    if ENABLE_EXPLORER_PLAN and _looks_like_plan(text):
+        with TRACER.span(STAGE_ACTION):
+            run_plan_in_folder(hwnd, folder, text)
+        return
+
+    # 一遍扫描得出结论，后面的动作直接复用里面的行偏移（同一份剪贴板只扫一次）
+    with TRACER.span(STAGE_CLASSIFY):
+        verdict = entry.verdict(
+            detect_commands=ENABLE_EXPLORER_COMMAND,
+            max_lines=CONFIG["explorer"]["max_clipboard_lines"],
+        )
+
     # 像命令 -> 在该目录开 cmd 执行
-    if ENABLE_EXPLORER_COMMAND and is_probable_shell_command(text):
-        run_shell_command_in_folder(folder, text)
+    if ENABLE_EXPLORER_COMMAND and verdict.kind == VERDICT_COMMAND:
+        with TRACER.span(STAGE_ACTION):
+            run_shell_command_in_folder(folder, text, verdict=verdict)
         return
 
     # 像文件名列表 -> 创建空文件（只有“像文件名”的行才会建）
-    if ENABLE_EXPLORER_CREATE_FILES and looks_like_filename_list(text):
-        print(f"[SmartCtrlV] 在 {folder} 用剪贴板文本创建文件...")
-        create_empty_files_by_clipboard_text(folder, text)
+    if ENABLE_EXPLORER_CREATE_FILES and verdict.kind == VERDICT_FILENAMES:
+        log.info("在 %s 用剪贴板文本创建文件...", folder)
+        with TRACER.span(STAGE_ACTION):
+            create_empty_files_by_clipboard_text(folder, text, verdict=verdict)
         return
 
     # 其他情况（例如几千行代码）：为了安全，什么都不做
-    print("[SmartCtrlV] 剪贴板文本既不像命令，也不像文件名列表，忽略。")
+    log.info("剪贴板文本既不像命令，也不像文件名列表，忽略。")
     # 如果你希望这里退回“原生 Ctrl+V”，可以改成：
     # is_simulating = True
     # simulate_native_ctrl_v()
     # is_simulating = False
 
 
+@TRACER.traced("ai_smart_paste")
 def on_ai_smart_paste():
     """
     AI 智能粘贴（安全精简版）：
@@ -1121,44 +1292,47 @@ def on_ai_smart_paste():
 
     4）其他应用：普通 Ctrl+V
     """
-    # 1. 读剪贴板
-    try:
-        raw = pyperclip.paste()
-    except Exception:
-        raw = ""
-
-    raw = (raw or "").strip()
+    # 1. 读剪贴板（命中缓存时不用再读）
+    backend = get_backend()
+    with TRACER.span(STAGE_CLIPBOARD):
+        entry = load_clipboard_entry(backend)
+        if entry.reject_reason is None:
+            raw = entry.text
+        else:
+            entry = None
+            raw = (backend.get_clipboard_text() or "").strip()
     if not raw:
-        keyboard.send("ctrl+v")
+        simulate_native_ctrl_v()
         return
 
-    # 2. 当前前台进程
-    exe_path, hwnd = get_foreground_exe_path_and_hwnd()
-    if not exe_path or not hwnd:
-        keyboard.send("ctrl+v")
+    # 2. 当前前台进程（上下文快照，回退到 on_ctrl_v_explorer 时一并传过去）
+    with TRACER.span(STAGE_FOREGROUND):
+        ctx = capture_explorer_context()
+    if not ctx.exe_path or not ctx.hwnd:
+        simulate_native_ctrl_v()
         return
 
-    exe_lower = exe_path.lower()
-    exe_name = os.path.basename(exe_lower)
+    exe_name = ctx.exe_name
 
     # 3. 统一跑一遍“假 AI 解析”
-    plan = fake_ai_analyze_clipboard(raw)
+    with TRACER.span(STAGE_CLASSIFY):
+        plan = entry.plan(fake_ai_analyze_clipboard) if entry is not None else fake_ai_analyze_clipboard(raw)
     files = plan.get("files") or []
     commands = plan.get("commands") or []
     code_blocks = plan.get("code_blocks") or []
 
-    print("[AI Paste] plan:", plan)
+    ai_log.debug("plan: %s", plan)
 
     # ========= 场景 A：终端（一键只粘命令） =========
     terminal_exes = ["cmd.exe", "powershell.exe", "wt.exe", "windowsterminal.exe"]
     if exe_name in terminal_exes:
         if commands:
             cmd_text = "\n".join(commands)
-            pyperclip.copy(cmd_text)
-            keyboard.send("ctrl+v")
+            get_backend().set_clipboard_text(cmd_text)
+            simulate_native_ctrl_v()
             return
         else:
-            keyboard.send("ctrl+v")
+            simulate_native_ctrl_v()
             return
 
     # ========= 场景 B：代码编辑器（一键只粘代码） =========
@@ -1173,107 +1347,69 @@ def on_ai_smart_paste():
     if exe_name in editor_exes:
         if code_blocks:
             # 一般最后一个 code block 是“改完之后”的版本
-            pyperclip.copy(code_blocks[-1])
-            keyboard.send("ctrl+v")
+            get_backend().set_clipboard_text(code_blocks[-1])
+            simulate_native_ctrl_v()
             return
         else:
-            keyboard.send("ctrl+v")
+            simulate_native_ctrl_v()
             return
 
     # ========= 场景 C：资源管理器 =========
-    if "explorer.exe" in exe_lower:
+    if ctx.is_explorer:
         # 输入框内（重命名/搜索/地址栏）：别抢
-        if is_explorer_text_input_focused():
-            keyboard.send("ctrl+v")
+        if ctx.text_input_focused:
+            simulate_native_ctrl_v()
             return
 
         # 剪贴板是文件（复制文件/文件夹）：别抢
-        if is_clipboard_file_drop():
-            keyboard.send("ctrl+v")
+        if ctx.clipboard_file_drop:
+            simulate_native_ctrl_v()
             return
 
-        folder = get_explorer_folder_path(hwnd)
+        with TRACER.span(STAGE_COM):
+            folder = ctx.folder
+            selected = ctx.selection
         if not folder:
             # 拿不到当前目录，就退回原有智能 Ctrl+V
-            on_ctrl_v_explorer()
+            on_ctrl_v_explorer(ctx)
             return
 
-        selected = get_explorer_selected_files(hwnd) or []
-
         # 1）如果有选中的文件/文件夹：不做 AI 特殊操作，直接退回你原本的 Ctrl+V 逻辑
         if selected:
-            on_ctrl_v_explorer()
+            on_ctrl_v_explorer(ctx)
             return
 
         # 2）没有选中任何条目：可以认为是在“空白处”AI 粘贴
         #   - 创建文件并写入内容
         if files:
-            for f in files:
-                name = (f.get("name") or "").strip()
-                content = f.get("content") or ""
-                if not name or not looks_like_filename(name):
-                    continue
-
-                base, ext = os.path.splitext(name)
-                candidate = os.path.join(folder, base + ext)
-                index = 1
-                while os.path.exists(candidate):
-                    candidate_name = f"{base} ({index}){ext}"
-                    candidate = os.path.join(folder, candidate_name)
-                    index += 1
-
-                # 这里直接覆盖写入，因为是“新创建”的文件
-                write_text_to_file(candidate, content, mode="overwrite")
+            with TRACER.span(STAGE_ACTION):
+                from smartctrlv_batch import BatchItem, KIND_FILE
+
+                items = []
+                for f in files:
+                    name = (f.get("name") or "").strip()
+                    if not name or not looks_like_filename(name):
+                        continue
+                    # 新创建的文件，建的时候直接写入内容
+                    items.append(BatchItem(name, KIND_FILE, f.get("content") or ""))
+                if items:
+                    _create_batch_journaled(folder, items)
 
             return
 
         #   - 没有 files，但有命令：在该目录开 cmd 执行
         if commands:
             cmd_text = "\n".join(commands)
-            run_shell_command_in_folder(folder, cmd_text)
+            with TRACER.span(STAGE_ACTION):
+                run_shell_command_in_folder(folder, cmd_text)
             return
 
         #   - 既不是创建文件，也不是命令：退回你原来的智能 Ctrl+V 行为
-        on_ctrl_v_explorer()
+        on_ctrl_v_explorer(ctx)
         return
 
     # ========= 场景 D：其他应用 =========
-    keyboard.send("ctrl+v")
-
-
-    # ========== 场景 2：目录模式 ==========
-
-    # 2-1 有 files：在当前目录创建这些文件并写入内容
-    if ENABLE_EXPLORER_CREATE_FILES and files:
-        for f in files:
-            name = (f.get("name") or "").strip()
-            content = f.get("content") or ""
-            if not name or not looks_like_filename(name):
-                continue
-
-            base, ext = os.path.splitext(name)
-            candidate = os.path.join(folder, base + ext)
-            index = 1
-            while os.path.exists(candidate):
-                candidate_name = f"{base} ({index}){ext}"
-                candidate = os.path.join(folder, candidate_name)
-                index += 1
-
-            write_text_to_file(candidate, content, mode="overwrite")
-
-        return
-
-    # 2-2 有 commands：在当前目录开 cmd 执行
-    if ENABLE_EXPLORER_COMMAND and commands:
-        cmd_text = "\n".join(commands)
-        run_shell_command_in_folder(folder, cmd_text)
-        return
-
-    # 2-3 兜底：退回你原来的 Explorer 智能逻辑（命令/文件名列表判断）
-    on_ctrl_v_explorer()
-
-
-
+    simulate_native_ctrl_v()
 
 
 def on_ctrl_shift_v_explorer():
@@ -1285,15 +1421,15 @@ def on_ctrl_shift_v_explorer():
     """
     global is_simulating
 
-    exe_path, hwnd = get_foreground_exe_path_and_hwnd()
-    if not exe_path or not hwnd:
+    ctx = capture_explorer_context()
+    hwnd = ctx.hwnd
+    if not ctx.exe_path or not hwnd:
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
         return
 
-    exe_lower = exe_path.lower()
-    if "explorer.exe" not in exe_lower:
+    if not ctx.is_explorer:
         # 非资源管理器：走原生 Ctrl+V
         is_simulating = True
         simulate_native_ctrl_v()
@@ -1301,7 +1437,7 @@ def on_ctrl_shift_v_explorer():
         return
 
     # 取选中文件列表
-    selected = get_explorer_selected_files(hwnd) or []
+    selected = ctx.selection
     if len(selected) != 1:
         is_simulating = True
         simulate_native_ctrl_v()
@@ -1322,20 +1458,17 @@ def on_ctrl_shift_v_explorer():
 
     # 扩展名不在文本白名单 -> 不乱写
     if ext not in TEXT_EXT_WHITELIST:
-        print(f"[SmartCtrlV] {file_path} 扩展名 {ext} 不在文本白名单，退回原生粘贴。")
+        log.info("%s 扩展名 %s 不在文本白名单，退回原生粘贴。", file_path, ext)
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
         return
 
     # 获取剪贴板文本
-    try:
-        text = pyperclip.paste()
-    except Exception:
-        text = ""
+    text = get_backend().get_clipboard_text()
 
     if not text:
-        print("[SmartCtrlV] 剪贴板为空或不是文本，退回原生粘贴。")
+        log.info("剪贴板为空或不是文本，退回原生粘贴。")
         is_simulating = True
         simulate_native_ctrl_v()
         is_simulating = False
@@ -1346,57 +1479,90 @@ def on_ctrl_shift_v_explorer():
     # 不执行原生 Ctrl+V
 
 
+def _describe_undo_op(op):
+    name = os.path.basename(op["path"])
+    if op["op"] == "create":
+        return f"删除新建的{'文件夹' if op.get('kind') == 'folder' else '文件'} {name}"
+    if op["op"] == "append":
+        return f"把 {name} 截断回 {op['offset']} 字节"
+    return f"把 {name} 恢复成覆盖前的内容"
+
+
+def on_undo_paste():
+    """
+    撤销上一次粘贴（热键，默认 Ctrl+Alt+Z）：
+    - 从撤销日志里取最近一条没撤销的记录，先让用户确认
+    - 倒着撤销；之后又被改过的文件跳过不动
+    """
+    entry = JOURNAL.last_entry()
+    if entry is None:
+        notify_user("SmartCtrlV", "没有可以撤销的粘贴操作")
+        return
+
+    ops = entry["ops"]
+    lines = [_describe_undo_op(op) for op in reversed(ops[:10])]
+    if len(ops) > 10:
+        lines.append(f"……共 {len(ops)} 项")
+    when = time.strftime("%H:%M:%S", time.localtime(entry["ts"]))
+    msg = f"撤销 {when} 的粘贴操作？\n\n" + "\n".join(lines)
+    if get_backend().ask_yes_no_cancel(0, msg, "SmartCtrlV - 撤销粘贴") != ANSWER_YES:
+        return
+
+    _, undone, skipped = JOURNAL.undo_last()
+    for path, reason in skipped:
+        log.warning("撤销跳过 %s: %s", path, reason)
+    text = f"已撤销 {len(undone)} 项"
+    if skipped:
+        text += f"，跳过 {len(skipped)} 项（{os.path.basename(skipped[0][0])}: {skipped[0][1]}）"
+    notify_user("SmartCtrlV", text)
+
+
 
 # ========= 多格式粘贴 菜单（Ctrl+Alt+V） =========
 
 # 白名单：哪些进程可以弹菜单
 WHITELIST_ENABLED = CONFIG["menu"]["whitelist_enabled"]
-WHITELIST_PROCESSES = [
+WHITELIST_PROCESSES = frozenset(
     p.lower() for p in CONFIG["menu"]["whitelist_processes"]
-]
+)
+
+
+def get_config_snapshot() -> ConfigSnapshot:
+    global CONFIG_SNAPSHOT
+    snap = CONFIG_SNAPSHOT
+    if snap is None or snap.config is not CONFIG:
+        snap = CONFIG_SNAPSHOT = ConfigSnapshot(CONFIG, get_ui_lang())
+    return snap
+
+
+def refresh_config() -> ConfigSnapshot:
+    """
+    热键路径用：配置文件没变（最多一次 stat）就直接返回现成的快照；
+    变了才重新读盘、合并默认配置、重建白名单。
+    """
+    if CONFIG_WATCHER.changed():
+        load_config()
+        _apply_config_from_dict(CONFIG)
+    return get_config_snapshot()
 
 def get_foreground_exe_name():
     """获取当前前台窗口的 exe 文件名（小写），失败返回 None"""
-    hwnd = win32gui.GetForegroundWindow()
+    info, hwnd = get_foreground_process()
     if not hwnd:
         return None, None
 
-    try:
-        _, pid = win32process.GetWindowThreadProcessId(hwnd)
-        h_process = win32api.OpenProcess(
-            win32con.PROCESS_QUERY_INFORMATION | win32con.PROCESS_VM_READ,
-            False,
-            pid,
-        )
-    except Exception:
+    if info is None or not info.exe_path:
         return None, hwnd
 
-    try:
-        exe_path = win32process.GetModuleFileNameEx(h_process, 0)
-    except Exception:
-        exe_path = None
-    finally:
-        win32api.CloseHandle(h_process)
-
-    if not exe_path:
-        return None, hwnd
-
-    exe_name = os.path.basename(exe_path).lower()
-    return exe_name, hwnd
+    return info.exe_name, hwnd
 
 
 def close_menu():
-    """关闭菜单窗口"""
-    global menu_window, root, menu_visible
-    if menu_window is not None:
+    """隐藏菜单窗口（常驻，不销毁）"""
+    global menu_visible
+    if MENU_UI is not None:
         try:
-            menu_window.destroy()
-        except Exception:
-            pass
-        menu_window = None
-    if root is not None:
-        try:
-            root.quit()
+            MENU_UI.hide()
         except Exception:
             pass
     menu_visible = False
@@ -1404,22 +1570,24 @@ def close_menu():
 
 def raw_paste_menu():
     global last_foreground_hwnd
-    print("[MultiPaste] 模式：原样粘贴")
+    menu_log.info("模式：原样粘贴")
     close_menu()
     focus_window(last_foreground_hwnd)
-    keyboard.send("ctrl+v")
+    get_backend().send_keys("ctrl+v")
 
 
 def plain_text_paste():
     global last_foreground_hwnd
-    print("[MultiPaste] 模式：纯文本粘贴")
-    text = pyperclip.paste()
+    menu_log.info("模式：纯文本粘贴")
+    text = _precomputed_menu_result("plain")
+    if text is MISS:
+        text = get_backend().get_clipboard_text()
     if text is None:
         text = ""
-    pyperclip.copy(text)
+    get_backend().set_clipboard_text(text)
     close_menu()
     focus_window(last_foreground_hwnd)
-    keyboard.send("ctrl+v")
+    get_backend().send_keys("ctrl+v")
 
 
 # ---- 结构化格式化 ----
@@ -1433,6 +1601,8 @@ def try_format_json(text: str):
 
 
 def try_format_xml_or_html(text: str):
+    import xml.dom.minidom as minidom
+
     t = text.strip()
     if not (t.startswith("<") and t.endswith(">")):
         return None
@@ -1463,30 +1633,37 @@ def try_format_sql(text: str):
     return formatted.strip()
 
 
-def structured_format_paste():
-    global last_foreground_hwnd
-    print("[MultiPaste] 模式：结构化格式化粘贴")
-    text = pyperclip.paste()
-    if not text:
-        close_menu()
-        focus_window(last_foreground_hwnd)
-        keyboard.send("ctrl+v")
-        return
-
+def structured_format_text(text: str):
+    """依次尝试 JSON / XML(HTML) / SQL，都识别不了返回 None"""
     formatted = try_format_json(text)
     if formatted is None:
         formatted = try_format_xml_or_html(text)
     if formatted is None:
         formatted = try_format_sql(text)
+    return formatted
+
+
+def structured_format_paste():
+    global last_foreground_hwnd
+    menu_log.info("模式：结构化格式化粘贴")
+    formatted = _precomputed_menu_result("structured")
+    if formatted is MISS:
+        text = get_backend().get_clipboard_text()
+        if not text:
+            close_menu()
+            focus_window(last_foreground_hwnd)
+            get_backend().send_keys("ctrl+v")
+            return
+        formatted = structured_format_text(text)
 
     if formatted is not None:
-        pyperclip.copy(formatted)
+        get_backend().set_clipboard_text(formatted)
     else:
-        print("[MultiPaste] 结构化格式化：无法识别类型，保持原样")
+        menu_log.info("结构化格式化：无法识别类型，保持原样")
 
     close_menu()
     focus_window(last_foreground_hwnd)
-    keyboard.send("ctrl+v")
+    get_backend().send_keys("ctrl+v")
 
 
 # ---- 去空行 ----
@@ -1550,58 +1727,214 @@ def markdown_cleanup_paste():
     """
     global last_foreground_hwnd
 
-    print("[MultiPaste] 模式：Markdown 清理粘贴")
-    text = pyperclip.paste()
-    if not text:
-        close_menu()
-        focus_window(last_foreground_hwnd)
-        keyboard.send("ctrl+v")
-        return
-
-    cleaned = cleanup_markdown(text)
-    pyperclip.copy(cleaned)
+    menu_log.info("模式：Markdown 清理粘贴")
+    cleaned = _precomputed_menu_result("markdown")
+    if cleaned is MISS:
+        text = get_backend().get_clipboard_text()
+        if not text:
+            close_menu()
+            focus_window(last_foreground_hwnd)
+            get_backend().send_keys("ctrl+v")
+            return
+        cleaned = cleanup_markdown(text)
+    get_backend().set_clipboard_text(cleaned)
 
     close_menu()
     focus_window(last_foreground_hwnd)
-    keyboard.send("ctrl+v")
+    get_backend().send_keys("ctrl+v")
 
 
 def collapse_blank_paste():
     global last_foreground_hwnd
-    print("[MultiPaste] 模式：去所有空行粘贴")
-    text = pyperclip.paste()
-    if not text:
-        close_menu()
-        focus_window(last_foreground_hwnd)
-        keyboard.send("ctrl+v")
-        return
-    cleaned = collapse_blank_lines(text)
-    pyperclip.copy(cleaned)
+    menu_log.info("模式：去所有空行粘贴")
+    cleaned = _precomputed_menu_result("collapse_blank")
+    if cleaned is MISS:
+        text = get_backend().get_clipboard_text()
+        if not text:
+            close_menu()
+            focus_window(last_foreground_hwnd)
+            get_backend().send_keys("ctrl+v")
+            return
+        cleaned = collapse_blank_lines(text)
+    get_backend().set_clipboard_text(cleaned)
     close_menu()
     focus_window(last_foreground_hwnd)
-    keyboard.send("ctrl+v")
+    get_backend().send_keys("ctrl+v")
 
 
 # ---- Python 缩进整理 ----
 
 def python_dedent_paste():
     global last_foreground_hwnd
-    print("[MultiPaste] 模式：Python 缩进整理粘贴")
-    text = pyperclip.paste()
-    if not text:
-        close_menu()
-        focus_window(last_foreground_hwnd)
-        keyboard.send("ctrl+v")
-        return
-    dedented = textwrap.dedent(text)
-    pyperclip.copy(dedented)
+    menu_log.info("模式：Python 缩进整理粘贴")
+    dedented = _precomputed_menu_result("python_dedent")
+    if dedented is MISS:
+        text = get_backend().get_clipboard_text()
+        if not text:
+            close_menu()
+            focus_window(last_foreground_hwnd)
+            get_backend().send_keys("ctrl+v")
+            return
+        dedented = textwrap.dedent(text)
+    get_backend().set_clipboard_text(dedented)
     close_menu()
     focus_window(last_foreground_hwnd)
-    keyboard.send("ctrl+v")
+    get_backend().send_keys("ctrl+v")
 
 
 # ---- 鼠标点击监控 ----
 
+# ---- 菜单变换预计算 ----
+
+# 菜单选项名 -> 变换函数（顺序即预计算顺序）；结果和点菜单时现算的完全一样
+MENU_TRANSFORMS = (
+    ("plain", lambda text: text),
+    ("structured", structured_format_text),
+    ("markdown", cleanup_markdown),
+    ("collapse_blank", collapse_blank_lines),
+    ("python_dedent", textwrap.dedent),
+)
+
+PRECOMPUTER = None
+
+
+def _precomputed_menu_result(name):
+    """预计算命中就返回现成结果，否则返回 MISS（调用方照旧现算）"""
+    pre = PRECOMPUTER
+    if pre is None:
+        return MISS
+    return pre.get_result(name)
+
+
+_precompute_key = None
+
+
+def sync_precompute():
+    """按当前配置启动 / 停止 / 重建剪贴板预计算（相关配置没变就什么都不做）"""
+    global PRECOMPUTER, _precompute_key
+    cfg = CONFIG["menu"]["precompute"]
+    menu_items = get_config_snapshot().menu_items
+
+    key = (json.dumps(cfg, sort_keys=True), menu_items)
+    if PRECOMPUTER is not None and PRECOMPUTER.running and key == _precompute_key:
+        return
+    _precompute_key = key
+
+    if PRECOMPUTER is not None:
+        PRECOMPUTER.stop()
+        PRECOMPUTER = None
+
+    if not cfg.get("enabled"):
+        return
+
+    transforms = [(name, fn) for name, fn in MENU_TRANSFORMS if name in menu_items]
+    if not transforms:
+        return
+    PRECOMPUTER = ClipboardPrecomputer(
+        get_backend(),
+        transforms,
+        poll_interval=max(10, int(cfg["poll_ms"])) / 1000.0,
+        cpu_cap_s=max(1, int(cfg["cpu_ms_per_item"])) / 1000.0,
+        max_chars=int(cfg["max_chars"]),
+    )
+    PRECOMPUTER.start()
+    precompute_log.info("已启动：%s", ", ".join(name for name, _ in transforms))
+
+
+def stop_precompute():
+    global PRECOMPUTER
+    if PRECOMPUTER is not None:
+        PRECOMPUTER.stop()
+        PRECOMPUTER = None
+
+
+# ---------- 热键事件分发 ----------
+
+DISPATCHER = None
+
+
+def start_dispatcher():
+    """按配置启动热键分发器（已经在跑就不动）"""
+    global DISPATCHER
+    if DISPATCHER is not None and DISPATCHER.running:
+        return DISPATCHER
+    cfg = CONFIG.get("dispatch") or CONFIG_DEFAULT["dispatch"]
+    DISPATCHER = HotkeyDispatcher(
+        workers=int(cfg.get("workers", 2)),
+        max_queue=int(cfg.get("max_queue", 8)),
+        coalesce_s=max(0, int(cfg.get("coalesce_ms", 150))) / 1000.0,
+    )
+    DISPATCHER.start()
+    return DISPATCHER
+
+
+def stop_dispatcher():
+    global DISPATCHER
+    if DISPATCHER is not None:
+        dispatch_log.info("统计: %s", DISPATCHER.stats())
+        DISPATCHER.stop()
+        DISPATCHER = None
+
+
+def native_ctrl_v():
+    """原生粘贴（fallback 用）：和原来一样，发送期间置 is_simulating，注入的 Ctrl+V 不会再被当成热键处理"""
+    global is_simulating
+    is_simulating = True
+    try:
+        simulate_native_ctrl_v()
+    finally:
+        is_simulating = False
+
+
+def route_hotkey(fn):
+    """钩子回调里用：fn 放到分发器的 router 线程里跑（分发器没启动时开个临时线程），钩子里不做任何耗时的事"""
+    dispatcher = DISPATCHER
+    if dispatcher is not None:
+        dispatcher.route(fn)
+    else:
+        threading.Thread(target=fn, name="SmartCtrlV-Route", daemon=True).start()
+
+
+def dispatch_hotkey(key, handler, fallback=native_ctrl_v):
+    """交给分发器；被合并 / 忙不过来 / 没启动时执行 fallback（默认原生 Ctrl+V，不在当前线程里执行）"""
+    dispatcher = DISPATCHER
+    if dispatcher is None:
+        if fallback is not None:
+            route_hotkey(fallback)
+        return
+    dispatcher.submit(key, handler, fallback=fallback)
+
+
+def on_ctrl_v_hotkey():
+    """
+    Ctrl+V 的热键回调：suppress 注册，keyboard 在低级钩子里同步调用它，
+    所以这里只入队（O(1)），看前台 / 注入原生粘贴都在 router 线程里做
+    """
+    if is_simulating:
+        return
+    route_hotkey(_route_ctrl_v)
+
+
+def _route_ctrl_v():
+    """
+    router 线程里给 Ctrl+V 分流：
+    - 前台不是 Explorer（或 Explorer 增强关了）：马上原生粘贴，不排队、不合并，
+      不会因为别的 Ctrl+V 处理还开着确认框就卡住 / 被吞
+    - 前台是 Explorer：交给分发器（同一热键串行、连按合并；被合并 / 丢弃的也按原生粘贴处理）
+    """
+    info, _ = get_foreground_process()
+    is_explorer = info is not None and "explorer.exe" in (info.exe_path or "").lower()
+    if is_explorer and CONFIG.get("explorer", {}).get("enabled", True):
+        dispatch_hotkey("explorer_ctrl_v", on_ctrl_v_explorer)
+        return
+    native_ctrl_v()
+
+
+def get_dispatch_stats() -> dict:
+    """队列深度 / 合并 / 丢弃等计数（分发器没启动时返回空 dict）"""
+    return DISPATCHER.stats() if DISPATCHER is not None else {}
+
+
 def is_descendant(child_hwnd, parent_hwnd):
     if not child_hwnd or not parent_hwnd:
         return False
@@ -1609,24 +1942,25 @@ def is_descendant(child_hwnd, parent_hwnd):
     while h:
         if h == parent_hwnd:
             return True
-        h = win32gui.GetParent(h)
+        h = get_backend().get_parent_window(h)
     return False
 
 
 def mouse_click_watcher():
-    global menu_visible, menu_window
+    global menu_visible
 
+    backend = get_backend()
     while True:
-        mouse.wait(button="left", target_types=("down",))
-        if not menu_visible or menu_window is None:
+        backend.wait_left_click()
+        ui = MENU_UI
+        if not menu_visible or ui is None or not ui.visible:
             return
 
-        x, y = win32api.GetCursorPos()
-        clicked_hwnd = win32gui.WindowFromPoint((x, y))
+        x, y = backend.get_cursor_pos()
+        clicked_hwnd = backend.window_from_point((x, y))
 
-        try:
-            menu_hwnd = menu_window.winfo_id()
-        except Exception:
+        menu_hwnd = ui.hwnd
+        if not menu_hwnd:
             return
 
         if is_descendant(clicked_hwnd, menu_hwnd):
@@ -1638,31 +1972,77 @@ def mouse_click_watcher():
 
 def focus_window(hwnd):
     try:
-        if hwnd and win32gui.IsWindow(hwnd):
-            win32gui.SetForegroundWindow(hwnd)
+        if hwnd and get_backend().is_window(hwnd):
+            get_backend().focus_window(hwnd)
             time.sleep(0.05)
     except Exception:
         pass
 
 
-def create_menu_window():
-    """在鼠标旁边创建菜单窗口（带屏幕边缘避让 + 根据配置/语言生成菜单）"""
-    global menu_window, root, menu_visible
+MENU_LABELS = {
+    "zh": {
+        "title": "SmartCtrlV 多格式粘贴",
+        "subtitle": "选择一种粘贴方式：",
+        "raw": "🧷 原样粘贴",
+        "plain": "📄 纯文本粘贴",
+        "markdown": "🧹 Markdown 清理粘贴",
+        "structured": "🧩 结构化格式化 (JSON/XML/HTML/SQL)",
+        "collapse_blank": "📏 去所有空行粘贴",
+        "python_dedent": "🐍 Python 缩进整理粘贴",
+    },
+    "ja": {
+        "title": "SmartCtrlV マルチペースト",
+        "subtitle": "貼り付けモードを選択：",
+        "raw": "🧷 そのまま貼り付け",
+        "plain": "📄 プレーンテキストで貼り付け",
+        "markdown": "🧹 Markdown 整形貼り付け",
+        "structured": "🧩 構造化フォーマット (JSON/XML/HTML/SQL)",
+        "collapse_blank": "📏 空行をすべて削除して貼り付け",
+        "python_dedent": "🐍 Python インデント整理貼り付け",
+    },
+    "en": {
+        "title": "SmartCtrlV Multi-Paste",
+        "subtitle": "Choose how to paste:",
+        "raw": "🧷 Raw paste",
+        "plain": "📄 Plain text paste",
+        "markdown": "🧹 Markdown cleanup paste",
+        "structured": "🧩 Structured format (JSON/XML/HTML/SQL)",
+        "collapse_blank": "📏 Remove all blank lines",
+        "python_dedent": "🐍 Python dedent paste",
+    },
+}
 
-    close_menu()
 
-    # 鼠标位置
-    x, y = win32api.GetCursorPos()
+# 菜单项 -> 点击后执行的函数
+MENU_ACTIONS = {
+    "raw": raw_paste_menu,
+    "plain": plain_text_paste,
+    "markdown": markdown_cleanup_paste,
+    "structured": structured_format_paste,
+    "collapse_blank": collapse_blank_paste,
+    "python_dedent": python_dedent_paste,
+}
+
+
+# 常驻菜单（UI 线程 + 隐藏的窗口），第一次用到或者注册热键时创建
+MENU_UI = None
+MENU_UI_LOCK = threading.Lock()
+_menu_watcher = None
+
+
+def _menu_key():
+    """决定菜单长什么样的东西：语言 + 启用的菜单项；变了才重建按钮"""
+    snap = get_config_snapshot()
+    return snap.ui_lang, snap.menu_items
 
-    root = tk.Tk()
-    root.withdraw()
-    win = tk.Toplevel(root)
-    menu_window = win
-    menu_visible = True
+
+def _build_menu(win, key):
+    """在 UI 线程里往常驻窗口里放控件（根据语言 / 配置生成菜单）"""
+    import tkinter as tk
+
+    lang, menu_items = key
 
     # 外层背景稍微深一点，当假“阴影”
-    win.overrideredirect(True)
-    win.attributes("-topmost", True)
     win.configure(bg="#111111")
 
     # 内层主容器，圆角做不了，只能靠 padding+颜色假装一下…
@@ -1670,40 +2050,7 @@ def create_menu_window():
     container.pack(fill="both", expand=True, padx=2, pady=2)
 
     # ===== 1. 多语言标签 =====
-    lang = get_ui_lang()
-    labels_table = {
-        "zh": {
-            "title": "SmartCtrlV 多格式粘贴",
-            "subtitle": "选择一种粘贴方式：",
-            "raw": "🧷 原样粘贴",
-            "plain": "📄 纯文本粘贴",
-            "markdown": "🧹 Markdown 清理粘贴",
-            "structured": "🧩 结构化格式化 (JSON/XML/HTML/SQL)",
-            "collapse_blank": "📏 去所有空行粘贴",
-            "python_dedent": "🐍 Python 缩进整理粘贴",
-        },
-        "ja": {
-            "title": "SmartCtrlV マルチペースト",
-            "subtitle": "貼り付けモードを選択：",
-            "raw": "🧷 そのまま貼り付け",
-            "plain": "📄 プレーンテキストで貼り付け",
-            "markdown": "🧹 Markdown 整形貼り付け",
-            "structured": "🧩 構造化フォーマット (JSON/XML/HTML/SQL)",
-            "collapse_blank": "📏 空行をすべて削除して貼り付け",
-            "python_dedent": "🐍 Python インデント整理貼り付け",
-        },
-        "en": {
-            "title": "SmartCtrlV Multi-Paste",
-            "subtitle": "Choose how to paste:",
-            "raw": "🧷 Raw paste",
-            "plain": "📄 Plain text paste",
-            "markdown": "🧹 Markdown cleanup paste",
-            "structured": "🧩 Structured format (JSON/XML/HTML/SQL)",
-            "collapse_blank": "📏 Remove all blank lines",
-            "python_dedent": "🐍 Python dedent paste",
-        },
-    }
-    labels = labels_table.get(lang, labels_table["en"])
+    labels = MENU_LABELS.get(lang, MENU_LABELS["en"])
 
     # ===== 顶部标题区域 =====
     title_label = tk.Label(
@@ -1732,10 +2079,7 @@ def create_menu_window():
     sep = tk.Frame(container, height=1, bg="#3a3a3a")
     sep.pack(fill="x", padx=6, pady=(0, 4))
 
-    # ===== 2. 从配置里读菜单项开关 =====
-    menu_cfg = CONFIG.get("menu", {})
-    opts = menu_cfg.get("options", {})
-
+    # ===== 2. 菜单项（配置快照里已经按 options 过滤好） =====
     # 按钮统一样式
     def add_button(text, command):
         btn = tk.Button(
@@ -1765,94 +2109,115 @@ def create_menu_window():
         btn.bind("<Enter>", on_enter)
         btn.bind("<Leave>", on_leave)
 
-    # 根据 options 决定是否添加按钮（默认都 True，这样旧配置也能用）
-    if opts.get("raw", True):
-        add_button(labels["raw"], raw_paste_menu)
-    if opts.get("plain", True):
-        add_button(labels["plain"], plain_text_paste)
-    if opts.get("markdown", True):
-        add_button(labels["markdown"], markdown_cleanup_paste)
-    if opts.get("structured", True):
-        add_button(labels["structured"], structured_format_paste)
-    if opts.get("collapse_blank", True):
-        add_button(labels["collapse_blank"], collapse_blank_paste)
-    if opts.get("python_dedent", True):
-        add_button(labels["python_dedent"], python_dedent_paste)
-
-    def on_escape(event):
-        close_menu()
-
-    win.bind("<Escape>", on_escape)
-
-    win.update_idletasks()
-    width = win.winfo_width()
-    height = win.winfo_height()
-
-    # 屏幕尺寸
-    screen_width = win32api.GetSystemMetrics(0)
-    screen_height = win32api.GetSystemMetrics(1)
-
-    # 默认右下
-    pos_x = x + 10
-    pos_y = y + 10
-
-    # 右边缘
-    if pos_x + width > screen_width:
-        pos_x = x - width - 10
+    for name in menu_items:
+        add_button(labels[name], MENU_ACTIONS[name])
+
+
+def get_menu_ui():
+    """取常驻菜单；还没启动（或 UI 线程挂了）就启动一个并预先建好菜单"""
+    global MENU_UI, menu_window
+    with MENU_UI_LOCK:
+        if MENU_UI is None or not MENU_UI.alive:
+            ui = PersistentMenu(_build_menu)
+            if not ui.start():
+                return None
+            MENU_UI = ui
+            menu_window = ui.window
+            # 先把当前配置的菜单建好，第一次按热键时就不用建了
+            ui.prebuild(_menu_key())
+        return MENU_UI
+
+
+def stop_menu_ui():
+    global MENU_UI, menu_window, menu_visible
+    with MENU_UI_LOCK:
+        if MENU_UI is not None:
+            MENU_UI.stop()
+            MENU_UI = None
+        menu_window = None
+        menu_visible = False
 
-    # 下边缘
-    if pos_y + height > screen_height:
-        pos_y = y - height - 10
 
-    if pos_x < 0:
-        pos_x = 0
-    if pos_y < 0:
-        pos_y = 0
+def create_menu_window(t0_ns=None):
+    """在鼠标旁边显示常驻菜单（带屏幕边缘避让）；t0_ns 用来统计热键到显示的耗时"""
+    global menu_visible, _menu_watcher
 
-    win.geometry(f"{width}x{height}+{pos_x}+{pos_y}")
+    ui = get_menu_ui()
+    if ui is None:
+        menu_log.warning("菜单 UI 不可用，退回普通粘贴")
+        focus_window(last_foreground_hwnd)
+        get_backend().send_keys("ctrl+v")
+        return
 
-    t = threading.Thread(target=mouse_click_watcher, daemon=True)
-    t.start()
+    # 鼠标位置
+    x, y = get_backend().get_cursor_pos()
+    ui.show(x, y, _menu_key(), get_backend().get_screen_size(), t0_ns)
+    menu_visible = True
 
-    root.mainloop()
+    if _menu_watcher is None or not _menu_watcher.is_alive():
+        _menu_watcher = threading.Thread(target=mouse_click_watcher, daemon=True)
+        _menu_watcher.start()
 
 
+@TRACER.traced("menu")
 def on_hotkey_menu():
-    """Ctrl+Alt+V 菜单入口"""
     """Ctrl+Alt+V 菜单入口"""
     global last_foreground_hwnd
 
-    # ⭐ 每次打开菜单前重新加载配置，让 options 的修改立即生效
-    load_config()
-    _apply_config_from_dict(CONFIG)
+    # ⭐ 配置文件改过才重新加载（最多一次 stat），让 options 的修改立即生效
+    snap = refresh_config()
 
-    print("[MultiPaste] on_hotkey_menu TRIGGERED")  # 调试用
-    exe_name, hwnd = get_foreground_exe_name()
+    t0_ns = time.perf_counter_ns()
+    menu_log.debug("on_hotkey_menu TRIGGERED")  # 调试用
+    with TRACER.span(STAGE_FOREGROUND):
+        exe_name, hwnd = get_foreground_exe_name()
     last_foreground_hwnd = hwnd
 
     # 总开关：配置里可以关掉整个多格式菜单
-    if not CONFIG.get("menu", {}).get("enabled", True):
+    if not snap.menu_enabled:
         # 直接当普通 Ctrl+V 用
-        keyboard.send("ctrl+v")
+        simulate_native_ctrl_v()
         return
 
     # 白名单逻辑
-    if WHITELIST_ENABLED:
-        if not exe_name or exe_name not in WHITELIST_PROCESSES:
-            # 不在白名单里 -> 退回普通粘贴
-            focus_window(last_foreground_hwnd)
-            keyboard.send("ctrl+v")
-            return
+    if not snap.menu_allowed(exe_name):
+        # 不在白名单里 -> 退回普通粘贴
+        focus_window(last_foreground_hwnd)
+        simulate_native_ctrl_v()
+        return
 
-    # 通过线程启动 Tk 窗口，避免卡主当前线程
-    t = threading.Thread(target=create_menu_window, daemon=True)
-    t.start()
+    # 常驻菜单：只是排队让 UI 线程挪位置 + 显示，不会卡住当前线程
+    with TRACER.span(STAGE_ACTION):
+        create_menu_window(t0_ns)
 
 
 # ========= main =========
 
 # ========= 从这里开始替换原来的 main / start_hooks / stop_hooks 等 =========
 
+def get_backups():
+    """补丁备份库（BackupStore）：第一次调用才 import smartctrlv_backup 并按当前配置创建"""
+    global _BACKUPS
+    with _BACKUPS_LOCK:
+        if _BACKUPS is None:
+            from smartctrlv_backup import BackupStore
+            store = BackupStore(BACKUP_DIR)
+            store.configure(**_BACKUP_SETTINGS)
+            _BACKUPS = store
+        return _BACKUPS
+
+
+def configure_backups(backup_cfg: dict):
+    with _BACKUPS_LOCK:
+        _BACKUP_SETTINGS.update(
+            enabled=backup_cfg.get("enabled", True),
+            max_versions=backup_cfg.get("max_versions", 20),
+            max_bytes=int(backup_cfg.get("max_mb", 256)) * 1024 * 1024,
+        )
+        if _BACKUPS is not None:
+            _BACKUPS.configure(**_BACKUP_SETTINGS)
+
+
 def _apply_config_from_dict(new_cfg: dict):
     """
     把配置 dict 应用到当前模块的 CONFIG 上，
@@ -1865,15 +2230,50 @@ def _apply_config_from_dict(new_cfg: dict):
     CONFIG = cfg
 
     # 同步 explorer 开关
-    global ENABLE_EXPLORER_COMMAND, ENABLE_EXPLORER_CREATE_FILES, ENABLE_EXPLORER_WRITE_FILE
+    global ENABLE_EXPLORER_COMMAND, ENABLE_EXPLORER_CREATE_FILES, ENABLE_EXPLORER_WRITE_FILE, ENABLE_EXPLORER_PLAN
     ENABLE_EXPLORER_COMMAND = CONFIG["explorer"]["enable_command_from_clipboard"]
     ENABLE_EXPLORER_CREATE_FILES = CONFIG["explorer"]["enable_create_files_from_clipboard"]
     ENABLE_EXPLORER_WRITE_FILE = CONFIG["explorer"]["enable_write_file_from_clipboard"]
+    ENABLE_EXPLORER_PLAN = CONFIG["explorer"]["enable_plan_from_clipboard"]
+
+    # 重建只读快照，白名单等全局变量直接取快照里算好的
+    global WHITELIST_ENABLED, WHITELIST_PROCESSES, TEXT_EXT_WHITELIST
+    snap = get_config_snapshot()
+    WHITELIST_ENABLED = snap.whitelist_enabled
+    WHITELIST_PROCESSES = snap.whitelist_processes
+    TEXT_EXT_WHITELIST = snap.text_ext_whitelist
+
+    # 日志级别 / 轮转
+    log_cfg = CONFIG.get("log") or {}
+    smartctrlv_log.configure(
+        LOG_DIR,
+        level=log_cfg.get("level", "info"),
+        categories=log_cfg.get("categories") or {},
+        max_bytes=int(log_cfg.get("max_kb", 1024)) * 1024,
+        backups=log_cfg.get("backups", 3),
+        console=log_cfg.get("console", True),
+    )
+
+    # 分阶段耗时记录
+    trace_cfg = CONFIG.get("trace") or {}
+    TRACER.configure(enabled=trace_cfg.get("enabled", True), capacity=trace_cfg.get("capacity", 4096))
+
+    # 文件写入的 fsync 策略
+    set_fsync_policy((CONFIG.get("files") or {}).get("fsync", "replace"))
+
+    # 撤销日志
+    undo_cfg = CONFIG.get("undo") or {}
+    JOURNAL.configure(enabled=undo_cfg.get("enabled", True), max_bytes=int(undo_cfg.get("max_kb", 8192)) * 1024)
 
-    # 同步多格式菜单白名单相关
-    global WHITELIST_ENABLED, WHITELIST_PROCESSES
-    WHITELIST_ENABLED = CONFIG["menu"]["whitelist_enabled"]
-    WHITELIST_PROCESSES = [p.lower() for p in CONFIG["menu"]["whitelist_processes"]]
+    # 补丁备份库
+    configure_backups(CONFIG.get("backup") or {})
+
+    # 命令识别词表（词表没变不会重新编译）
+    configure_command_matcher(CONFIG["explorer"].get("extra_command_prefixes") or [])
+
+    # 热键已经在跑：菜单预计算跟着新配置重建
+    if HOOKS_STARTED:
+        sync_precompute()
 
 def open_global_settings_window():
     """
@@ -1882,6 +2282,9 @@ def open_global_settings_window():
       - 修改 多格式菜单 热键 (CONFIG['menu']['hotkey'])
     由托盘右键菜单调用即可。
     """
+    import tkinter as tk
+    import tkinter.messagebox as messagebox
+
     # 用一个独立的 Tk root，避免和菜单那个 root 搞混
     settings_root = tk.Tk()
     settings_root.title("SmartCtrlV 设置")
@@ -2114,6 +2517,9 @@ def open_tray_settings_window():
       - 切换 menu.enabled / menu.whitelist_enabled
       - 两个热键用“按键捕获”，不能相同
     """
+    import tkinter as tk
+    import tkinter.messagebox as messagebox
+
     # 独立 root，避免跟别的 Tk 冲突
     root = tk.Tk()
     root.attributes("-topmost", True)
@@ -2417,48 +2823,65 @@ def register_hotkeys_safe():
     if HOOKS_STARTED:
         return
 
-    print("SmartCtrlV hooks 启动（安全模式 suppress=False）：")
-    print("  - Explorer Ctrl+V 增强")
-    print("  - Ctrl+Shift+V -> AI 智能粘贴")
-    print("  - Ctrl+Alt+V -> 多格式粘贴菜单")
-    print("  - Ctrl+Alt+Esc -> 紧急退出")
+    log.info("hooks 启动（安全模式 suppress=False）：Explorer Ctrl+V 增强 / "
+             "Ctrl+Alt+V 多格式粘贴菜单 / Ctrl+Alt+Z 撤销粘贴 / Ctrl+Alt+Esc 紧急退出")
+
+    # 热键回调只负责把事件交给分发器（有界队列 + 固定工作线程）
+    start_dispatcher()
 
-    h1 = keyboard.add_hotkey(
+    h1 = get_backend().add_hotkey(
         CONFIG["hotkeys"].get("explorer_ctrl_v", "ctrl+v"),
-        lambda: threading.Thread(target=on_ctrl_v_explorer, daemon=True).start(),
+        on_ctrl_v_hotkey,
         suppress=True,
     )
 
     menu_hotkey = CONFIG.get("menu", {}).get("hotkey", "ctrl+alt+v")
-    print(f"[SmartCtrlV] 多格式菜单热键: {menu_hotkey}")
-    h2 = keyboard.add_hotkey(
+    log.info("多格式菜单热键: %s", menu_hotkey)
+    h2 = get_backend().add_hotkey(
         menu_hotkey,
-        on_hotkey_menu,
+        lambda: dispatch_hotkey("menu", on_hotkey_menu, fallback=None),
         suppress=False,
     )
 
-    # h4 = keyboard.add_hotkey(
+    undo_hotkey = CONFIG["hotkeys"].get("undo_paste", "ctrl+alt+z")
+    h_undo = get_backend().add_hotkey(
+        undo_hotkey,
+        lambda: dispatch_hotkey("undo_paste", on_undo_paste, fallback=None),
+        suppress=False,
+    )
+
+    # h4 = get_backend().add_hotkey(
     #    "ctrl+shift+v",
-    #    lambda: threading.Thread(target=on_ai_smart_paste, daemon=True).start(),
+    #    lambda: dispatch_hotkey("ai_smart_paste", on_ai_smart_paste),
     #    suppress=False,
     #)
 
-    h_escape = keyboard.add_hotkey(
+    h_escape = get_backend().add_hotkey(
         "ctrl+alt+esc",
         emergency_exit,
         suppress=False,
     )
 
     # 🔍 调试热键：只打印一句话，确认 keyboard 是否正常收到按键
-    h_debug = keyboard.add_hotkey(
+    h_debug = get_backend().add_hotkey(
         "ctrl+alt+9",
-        lambda: print("[DEBUG] ctrl+alt+9 TRIGGERED"),
+        lambda: log.debug("ctrl+alt+9 TRIGGERED"),
         suppress=False,
     )
 
-    HOOK_HANDLES = [h1, h2, h4, h_escape, h_debug]
+    # 菜单预计算（配置里关闭时什么都不做）
+    sync_precompute()
+
+    # 后台盯着配置文件：热键路径就不用再 stat 了
+    CONFIG_WATCHER.start()
+
+    # 后台预热常驻菜单（Tk 启动 + 建按钮），第一次按 Ctrl+Alt+V 就不用等
+    threading.Thread(target=get_menu_ui, daemon=True).start()
+
+    # h4（AI 智能粘贴）目前没有注册
+    HOOK_HANDLES = [h1, h2, h_undo, h_escape, h_debug]
     HOOKS_STARTED = True
-    print("[SmartCtrlV] 热键已注册。")
+    log.info("热键已注册。")
 
 
 def start_hooks(config, suppress=False):
@@ -2486,6 +2909,7 @@ def stop_hooks() -> None:
     """
     给托盘用的退出入口：
     - 取消所有已经注册的热键
+    - 停掉分发器 / 预计算 / 菜单 / 配置监视，以及后端的 COM 线程
     """
     global HOOKS_STARTED, HOOK_HANDLES
 
@@ -2495,19 +2919,24 @@ def stop_hooks() -> None:
     try:
         for h in HOOK_HANDLES:
             try:
-                keyboard.remove_hotkey(h)
+                get_backend().remove_hotkey(h)
             except Exception:
                 pass
     except Exception:
         # 万一上面失败，兜底清掉所有热键（注意可能会把别的 keyboard 热键也清了）
         try:
-            keyboard.clear_all_hotkeys()
+            get_backend().clear_all_hotkeys()
         except Exception:
             pass
 
     HOOK_HANDLES = []
     HOOKS_STARTED = False
-    print("SmartCtrlV hooks 已停止。")
+    stop_dispatcher()
+    stop_precompute()
+    stop_menu_ui()
+    CONFIG_WATCHER.stop()
+    get_backend().close()
+    log.info("hooks 已停止。")
 
 
 # ========= main =========
@@ -2523,6 +2952,7 @@ def main():
     load_config()
     _apply_config_from_dict(CONFIG)
 
+    # 直接在命令行跑：使用说明直接打到控制台（不进日志文件）
     print("SmartCtrlV Main 运行中（安全模式）：")
     print("  - 在资源管理器里 Ctrl+V：文本按行创建文件 / 写入文件 / 命令执行等")
     print("  - Ctrl+Alt+V：在白名单应用中打开多格式粘贴菜单")
@@ -2538,7 +2968,8 @@ def main():
     except KeyboardInterrupt:
         # Ctrl+C 的正常退出
         stop_hooks()
-        print("SmartCtrlV 退出。")
+        log.info("退出。")
+        flush_logs()
 
 
 if __name__ == "__main__":
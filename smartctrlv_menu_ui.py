@@ -0,0 +1,228 @@
+# smartctrlv_menu_ui.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 常驻的多格式菜单窗口
+- 原来每按一次 Ctrl+Alt+V 都要新建 tk.Tk()（启动一个 Tcl 解释器）、Toplevel、所有按钮，
+  再开一个新的 mainloop；关菜单时全部销毁。菜单出来之前大部分时间都花在 Tk 启动上
+- 现在只有一个常驻 UI 线程：启动时就把菜单建好并隐藏，热键只负责“挪位置 + 显示”
+- 菜单内容（语言 / 选项开关）变了才重建按钮
+- 记录“热键 -> 窗口真正显示（<Map>）”的耗时，方便对比
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+
+from smartctrlv_log import get_logger
+
+log = get_logger("MultiPaste")
+
+
+def place_near_cursor(x, y, width, height, screen_width, screen_height, offset=10):
+    """默认放在鼠标右下，碰到屏幕右边 / 下边就翻到另一侧，不出左上边界"""
+    pos_x = x + offset
+    pos_y = y + offset
+
+    # 右边缘
+    if pos_x + width > screen_width:
+        pos_x = x - width - offset
+
+    # 下边缘
+    if pos_y + height > screen_height:
+        pos_y = y - height - offset
+
+    return max(0, pos_x), max(0, pos_y)
+
+
+class PersistentMenu:
+    """
+    build(win, key): 在 UI 线程里往 win 里放控件；key 变了才会重新调用
+    其他线程只通过 show() / hide() / stop() 和它打交道（内部转到 UI 线程执行）
+    """
+
+    def __init__(self, build, poll_ms=50, max_samples=200):
+        self.build = build
+        self.poll_ms = poll_ms
+
+        self.window = None
+        self.hwnd = None
+        self.visible = False
+        self.error = None
+
+        self._root = None
+        self._built_key = None
+        self._pending_t0 = None
+        self._calls = queue.Queue()
+        self._ready = threading.Event()
+        self._thread = None
+        self._ui_ident = None
+
+        # 热键 -> 显示 的耗时（毫秒）
+        self.samples = deque(maxlen=max_samples)
+
+    # ---------- 生命周期 ----------
+    @property
+    def alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self.error is None
+
+    def start(self, timeout=5.0) -> bool:
+        """启动 UI 线程并预先建好（隐藏的）菜单；成功返回 True"""
+        if self.alive:
+            return True
+        self.error = None
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name="SmartCtrlV-MenuUI", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        return self.alive and self._ready.is_set()
+
+    def stop(self):
+        self._call(self._quit)
+
+    def _run(self):
+        self._ui_ident = threading.get_ident()
+        try:
+            import tkinter as tk
+
+            root = tk.Tk()
+            root.withdraw()
+            win = tk.Toplevel(root)
+            win.withdraw()
+            win.overrideredirect(True)
+            win.attributes("-topmost", True)
+            win.bind("<Map>", self._on_map)
+            win.bind("<Escape>", lambda e: self._hide())
+        except Exception as e:
+            self.error = e
+            log.error("菜单 UI 线程启动失败: %s", e)
+            self._ready.set()
+            return
+
+        self._root = root
+        self.window = win
+        try:
+            self.hwnd = win.winfo_id()
+        except Exception:
+            self.hwnd = None
+
+        root.after(self.poll_ms, self._poll)
+        self._ready.set()
+        try:
+            root.mainloop()
+        finally:
+            self.visible = False
+            self.window = None
+            self._root = None
+            try:
+                root.destroy()
+            except Exception:
+                pass
+
+    # ---------- 跨线程调用 ----------
+    def _call(self, fn, *args):
+        """在 UI 线程里执行 fn：本来就在 UI 线程直接调，否则排队"""
+        if threading.get_ident() == self._ui_ident:
+            fn(*args)
+            return
+        self._calls.put((fn, args))
+        root = self._root
+        if root is not None:
+            try:
+                # 线程版 Tcl 会把 after 转给 UI 线程，不用等下一次轮询
+                root.after(0, self._drain)
+            except Exception:
+                pass  # 交给 _poll 兜底
+
+    def _drain(self):
+        while True:
+            try:
+                fn, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args)
+            except Exception as e:
+                log.error("菜单操作失败: %s", e)
+
+    def _poll(self):
+        self._drain()
+        if self._root is not None:
+            self._root.after(self.poll_ms, self._poll)
+
+    # ---------- 显示 / 隐藏 ----------
+    def show(self, x, y, key, screen_size, t0_ns=None):
+        """在 (x, y) 附近显示菜单；t0_ns 是热键触发时的 perf_counter_ns，用来统计显示耗时"""
+        self.visible = True
+        self._call(self._show, x, y, key, screen_size, t0_ns)
+
+    def hide(self):
+        self.visible = False
+        self._call(self._hide)
+
+    def prebuild(self, key):
+        """先按 key 把按钮建好（不显示），第一次按热键时就只剩挪位置"""
+        self._call(self._ensure_built, key)
+
+    def _ensure_built(self, key):
+        win = self.window
+        if win is None or key == self._built_key:
+            return
+        for child in win.winfo_children():
+            child.destroy()
+        self.build(win, key)
+        self._built_key = key
+        win.update_idletasks()
+
+    def _show(self, x, y, key, screen_size, t0_ns):
+        win = self.window
+        if win is None:
+            return
+        self._ensure_built(key)
+
+        win.update_idletasks()
+        width = win.winfo_reqwidth()
+        height = win.winfo_reqheight()
+        pos_x, pos_y = place_near_cursor(x, y, width, height, *screen_size)
+        win.geometry(f"{width}x{height}+{pos_x}+{pos_y}")
+
+        self._pending_t0 = t0_ns
+        self.visible = True
+        win.deiconify()
+        win.lift()
+
+    def _hide(self):
+        self.visible = False
+        self._pending_t0 = None
+        if self.window is not None:
+            self.window.withdraw()
+
+    def _quit(self):
+        self._hide()
+        if self._root is not None:
+            self._root.quit()
+
+    def _on_map(self, event):
+        if event.widget is not self.window or self._pending_t0 is None:
+            return
+        ms = (time.perf_counter_ns() - self._pending_t0) / 1e6
+        self._pending_t0 = None
+        self.samples.append(ms)
+        log.debug("菜单显示耗时 %.1f ms", ms)
+
+    # ---------- 统计 ----------
+    def stats(self) -> dict:
+        data = sorted(self.samples)
+        if not data:
+            return {"n": 0}
+
+        def pct(p):
+            return data[min(len(data) - 1, int(round(p / 100.0 * (len(data) - 1))))]
+
+        return {
+            "n": len(data),
+            "last_ms": self.samples[-1],
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "max_ms": data[-1],
+        }
@@ -0,0 +1,105 @@
+# smartctrlv_names.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 批量建文件时的“不重名”名字分配
+- 原来每一行都从 name、name (1)、name (2) ... 挨个 os.path.exists，
+  目录里已经有一堆 report (n).txt 时，粘 500 行就是 O(n²) 次 stat（网络共享上非常慢）
+- 现在整批只列一次目录：把已有的名字和 “base (n)ext” 的编号建成索引，
+  之后每个名字直接从索引里拿下一个空号
+- 列目录之后别人又建了同名文件（竞争）：创建时用独占方式（open "x" / mkdir），
+  撞上 FileExistsError 就把这个号记为已占用，换下一个再试
+"""
+
+import os
+import re
+import threading
+
+# "base (n)" -> (base, n)
+_SUFFIX_RE = re.compile(r"^(.*) \((\d+)\)$")
+
+# 竞争最多重试多少次（正常情况下一次就成）
+_MAX_ATTEMPTS = 100
+
+
+class NameAllocator:
+    """
+    folder: 目标目录
+    normcase: 名字比较方式，默认 os.path.normcase（Windows 下不区分大小写）
+    只在一次批量创建里用；allocate / create 可以在线程池的多个线程里同时调用（索引有锁）
+    """
+
+    def __init__(self, folder, normcase=os.path.normcase):
+        self.folder = folder
+        self._norm = normcase
+        self._used = {}     # (base, ext) 规范化后 -> {已占用的编号}，0 表示不带编号的原名
+        self._next = {}     # (base, ext) -> 下一个要试的编号（更小的都已占用）
+        self._lock = threading.Lock()
+
+        self.listed = 0     # 列目录时看到的条目数
+        self.collisions = 0  # 创建时才发现被占用的次数
+
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    self._mark(entry.name)
+                    self.listed += 1
+        except OSError:
+            # 目录列不出来（不存在 / 没权限）：当作空目录，真正创建时再报错
+            pass
+
+    def _key(self, base, ext):
+        return self._norm(base), self._norm(ext)
+
+    def _mark(self, name):
+        """把一个已存在的名字记进索引：它本身占了 (base, ext) 的 0 号，如果形如 base (n) 还占了 n 号"""
+        base, ext = os.path.splitext(name)
+        self._used.setdefault(self._key(base, ext), set()).add(0)
+        m = _SUFFIX_RE.match(base)
+        if m:
+            self._used.setdefault(self._key(m.group(1), ext), set()).add(int(m.group(2)))
+
+    # ---------- 分配 ----------
+    def allocate(self, name) -> str:
+        """给 name 分配一个当前不冲突的完整路径（只更新索引，不碰磁盘）"""
+        with self._lock:
+            return os.path.join(self.folder, self._allocate(name))
+
+    def _allocate(self, name):
+        """调用方持有锁；返回分配到的名字（不含目录）"""
+        base, ext = os.path.splitext(name)
+        key = self._key(base, ext)
+        used = self._used.setdefault(key, set())
+
+        if 0 not in used:
+            n = 0
+            candidate = name
+        else:
+            n = self._next.get(key, 1)
+            while n in used:
+                n += 1
+            self._next[key] = n + 1
+            candidate = f"{base} ({n}){ext}"
+
+        used.add(n)
+        # 分配出去的 “base (n)ext” 自己也是一个名字（粘贴的下一行可能正好是它）
+        if n:
+            self._used.setdefault(self._key(f"{base} ({n})", ext), set()).add(0)
+        return candidate
+
+    def create(self, name, create, path=None) -> str:
+        """
+        独占创建 name：create(path) 负责真正建（open "x" / mkdir，已存在要抛 FileExistsError）。
+        path: 事先 allocate 好的路径，不传就现分配；撞上列目录之后别人建的同名条目就换下一个号再试，
+        其他错误照常抛出。返回实际建成的路径
+        """
+        for _ in range(_MAX_ATTEMPTS):
+            if path is None:
+                path = self.allocate(name)
+            try:
+                create(path)
+                return path
+            except FileExistsError:
+                with self._lock:
+                    self.collisions += 1
+                path = None
+        raise FileExistsError(f"找不到可用的名字: {name}")
@@ -0,0 +1,110 @@
+# smartctrlv_patchfile.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 补丁写入（apply_patch_to_file 用）
+- 原来：整个文件读成 str -> 再拼一个完整的 new_content -> shutil.copyfile 出 .bak -> 整个写回；
+  改一行也要 3~4 倍文件大小的内存和 IO，而且写到一半出错文件就坏了
+- 现在：
+  - MappedFile 用 mmap 映射原文件（只读），旧代码块的字节偏移直接在映射上 find
+  - 编辑是 [(起, 止, 替换字节)]；写新文件时把没改的字节区间按块从映射里拷过去，中间插入替换内容，
+    内存只和改动大小（+ 一个拷贝块）有关，和文件大小无关
+  - 新内容写进 AtomicFile（smartctrlv_fileio：同目录临时文件 + os.replace，要么旧、要么新），
+    旧内容换下来之前进备份库（smartctrlv_backup，不再在文件旁边写 .bak）
+- Windows 上映射着的文件不能被替换：先写完临时文件、close 映射，再 commit
+"""
+
+import mmap
+import os
+
+# 拷贝没改动的区间时每块多大
+COPY_CHUNK = 1024 * 1024
+
+
+class MappedFile:
+    """
+    只读映射一个文件；空文件没法 mmap，当作长度 0 处理
+    用法：with MappedFile(path) as src: ...
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        except Exception:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    # ---------- 查找 ----------
+    def find_all(self, needle: bytes):
+        """needle 所有（不重叠）出现位置的字节偏移"""
+        offsets = []
+        mm = self._mm
+        if mm is None or not needle:
+            return offsets
+        pos = mm.find(needle)
+        while pos != -1:
+            offsets.append(pos)
+            pos = mm.find(needle, pos + len(needle))
+        return offsets
+
+    def newline(self) -> str:
+        """文件的换行风格：有 \\r\\n 就是 \\r\\n，否则有 \\n 就是 \\n，都没有就用系统默认"""
+        mm = self._mm
+        if mm is not None:
+            if mm.find(b"\r\n") != -1:
+                return "\r\n"
+            if mm.find(b"\n") != -1:
+                return "\n"
+        return os.linesep
+
+    def text(self, encoding="utf-8") -> str:
+        """整个文件解码成 str（只有需要按行规范化匹配时才用）"""
+        if self._mm is None:
+            return ""
+        return self._mm[:].decode(encoding, errors="ignore")
+
+    # ---------- 写出 ----------
+    def write_spliced(self, out, edits, chunk=COPY_CHUNK) -> int:
+        """
+        把“原文件 + edits”写到 out（有 write(bytes) 的对象），返回写入的字节数。
+        edits: [(start, end, replacement_bytes)]，按 start 排序且互不重叠
+        """
+        mm = self._mm
+        written = 0
+
+        def copy(a, b):
+            nonlocal written
+            while a < b:
+                n = min(chunk, b - a)
+                out.write(mm[a:a + n])
+                a += n
+                written += n
+
+        prev = 0
+        for start, end, replacement in edits:
+            copy(prev, start)
+            out.write(replacement)
+            written += len(replacement)
+            prev = end
+        copy(prev, self.size)
+        return written
+
+
+def edits_for(offsets, old_len, replacement: bytes):
+    """同一个替换用在多个偏移上"""
+    return [(pos, pos + old_len, replacement) for pos in offsets]
@@ -0,0 +1,169 @@
+# smartctrlv_patchmatch.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 补丁定位（apply_patch_to_file 用）
+- 原来只认逐字节一致的旧代码块：先 content.count 扫一遍，再 content.replace 又扫一遍；
+  AI 回答里的代码缩进、行尾空格、Tab/空格只要有一点不同就“找不到旧代码块”
+- 逐字节一致的情况不经过这里：apply_patch_to_file 直接在 mmap 上 find 字节偏移、拼接写盘（smartctrlv_patchfile）
+- 对不上时按“规范化行”匹配：去掉缩进和行尾空白、行内连续空白当一个，空行不参与；
+  对目标文件的规范化行建 行 -> 位置 索引（只收旧块里出现的那些行，一遍推导式），
+  取旧块里最少见的几行当锚点，只在锚点对应的位置逐行比对，按相同行的比例打分排序（近似线性）
+- 替换时把新代码块按匹配处的缩进重新缩进（相对缩进保持不变，文件用 Tab 就继续用 Tab）
+"""
+
+# 锚点取旧块里最少见的几行（其中一行被 AI 改过也还能找到）
+_ANCHORS = 3
+
+
+def normalize_line(line) -> str:
+    """缩进、行尾空白、行内连续空白 / Tab 都不算差异"""
+    key = line.strip()
+    if "  " in key or "\t" in key:
+        return " ".join(key.split())
+    return key
+
+
+def indent_width(line, tabsize=4) -> int:
+    width = 0
+    for ch in line:
+        if ch == " ":
+            width += 1
+        elif ch == "\t":
+            width += tabsize - width % tabsize
+        else:
+            break
+    return width
+
+
+class BlockMatch:
+    """文件里 [start, end) 这些行（含中间的空行）；score: 旧块里对上的非空行比例"""
+
+    __slots__ = ("start", "end", "score")
+
+    def __init__(self, start, end, score):
+        self.start = start
+        self.end = end
+        self.score = score
+
+    @property
+    def exact(self) -> bool:
+        return self.score >= 1.0
+
+    def __repr__(self):
+        return f"BlockMatch({self.start}, {self.end}, {self.score:.2f})"
+
+
+class BlockMatcher:
+    """
+    content: 目标文件全文
+    newline: 替换时用的换行符（跟文件一致）
+    规范化只做一次，同一个文件可以 find 多次
+    """
+
+    def __init__(self, content, newline="\n", tabsize=4):
+        self.newline = newline
+        self.tabsize = tabsize
+        self.lines = content.splitlines(keepends=True)
+        keys = [normalize_line(line) for line in self.lines]
+        self._rows = [i for i, key in enumerate(keys) if key]   # 非空行在 lines 里的下标
+        self._keys = [keys[i] for i in self._rows]              # 对应的规范化行
+
+    def _index(self, wanted):
+        """规范化行 -> [在 _rows 里的位置]，只收 wanted 里的行"""
+        index = {}
+        for pos in [p for p, key in enumerate(self._keys) if key in wanted]:
+            index.setdefault(self._keys[pos], []).append(pos)
+        return index
+
+    # ---------- 定位 ----------
+    def find(self, block, min_score=0.8):
+        """
+        返回匹配列表：有完全对上的（规范化后）就只返回这些，按位置排序且互不重叠；
+        否则返回相似度 >= min_score 的候选，按相似度从高到低
+        """
+        want = [k for k in (normalize_line(l) for l in block.splitlines()) if k]
+        m = len(want)
+        if not m or m > len(self._keys):
+            return []
+
+        # 锚点：旧块里在文件中出现次数最少的几行
+        index = self._index(set(want))
+        seen = set()
+        anchors = []
+        for offset, key in enumerate(want):
+            hits = index.get(key)
+            if hits and key not in seen:
+                seen.add(key)
+                anchors.append((len(hits), offset, hits))
+        anchors.sort(key=lambda a: (a[0], a[1]))
+
+        keys = self._keys
+        limit = len(keys) - m
+        max_miss = int(m * (1.0 - min_score))
+        scores = {}
+        for _, offset, hits in anchors[:_ANCHORS]:
+            for hit in hits:
+                s = hit - offset
+                if s < 0 or s > limit or s in scores:
+                    continue
+                miss = 0
+                for i in range(m):
+                    if keys[s + i] != want[i]:
+                        miss += 1
+                        if miss > max_miss:
+                            break
+                if miss <= max_miss:
+                    scores[s] = (m - miss) / m
+
+        exact = sorted(s for s, score in scores.items() if score >= 1.0)
+        if exact:
+            matches = []
+            last_end = -1
+            for s in exact:
+                if s >= last_end:
+                    matches.append(self._match(s, m, 1.0))
+                    last_end = s + m
+            return matches
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [self._match(s, m, score) for s, score in ranked]
+
+    def _match(self, s, m, score):
+        return BlockMatch(self._rows[s], self._rows[s + m - 1] + 1, score)
+
+    # ---------- 替换 ----------
+    def reindent(self, new_block, old_block, site_line):
+        """
+        按匹配处的缩进调整 new_block：旧块第一行的缩进对齐到 site_line，
+        其余行保持相对缩进；site_line 用 Tab 缩进时也用 Tab
+        """
+        tabsize = self.tabsize
+        old_first = next((l for l in old_block.splitlines() if l.strip()), "")
+        delta = indent_width(site_line, tabsize) - indent_width(old_first, tabsize)
+        use_tabs = site_line[:len(site_line) - len(site_line.lstrip(" \t"))].startswith("\t")
+
+        out = []
+        for line in new_block.splitlines():
+            body = line.lstrip(" \t")
+            if not body.strip():
+                out.append("")
+                continue
+            width = max(0, indent_width(line, tabsize) + delta)
+            if use_tabs:
+                prefix = "\t" * (width // tabsize) + " " * (width % tabsize)
+            else:
+                prefix = " " * width
+            out.append(prefix + body.rstrip())
+        return out
+
+    def replace(self, matches, old_block, new_block) -> str:
+        """把 matches 这些位置换成（重新缩进后的）new_block，返回新全文"""
+        lines = list(self.lines)
+        nl = self.newline
+        for match in sorted(matches, key=lambda mt: mt.start, reverse=True):
+            new_lines = self.reindent(new_block, old_block, lines[match.start])
+            text = nl.join(new_lines)
+            last = lines[match.end - 1]
+            if new_lines and last.endswith(("\n", "\r")):
+                text += nl
+            lines[match.start:match.end] = [text] if text else []
+        return "".join(lines)
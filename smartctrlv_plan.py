@@ -0,0 +1,522 @@
+# smartctrlv_plan.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 动作计划（AI_Plan_config.json 那种格式）执行器
+    {"actions": [
+        {"type": "create_file", "path": "a.txt", "content": "hello"},
+        {"type": "write_file", "path": "notes.md", "mode": "append", "content": "..."},   // 或 "overwrite"
+        {"type": "run_command", "command": "pip install requests && python main.py"}
+    ]}
+- 原来这种计划没人执行，每个动作只能各自在热键线程里一个个阻塞地做
+- 现在：
+  1) parse_plan 先把整份计划校验完（类型 / 路径不能跑出根目录 / create_file 不能撞已有文件 ……），
+     有问题一次全部报出来（PlanError），一个动作都不做
+  2) dry_run 只生成预览
+  3) 文件动作按路径分组：同一路径的动作按计划顺序串行，不同路径的组放进线程池并发
+  4) 全有或全无：任何一个动作失败，剩下的不再开始，已经做了的按相反顺序回滚
+     （新建的删掉、追加的截回原长度、覆盖的换回旧文件，为此建的父目录也删掉）
+  5) 文件动作全部成功之后才按顺序跑 run_command（命令没法回滚，所以放最后）
+- PlanResult 带每个动作的耗时和整批耗时；调用方只发一条汇总通知
+
+命令行：
+    python smartctrlv_plan.py AI_Plan_config.json [--root 目录] [--dry-run]
+"""
+
+import json
+import os
+import threading
+import time
+
+from smartctrlv_fileio import AtomicFile, append_text, link_or_copy
+from smartctrlv_log import get_logger
+
+log = get_logger("Plan")
+
+ACTION_CREATE_FILE = "create_file"
+ACTION_WRITE_FILE = "write_file"
+ACTION_RUN_COMMAND = "run_command"
+ACTION_TYPES = (ACTION_CREATE_FILE, ACTION_WRITE_FILE, ACTION_RUN_COMMAND)
+
+MODE_APPEND = "append"
+MODE_OVERWRITE = "overwrite"
+
+# 少于这么多个路径组就直接在当前线程做，不值得开线程池
+_INLINE_MAX = 4
+
+
+class PlanError(ValueError):
+    """计划校验没通过；errors: [(动作序号, 说明)]，序号从 1 开始，0 表示整份计划的问题"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        first = self.errors[0] if self.errors else (0, "未知错误")
+        text = f"第 {first[0]} 个动作: {first[1]}" if first[0] else first[1]
+        if len(self.errors) > 1:
+            text += f"（共 {len(self.errors)} 处问题）"
+        super().__init__(text)
+
+
+class PlanAction:
+    """
+    一个校验过的动作
+    - index: 在计划里的序号（从 1 开始）
+    - path: 绝对路径（run_command 为 None），rel: 计划里写的相对路径
+    """
+
+    __slots__ = ("index", "type", "path", "rel", "mode", "content", "command")
+
+    def __init__(self, index, type, path=None, rel=None, mode=None, content="", command=None):
+        self.index = index
+        self.type = type
+        self.path = path
+        self.rel = rel
+        self.mode = mode
+        self.content = content
+        self.command = command
+
+    @property
+    def is_file_action(self):
+        return self.type != ACTION_RUN_COMMAND
+
+    def describe(self) -> str:
+        if self.type == ACTION_RUN_COMMAND:
+            return f"执行命令: {self.command}"
+        if self.type == ACTION_CREATE_FILE:
+            return f"新建 {self.rel}（{len(self.content)} 字符）"
+        verb = "追加到" if self.mode == MODE_APPEND else "覆盖"
+        return f"{verb} {self.rel}（{len(self.content)} 字符）"
+
+    def __repr__(self):
+        return f"PlanAction({self.index}, {self.type}, {self.rel or self.command!r})"
+
+
+# ===================== 解析 / 校验 =====================
+
+def strip_json_comments(text: str) -> str:
+    """去掉 // 和 /* */ 注释（字符串里的不动）；AI 给的计划经常带注释"""
+    if "//" not in text and "/*" not in text:
+        return text
+    out = []
+    i, n = 0, len(text)
+    in_string = False
+    while i < n:
+        c = text[i]
+        if in_string:
+            out.append(c)
+            if c == "\\" and i + 1 < n:
+                out.append(text[i + 1])
+                i += 2
+                continue
+            if c == '"':
+                in_string = False
+            i += 1
+        elif c == '"':
+            in_string = True
+            out.append(c)
+            i += 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        else:
+            out.append(c)
+            i += 1
+    return "".join(out)
+
+
+def looks_like_plan(text: str) -> bool:
+    """快速判断：剪贴板是不是一份动作计划（不解析）"""
+    head = text.lstrip()
+    return head.startswith("{") and '"actions"' in head
+
+
+def _resolve(root, rel):
+    """计划里的相对路径 -> 绝对路径；绝对路径 / 跑出 root 的返回 None"""
+    if os.path.isabs(rel) or os.path.splitdrive(rel)[0]:
+        return None
+    path = os.path.normpath(os.path.join(root, rel))
+    try:
+        if os.path.commonpath([root, path]) != root or path == root:
+            return None
+    except ValueError:
+        return None
+    return path
+
+
+def parse_plan(data, root) -> list:
+    """
+    data: 计划 dict 或 JSON 文本；root: 相对路径的根目录。
+    返回 [PlanAction]；有任何问题抛 PlanError（所有问题一起报）
+    """
+    if isinstance(data, str):
+        try:
+            data = json.loads(strip_json_comments(data))
+        except ValueError as e:
+            raise PlanError([(0, f"不是合法的 JSON: {e}")])
+    raw_actions = data.get("actions") if isinstance(data, dict) else None
+    if not isinstance(raw_actions, list) or not raw_actions:
+        raise PlanError([(0, "计划里没有 actions 列表")])
+
+    root = os.path.abspath(root)
+    actions = []
+    errors = []
+    # 按计划顺序模拟一遍：哪些路径执行到这里时已经是文件
+    will_exist = {}
+
+    for index, raw in enumerate(raw_actions, 1):
+        if not isinstance(raw, dict):
+            errors.append((index, "动作必须是一个对象"))
+            continue
+        kind = raw.get("type")
+        if kind not in ACTION_TYPES:
+            errors.append((index, f"未知的动作类型: {kind!r}"))
+            continue
+
+        if kind == ACTION_RUN_COMMAND:
+            command = raw.get("command")
+            if not isinstance(command, str) or not command.strip():
+                errors.append((index, "run_command 缺少 command"))
+                continue
+            actions.append(PlanAction(index, kind, command=command.strip()))
+            continue
+
+        rel = raw.get("path")
+        if not isinstance(rel, str) or not rel.strip():
+            errors.append((index, f"{kind} 缺少 path"))
+            continue
+        rel = rel.strip()
+        path = _resolve(root, rel)
+        if path is None:
+            errors.append((index, f"路径必须在 {root} 里面: {rel}"))
+            continue
+        content = raw.get("content", "")
+        if not isinstance(content, str):
+            errors.append((index, f"content 必须是字符串: {rel}"))
+            continue
+        mode = None
+        if kind == ACTION_WRITE_FILE:
+            mode = raw.get("mode", MODE_APPEND)
+            if mode not in (MODE_APPEND, MODE_OVERWRITE):
+                errors.append((index, f"mode 只能是 append / overwrite: {mode!r}"))
+                continue
+
+        key = os.path.normcase(path)
+        exists = will_exist.get(key)
+        if exists is None:
+            if os.path.isdir(path):
+                errors.append((index, f"{rel} 是一个文件夹"))
+                continue
+            exists = os.path.exists(path)
+        if kind == ACTION_CREATE_FILE and exists:
+            errors.append((index, f"{rel} 已经存在"))
+            continue
+        parent = os.path.dirname(path)
+        while parent != root and not os.path.exists(parent):
+            parent = os.path.dirname(parent)
+        if not os.path.isdir(parent):
+            errors.append((index, f"{rel} 的上级目录是一个文件"))
+            continue
+
+        will_exist[key] = True
+        actions.append(PlanAction(index, kind, path, rel, mode, content))
+
+    if errors:
+        raise PlanError(errors)
+    return actions
+
+
+def load_plan(path, root=None) -> list:
+    """读计划文件；root 默认是计划文件所在目录"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    return parse_plan(text, root or os.path.dirname(os.path.abspath(path)))
+
+
+# ===================== 执行 =====================
+
+class PlanResult:
+    """
+    - applied: [(动作, 耗时 ms)]，按计划顺序（回滚了的也在里面，rolled_back 为 True）
+    - failed: (动作, 错误信息)，没失败是 None
+    - commands: 已经启动的命令
+    - preview: dry_run 时的预览行
+    """
+
+    def __init__(self, root, actions, dry_run=False):
+        self.root = root
+        self.actions = actions
+        self.dry_run = dry_run
+        self.applied = []
+        self.failed = None
+        self.rolled_back = False
+        self.rollback_errors = []
+        self.commands = []
+        self.preview = []
+        self.elapsed_ms = 0.0
+        self.workers = 1
+
+    @property
+    def ok(self) -> bool:
+        return self.failed is None
+
+    def stats(self) -> dict:
+        data = sorted(ms for _, ms in self.applied)
+        return {
+            "actions": len(self.actions),
+            "applied": 0 if self.rolled_back else len(self.applied),
+            "commands": len(self.commands),
+            "rolled_back": self.rolled_back,
+            "workers": self.workers,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+            "action_p50_ms": round(data[len(data) // 2], 3) if data else 0.0,
+            "action_max_ms": round(data[-1], 3) if data else 0.0,
+        }
+
+    def summary(self) -> str:
+        """一句话汇总，给通知 / 日志用"""
+        if self.dry_run:
+            return f"计划预览：{len(self.actions)} 个动作，没有改动任何文件"
+        if self.failed is not None:
+            action, error = self.failed
+            text = f"第 {action.index} 个动作失败（{action.rel or action.command}: {error}）"
+            if self.rolled_back:
+                text += f"，已回滚 {len(self.applied)} 个动作"
+            if self.rollback_errors:
+                text += f"，{len(self.rollback_errors)} 项回滚失败"
+            return f"{text}（{self.elapsed_ms:.0f} ms）"
+        files = len(self.applied)
+        text = f"计划已执行：{files} 个文件动作"
+        if self.commands:
+            text += f"，{len(self.commands)} 条命令"
+        return f"{text}（{self.elapsed_ms:.0f} ms）"
+
+
+class _Rollback:
+    """执行时记下的逆操作；一个路径组内按顺序记，回滚时倒着做"""
+
+    __slots__ = ("op", "path", "arg")
+
+    def __init__(self, op, path, arg=None):
+        self.op = op
+        self.path = path
+        self.arg = arg
+
+    def run(self):
+        if self.op == "remove":
+            os.remove(self.path)
+        elif self.op == "truncate":
+            with open(self.path, "r+b") as f:
+                f.truncate(self.arg)
+        elif self.op == "restore":
+            os.replace(self.arg, self.path)
+
+
+class PlanExecutor:
+    """
+    root: 相对路径的根目录
+    workers: 线程池大小（不同路径的文件动作并发）
+    run_command(folder, command): 执行 run_command 动作（不传就只记日志不执行）
+    """
+
+    def __init__(self, root, workers=8, run_command=None):
+        self.root = os.path.abspath(root)
+        self.workers = max(1, int(workers))
+        self.run_command = run_command
+        self._stash = None
+        self._stash_lock = threading.Lock()
+        self._stash_seq = 0
+
+    def preview(self, actions) -> list:
+        lines = [f"{a.index:>3}. {a.describe()}" for a in actions if a.is_file_action]
+        lines += [f"{a.index:>3}. {a.describe()}（文件动作全部成功后执行）"
+                  for a in actions if not a.is_file_action]
+        return lines
+
+    def execute(self, actions, dry_run=False) -> PlanResult:
+        t0 = time.perf_counter()
+        result = PlanResult(self.root, actions, dry_run=dry_run)
+        if dry_run:
+            result.preview = self.preview(actions)
+            result.elapsed_ms = (time.perf_counter() - t0) * 1000
+            return result
+
+        file_actions = [a for a in actions if a.is_file_action]
+        made_dirs = []
+        undo = {}
+        try:
+            result.failed = self._make_parents(file_actions, made_dirs)
+            if result.failed is None:
+                self._run_groups(file_actions, result, undo)
+            if result.failed is not None:
+                self._rollback(result, undo, made_dirs)
+        finally:
+            self._drop_stash()
+
+        if result.failed is None:
+            for action in actions:
+                if action.is_file_action:
+                    continue
+                if self.run_command is None:
+                    log.info("（未执行）命令: %s", action.command)
+                    continue
+                self.run_command(self.root, action.command)
+                result.commands.append(action.command)
+
+        result.elapsed_ms = (time.perf_counter() - t0) * 1000
+        return result
+
+    # ---------- 文件动作 ----------
+    def _make_parents(self, actions, made_dirs):
+        """缺的父目录按计划顺序先串行建好（记下来，回滚时删）；失败返回 (动作, 错误信息)"""
+        for action in actions:
+            missing = []
+            parent = os.path.dirname(action.path)
+            while parent != self.root and not os.path.isdir(parent):
+                missing.append(parent)
+                parent = os.path.dirname(parent)
+            for folder in reversed(missing):
+                try:
+                    os.mkdir(folder)
+                except OSError as e:
+                    return action, str(e)
+                made_dirs.append(folder)
+        return None
+
+    def _run_groups(self, actions, result, undo):
+        """按路径分组：组内串行，组间并发；有一个失败，其他组不再开始新动作"""
+        groups = {}
+        for action in actions:
+            groups.setdefault(os.path.normcase(action.path), []).append(action)
+        abort = threading.Event()
+        timings = {}
+
+        def run_group(key):
+            ops = undo[key]
+            for action in groups[key]:
+                if abort.is_set():
+                    return None
+                start = time.perf_counter()
+                try:
+                    ops.append(self._apply(action))
+                except Exception as e:
+                    abort.set()
+                    return action, str(e)
+                timings[action.index] = (time.perf_counter() - start) * 1000
+            return None
+
+        keys = list(groups)
+        # 先在当前线程建好每个组的逆操作列表，工作线程只往自己的列表里追加
+        for key in keys:
+            undo[key] = []
+        n_workers = min(self.workers, len(keys))
+        if len(keys) <= _INLINE_MAX or n_workers <= 1:
+            outcomes = [run_group(key) for key in keys]
+        else:
+            result.workers = n_workers
+            from concurrent.futures import ThreadPoolExecutor  # 用到线程池才加载
+
+            with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="SmartCtrlV-Plan") as pool:
+                outcomes = list(pool.map(run_group, keys))
+
+        failures = [f for f in outcomes if f is not None]
+        if failures:
+            result.failed = min(failures, key=lambda f: f[0].index)
+        result.applied = [(a, timings[a.index]) for a in actions if a.index in timings]
+
+    def _apply(self, action):
+        """做一个文件动作，返回它的逆操作"""
+        path = action.path
+        if action.type == ACTION_CREATE_FILE:
+            with open(path, "x", encoding="utf-8", errors="ignore") as f:
+                f.write(action.content)
+            return _Rollback("remove", path)
+
+        if action.mode == MODE_APPEND:
+            offset, created = append_text(path, action.content)
+            return _Rollback("remove", path) if created else _Rollback("truncate", path, offset)
+
+        # 覆盖：旧文件先挂一个硬链接到暂存目录，回滚时换回去
+        backup = None
+        if os.path.exists(path):
+            backup = self._stash_path()
+            link_or_copy(path, backup)
+        with AtomicFile(path, binary=False, errors="ignore") as f:
+            f.write(action.content)
+        return _Rollback("restore", path, backup) if backup else _Rollback("remove", path)
+
+    def _stash_path(self):
+        import tempfile
+
+        with self._stash_lock:
+            if self._stash is None:
+                self._stash = tempfile.mkdtemp(prefix=".smartctrlv-plan.", dir=self.root)
+            self._stash_seq += 1
+            return os.path.join(self._stash, f"{self._stash_seq}.bak")
+
+    def _drop_stash(self):
+        if self._stash is None:
+            return
+        import shutil
+
+        shutil.rmtree(self._stash, ignore_errors=True)
+        self._stash = None
+
+    # ---------- 回滚 ----------
+    def _rollback(self, result, undo, made_dirs):
+        for ops in undo.values():
+            for op in reversed(ops):
+                try:
+                    op.run()
+                except OSError as e:
+                    result.rollback_errors.append((op.path, str(e)))
+        for folder in reversed(made_dirs):
+            try:
+                os.rmdir(folder)
+            except OSError as e:
+                result.rollback_errors.append((folder, str(e)))
+        result.rolled_back = True
+        for path, error in result.rollback_errors:
+            log.error("回滚失败 %s: %s", path, error)
+
+
+def execute_plan(actions, root, workers=8, dry_run=False, run_command=None) -> PlanResult:
+    return PlanExecutor(root, workers=workers, run_command=run_command).execute(actions, dry_run=dry_run)
+
+
+# ===================== 命令行 =====================
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SmartCtrlV 动作计划执行")
+    parser.add_argument("plan", help="计划文件（AI_Plan_config.json 格式）")
+    parser.add_argument("--root", help="相对路径的根目录（默认是计划文件所在目录）")
+    parser.add_argument("--dry-run", action="store_true", help="只预览，不改动任何文件")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    try:
+        actions = load_plan(args.plan, args.root)
+    except PlanError as e:
+        for index, message in e.errors:
+            print(f"  第 {index} 个动作: {message}" if index else f"  {message}")
+        return 1
+
+    def run_command(folder, command):
+        import subprocess
+        subprocess.run(command, shell=True, cwd=folder)
+
+    root = args.root or os.path.dirname(os.path.abspath(args.plan))
+    result = execute_plan(actions, root, workers=args.workers, dry_run=args.dry_run, run_command=run_command)
+    for line in result.preview:
+        print(line)
+    for action, ms in result.applied:
+        print(f"{ms:8.2f} ms  {action.describe()}")
+    print(result.summary())
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
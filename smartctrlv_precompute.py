@@ -0,0 +1,232 @@
+# smartctrlv_precompute.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 多格式菜单的“预计算”（可选，默认关闭）
+- 多格式菜单里的纯文本 / 结构化 / Markdown 清理 / 去空行 / Python 缩进整理，
+  原来都是用户点了菜单项之后才开始算，正好卡在 close_menu() 和 Ctrl+V 之间
+- 打开后，后台线程监听剪贴板变化：新文本一出现，就在工作线程里把启用的变换先算好；
+  点菜单时只要剪贴板还是那一份，直接拿现成结果
+- 剪贴板再次变化 -> 当前这一轮作废，剩下的变换不再计算
+- 每个变换有 CPU 时间上限：Python 线程没法中途打断，所以按“每字符耗时”估算，
+  预计超限的变换直接跳过（点菜单时再现算）；实际超限的会更新估算值
+"""
+
+import threading
+import time
+
+from smartctrlv_log import get_logger
+
+log = get_logger("Precompute")
+
+# 没算出来 / 结果已经过期
+MISS = object()
+
+_MIN_MEASURABLE_S = 0.001
+
+
+class _Round:
+    """一份剪贴板内容对应的一轮预计算"""
+
+    __slots__ = ("key", "text", "results", "cancelled")
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        self.results = {}
+        self.cancelled = False
+
+
+class ClipboardPrecomputer:
+    """
+    transforms: [(名字, fn(text) -> 结果), ...]，按顺序计算（常用的放前面）
+    - poll_interval: 检查剪贴板序列号的间隔（秒）；GetClipboardSequenceNumber 几乎零开销
+    - cpu_cap_s: 每个变换允许的 CPU 时间上限（秒）
+    - max_chars: 超过这个长度的文本不做预计算
+    没有序列号的后端（FakeBackend）退回比较文本内容；也可以直接调 notify_clipboard_changed()。
+    """
+
+    def __init__(self, backend, transforms, poll_interval=0.1, cpu_cap_s=0.05, max_chars=1024 * 1024):
+        self.backend = backend
+        self.transforms = list(transforms)
+        self.poll_interval = poll_interval
+        self.cpu_cap_s = cpu_cap_s
+        self.max_chars = max_chars
+
+        self._cond = threading.Condition()
+        self._pending = None       # 等待计算的 _Round
+        self._current = None       # 最新一轮（可能还在算）
+        self._last_key = None
+        self._stop = threading.Event()
+        self._threads = []
+
+        # 每个变换观察到的“秒/字符”（取最大值，保守估算）
+        self._cost_per_char = {}
+
+        self.computed = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.over_budget = 0
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- 生命周期 ----------
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._watch_loop, name="SmartCtrlV-ClipWatch", daemon=True),
+            threading.Thread(target=self._work_loop, name="SmartCtrlV-Precompute", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        with self._cond:
+            if self._current is not None:
+                self._current.cancelled = True
+            self._pending = None
+            self._current = None
+            self._last_key = None
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def stats(self) -> dict:
+        return {
+            "computed": self.computed,
+            "cancelled": self.cancelled,
+            "skipped": self.skipped,
+            "over_budget": self.over_budget,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    # ---------- 监听剪贴板 ----------
+    def _clipboard_key(self):
+        """(key, text)：有序列号时只在序列号变化后才读文本"""
+        seq = None
+        try:
+            seq = self.backend.get_clipboard_sequence_number()
+        except Exception:
+            seq = None
+        if seq is not None:
+            if ("seq", seq) == self._last_key:
+                return self._last_key, None
+            return ("seq", seq), self._read_text()
+        text = self._read_text()
+        return ("text", text), text
+
+    def _read_text(self):
+        try:
+            n = self.backend.get_clipboard_text_length()
+            if n is not None and n > self.max_chars:
+                return None
+            if self.backend.is_clipboard_file_drop():
+                return None
+            text, truncated = self.backend.get_clipboard_text_prefix(self.max_chars)
+            return None if truncated else text
+        except Exception:
+            return None
+
+    def notify_clipboard_changed(self):
+        """剪贴板变了：作废当前一轮，按新内容重新开始"""
+        key, text = self._clipboard_key()
+        with self._cond:
+            if key == self._last_key:
+                return
+            self._last_key = key
+            if self._current is not None and not self._current.cancelled:
+                self._current.cancelled = True
+                if len(self._current.results) < len(self.transforms):
+                    self.cancelled += 1
+            if not text:
+                self._current = None
+                self._pending = None
+                return
+            self._current = self._pending = _Round(key, text)
+            self._cond.notify_all()
+
+    def _watch_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.notify_clipboard_changed()
+            except Exception as e:
+                log.error("监听剪贴板失败: %s", e)
+            self._stop.wait(self.poll_interval)
+
+    # ---------- 计算 ----------
+    def _work_loop(self):
+        while not self._stop.is_set():
+            with self._cond:
+                while self._pending is None and not self._stop.is_set():
+                    self._cond.wait()
+                rnd, self._pending = self._pending, None
+            if rnd is not None:
+                self._run_round(rnd)
+
+    def _run_round(self, rnd: _Round):
+        n = len(rnd.text)
+        for name, fn in self.transforms:
+            if rnd.cancelled or self._stop.is_set():
+                return
+            est = self._cost_per_char.get(name)
+            if est is not None and est * n > self.cpu_cap_s:
+                self.skipped += 1
+                continue
+
+            t0 = time.thread_time()
+            try:
+                result = fn(rnd.text)
+            except Exception as e:
+                log.error("%s 失败: %s", name, e)
+                continue
+            cost = time.thread_time() - t0
+
+            # 太短的耗时受计时精度影响，按字符摊下来会严重高估，不拿来更新估算
+            if n and cost >= _MIN_MEASURABLE_S:
+                self._cost_per_char[name] = max(est or 0.0, cost / n)
+            if cost > self.cpu_cap_s:
+                self.over_budget += 1
+
+            with self._cond:
+                if rnd.cancelled:
+                    return
+                rnd.results[name] = result
+                self.computed += 1
+
+    # ---------- 菜单取结果 ----------
+    def get_result(self, name, text=None):
+        """
+        当前剪贴板的 name 变换结果；没算出来或者剪贴板已经变了返回 MISS。
+        text: 调用方已经读出来的剪贴板文本（没有序列号的后端靠它判断是不是同一份）
+        """
+        with self._cond:
+            rnd = self._current
+        if rnd is None or rnd.cancelled or name not in rnd.results:
+            self.misses += 1
+            return MISS
+
+        seq = None
+        try:
+            seq = self.backend.get_clipboard_sequence_number()
+        except Exception:
+            seq = None
+        if seq is not None:
+            same = rnd.key == ("seq", seq)
+        else:
+            if text is None:
+                text = self.backend.get_clipboard_text()
+            same = text == rnd.text
+        if not same:
+            self.misses += 1
+            return MISS
+
+        self.hits += 1
+        return rnd.results[name]
@@ -0,0 +1,129 @@
+# smartctrlv_procinfo.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 前台进程身份缓存
+- 每次 Ctrl+V / 菜单热键都要 OpenProcess + GetModuleFileNameEx + CloseHandle 拿 exe 路径，
+  但前台程序在两次按键之间几乎不会变
+- 这里按 pid 做 LRU 缓存 exe 路径 / 文件名，用“进程创建时间”校验：
+  PID 被新进程复用时创建时间一定不同，旧条目直接作废
+- 同一个 (hwnd, pid) 短时间内再次命中时连创建时间都不查：
+  窗口还属于这个 pid，说明进程还活着（进程退出时它的窗口一定先销毁）
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MAX_HWNDS_PER_PROCESS = 32
+
+
+class ProcessInfo:
+    __slots__ = ("pid", "exe_path", "exe_name", "created", "hwnds", "checked_at")
+
+    def __init__(self, pid, exe_path, created, checked_at):
+        self.pid = pid
+        self.exe_path = exe_path
+        # exe 路径总是 Windows 风格，按 \\ 和 / 都切一下
+        self.exe_name = exe_path.replace("\\", "/").rsplit("/", 1)[-1].lower() if exe_path else None
+        self.created = created
+        self.hwnds = set()
+        self.checked_at = checked_at
+
+    def __repr__(self):
+        return f"ProcessInfo(pid={self.pid}, exe={self.exe_name!r})"
+
+
+class ProcessIdentityCache:
+    """
+    - max_entries: 最多缓存多少个进程
+    - revalidate_s: 同一个 (hwnd, pid) 在这段时间内命中不再查创建时间
+    计数器：hits / misses / validations（查创建时间的次数）/ invalidations（PID 复用被发现）
+    """
+
+    def __init__(self, max_entries=64, revalidate_s=2.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.revalidate_s = revalidate_s
+        self._clock = clock
+        self._entries = OrderedDict()   # pid -> ProcessInfo
+        self._backend = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.validations = 0
+        self.invalidations = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "validations": self.validations,
+            "invalidations": self.invalidations,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, pid):
+        """外部得知进程已退出时调用"""
+        with self._lock:
+            if self._entries.pop(pid, None) is not None:
+                self.invalidations += 1
+
+    def lookup(self, backend, hwnd):
+        """hwnd 所属进程的 ProcessInfo；拿不到 pid 返回 None"""
+        if backend is not self._backend:
+            # 换了后端（测试 / 压测），旧数据没有意义
+            with self._lock:
+                self._entries.clear()
+                self._backend = backend
+
+        pid = backend.get_window_pid(hwnd)
+        if pid is None:
+            return None
+
+        now = self._clock()
+        with self._lock:
+            info = self._entries.get(pid)
+            if info is not None and hwnd in info.hwnds and now - info.checked_at < self.revalidate_s:
+                self._entries.move_to_end(pid)
+                self.hits += 1
+                return info
+
+        if info is not None:
+            # 别的窗口来的，或者太久没校验：比一下创建时间
+            self.validations += 1
+            created = backend.get_process_creation_time(pid)
+            if created is not None and created == info.created:
+                with self._lock:
+                    if len(info.hwnds) >= _MAX_HWNDS_PER_PROCESS:
+                        # explorer.exe 这种一个进程开一堆窗口的，别让集合无限长
+                        info.hwnds.clear()
+                    info.hwnds.add(hwnd)
+                    info.checked_at = now
+                    if pid in self._entries:
+                        self._entries.move_to_end(pid)
+                    self.hits += 1
+                return info
+            # PID 已经被别的进程复用（或者进程没了）
+            with self._lock:
+                self._entries.pop(pid, None)
+                self.invalidations += 1
+        else:
+            created = backend.get_process_creation_time(pid)
+
+        # 未命中：真正去查 exe 路径
+        self.misses += 1
+        exe_path = backend.get_process_exe_path(pid)
+        info = ProcessInfo(pid, exe_path, created, now)
+        info.hwnds.add(hwnd)
+        if exe_path and created is not None:
+            # 拿不到创建时间就没法校验，不缓存
+            with self._lock:
+                self._entries[pid] = info
+                self._entries.move_to_end(pid)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return info
@@ -0,0 +1,348 @@
+# smartctrlv_shellcom.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 常驻 COM 工作线程（Explorer Shell 查询）
+- 原来 get_explorer_folder_path / get_explorer_selected_files 每次都要
+  CoInitialize + CreateObject("Shell.Application") + 遍历窗口 + CoUninitialize，
+  一次 Ctrl+V 两个都要查就来两遍；开着 20 多个 Explorer 窗口时这是热键里最慢的一步
+- 现在由一个专门的 STA 线程持有 Shell.Application，查询通过队列发过去，调用方带超时等待
+- COM 调用出错（典型情况：Explorer 重启，旧对象断开）就丢掉旧对象重建，再试一次
+- 某个查询卡死（Explorer 无响应）超过 stuck_s：放弃这个线程，换一个新的
+- ShellWindowIndex：hwnd -> shell 窗口的索引，不用每次把所有窗口的 HWND 都读一遍
+- FakeShellApplication：假的 Shell.Application，没有 Windows 也能跑索引 / 工作线程
+"""
+
+import queue
+import threading
+import time
+
+from smartctrlv_log import get_logger
+
+log = get_logger("ShellCOM")
+
+
+def create_shell_application():
+    import comtypes.client
+    return comtypes.client.CreateObject("Shell.Application")
+
+
+class _Request:
+    __slots__ = ("fn", "done", "result", "error", "cancelled", "started")
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.started = None
+
+
+class ShellComWorker:
+    """
+    factory: 在工作线程里创建 COM 对象（默认 Shell.Application）
+    com_init: 工作线程是否 CoInitialize（单元测试用假对象时可以关掉）
+    """
+
+    def __init__(self, factory=create_shell_application, timeout=2.0, stuck_s=10.0,
+                 com_init=True, name="SmartCtrlV-ShellCOM"):
+        self.factory = factory
+        self.timeout = timeout
+        self.stuck_s = stuck_s
+        self.com_init = com_init
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._current = None   # 工作线程正在处理的 _Request
+
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.recreations = 0   # COM 对象重建次数（Explorer 重启等）
+        self.restarts = 0      # 工作线程卡死后换新线程的次数
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "recreations": self.recreations,
+            "restarts": self.restarts,
+        }
+
+    # ---------- 对外 ----------
+    def call(self, fn, timeout=None, default=None):
+        """
+        在 STA 线程里执行 fn(shell) 并等待结果；
+        超时 / 出错返回 default（调用方当作“查不到”处理，和原来的行为一致）
+        """
+        self.calls += 1
+        req = _Request(fn)
+        self._submit(req)
+
+        if not req.done.wait(self.timeout if timeout is None else timeout):
+            req.cancelled = True
+            self.timeouts += 1
+            log.warning("查询超时（>%ss）", self.timeout if timeout is None else timeout)
+            return default
+        if req.error is not None:
+            self.errors += 1
+            log.warning("查询失败: %s", req.error)
+            return default
+        return req.result
+
+    def stop(self):
+        with self._lock:
+            if self._queue is not None:
+                self._queue.put(None)
+            self._queue = None
+            self._thread = None
+
+    # ---------- 线程管理 ----------
+    def _submit(self, req):
+        with self._lock:
+            cur = self._current
+            if (self._thread is not None and cur is not None and cur.started is not None
+                    and time.monotonic() - cur.started > self.stuck_s):
+                # 卡死在某个 COM 调用里：旧线程放弃（daemon，让它自己慢慢结束）
+                log.warning("工作线程无响应，重新启动")
+                cur.cancelled = True
+                self._queue.put(None)
+                self._thread = None
+                self.restarts += 1
+
+            if self._thread is None or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._current = None
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name=self.name, daemon=True
+                )
+                self._thread.start()
+            self._queue.put(req)
+
+    def _run(self, q):
+        comtypes = None
+        if self.com_init:
+            try:
+                import comtypes
+                comtypes.CoInitialize()  # STA
+            except Exception as e:
+                log.error("CoInitialize 失败: %s", e)
+                comtypes = None
+
+        shell = None
+        try:
+            while True:
+                req = q.get()
+                if req is None:
+                    return
+                if req.cancelled:
+                    continue
+
+                req.started = time.monotonic()
+                self._current = req
+                try:
+                    for attempt in (0, 1):
+                        try:
+                            if shell is None:
+                                shell = self.factory()
+                            req.result = req.fn(shell)
+                            req.error = None
+                            break
+                        except Exception as e:
+                            # 旧对象可能已经断开（Explorer 重启）：丢掉重建，再试一次
+                            req.error = e
+                            shell = None
+                            if attempt == 0:
+                                self.recreations += 1
+                finally:
+                    if self._current is req:
+                        self._current = None
+                    req.done.set()
+        finally:
+            shell = None
+            if comtypes is not None:
+                try:
+                    comtypes.CoUninitialize()
+                except Exception:
+                    pass
+
+
+# ===================== hwnd -> shell 窗口索引 =====================
+
+class ShellWindowIndex:
+    """
+    原来每次查询都要遍历 shell.Windows()，对每个窗口读一次 HWND（每次都是跨进程 COM 调用）。
+    这里建一次 hwnd -> [窗口] 的字典，之后每次查询只读 shell.Windows().Count：
+    - Count 变了 / 索引太旧（max_age_s）/ COM 对象换了（重建过） -> 重建索引
+    - hwnd 不在索引里（同时一开一关，Count 没变）-> 重建一次再查；
+      重建后还找不到的记下来（比如桌面），索引重建之前不再为它重建
+    一个 HWND 可能对应多个窗口（Explorer 标签页）。只在 COM 工作线程里用，不加锁。
+    """
+
+    def __init__(self, max_age_s=5.0, clock=time.monotonic):
+        self.max_age_s = max_age_s
+        self._clock = clock
+        self._shell = None
+        self._index = {}
+        self._not_found = set()
+        self._count = None
+        self._built_at = None
+
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {"windows": sum(len(v) for v in self._index.values()),
+                "builds": self.builds, "hits": self.hits, "misses": self.misses}
+
+    def invalidate(self):
+        self._count = None
+
+    def resolve(self, shell, hwnd, extract, retry_if=lambda result: not result):
+        """
+        extract(窗口列表) -> 结果。索引可能过期：结果满足 retry_if 且索引不是刚建的，就重建再试一次
+        """
+        fresh = self._refresh(shell)
+        windows = self._index.get(hwnd)
+        if windows is None and not fresh and hwnd not in self._not_found:
+            self._rebuild(shell)
+            fresh = True
+            windows = self._index.get(hwnd)
+        if windows is None:
+            self._not_found.add(hwnd)
+            self.misses += 1
+            return extract([])
+
+        result = extract(windows)
+        if retry_if(result) and not fresh:
+            # 窗口对象可能已经失效（关掉又开了一个同 HWND 的）
+            self._rebuild(shell)
+            result = extract(self._index.get(hwnd) or [])
+        self.hits += 1
+        return result
+
+    def _refresh(self, shell) -> bool:
+        """需要的话重建索引；返回这次是否重建过"""
+        windows = shell.Windows()
+        count = windows.Count
+        now = self._clock()
+        if (shell is not self._shell or count != self._count
+                or self._built_at is None or now - self._built_at > self.max_age_s):
+            self._rebuild(shell, windows)
+            return True
+        return False
+
+    def _rebuild(self, shell, windows=None):
+        if windows is None:
+            windows = shell.Windows()
+        index = {}
+        for window in windows:
+            try:
+                if window:
+                    index.setdefault(window.HWND, []).append(window)
+            except Exception:
+                continue
+        self._shell = shell
+        self._index = index
+        self._not_found = set()
+        self._count = windows.Count
+        self._built_at = self._clock()
+        self.builds += 1
+
+
+# ===================== 假的 Shell.Application =====================
+
+class _FakeObject:
+    pass
+
+
+class FakeShellWindow:
+    """只实现 SmartCtrlV 用到的属性：HWND / LocationURL / Document.Folder.Self.Path / Document.SelectedItems()"""
+
+    def __init__(self, owner, hwnd, folder, selection=()):
+        self._owner = owner
+        self._hwnd = hwnd
+        self.folder = folder
+        self.selection = list(selection)
+
+    @property
+    def HWND(self):
+        self._owner.property_reads += 1
+        return self._hwnd
+
+    @property
+    def LocationURL(self):
+        self._owner.property_reads += 1
+        return "file:///" + self.folder.replace("\\", "/")
+
+    @property
+    def Document(self):
+        self._owner.property_reads += 1
+        window = self
+        doc = _FakeObject()
+        doc.Folder = _FakeObject()
+        doc.Folder.Self = _FakeObject()
+        doc.Folder.Self.Path = window.folder
+
+        def selected_items():
+            items = _FakeObject()
+            paths = list(window.selection)
+            items.Count = len(paths)
+
+            def item(i):
+                it = _FakeObject()
+                it.Path = paths[i]
+                return it
+
+            items.Item = item
+            return items
+
+        doc.SelectedItems = selected_items
+        return doc
+
+
+class _FakeShellWindows:
+    def __init__(self, owner):
+        self._owner = owner
+
+    @property
+    def Count(self):
+        self._owner.property_reads += 1
+        return len(self._owner.windows)
+
+    def __iter__(self):
+        return iter(list(self._owner.windows))
+
+
+class FakeShellApplication:
+    """
+    假的 Shell.Application：
+    - add_window / remove_window 模拟开关 Explorer 窗口
+    - property_reads 统计“COM 属性读取”次数（真 COM 下每次都是跨进程调用）
+    - disconnect() 模拟 Explorer 重启：之后的调用都抛异常
+    """
+
+    def __init__(self):
+        self.windows = []
+        self.property_reads = 0
+        self.connected = True
+
+    def add_window(self, hwnd, folder, selection=()):
+        window = FakeShellWindow(self, hwnd, folder, selection)
+        self.windows.append(window)
+        return window
+
+    def remove_window(self, hwnd):
+        self.windows = [w for w in self.windows if w._hwnd != hwnd]
+
+    def disconnect(self):
+        self.connected = False
+
+    def Windows(self):
+        if not self.connected:
+            raise OSError("RPC server unavailable (fake)")
+        return _FakeShellWindows(self)
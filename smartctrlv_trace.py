@@ -0,0 +1,197 @@
+# smartctrlv_trace.py
+# -*- coding: utf-8 -*-
+"""
+SmartCtrlV 热键分阶段耗时记录
+- 每次热键处理（on_ctrl_v_explorer / on_ai_smart_paste / on_hotkey_menu）是一个 invocation，
+  里面按阶段记 span：foreground / clipboard / com / classify / action / inject
+- 计时用 perf_counter_ns；记录写进固定大小的环形缓冲区：
+  下标来自 itertools.count（GIL 下 next() 是原子的），写入槽位不加锁，旧记录被覆盖
+- 导出：Chrome trace JSON（chrome://tracing 或 https://ui.perfetto.dev 打开）
+  以及每个阶段的 p50 / p95 / p99 汇总（托盘菜单里可以直接看）
+"""
+
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+
+# 阶段名
+STAGE_FOREGROUND = "foreground"   # 前台窗口 / 进程 / 焦点
+STAGE_CLIPBOARD = "clipboard"     # 读剪贴板
+STAGE_COM = "com"                 # Explorer Shell 查询
+STAGE_CLASSIFY = "classify"       # 命令 / 文件名判断、AI 解析、菜单变换
+STAGE_ACTION = "action"           # 写文件 / 建文件 / 开 cmd / 弹菜单
+STAGE_INJECT = "inject"           # 模拟按键
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        tracer = self.tracer
+        local = tracer._local
+        tracer._record((self.name, getattr(local, "invocation", None), getattr(local, "trace_id", 0),
+                        self.start, end - self.start, threading.get_ident()))
+        return False
+
+
+class _Invocation(_Span):
+    """最外层 span：给当前线程设上 trace_id，嵌套调用（AI 粘贴回退到 Ctrl+V）只算普通 span"""
+
+    __slots__ = ("nested",)
+
+    def __enter__(self):
+        local = self.tracer._local
+        self.nested = getattr(local, "invocation", None) is not None
+        if not self.nested:
+            local.invocation = self.name
+            local.trace_id = next(self.tracer._ids)
+        return _Span.__enter__(self)
+
+    def __exit__(self, exc_type, exc, tb):
+        _Span.__exit__(self, exc_type, exc, tb)
+        if not self.nested:
+            self.tracer._local.invocation = None
+            self.tracer._local.trace_id = 0
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _percentile(data, p):
+    """data 已排序；和菜单耗时统计一样取最近的秩"""
+    return data[min(len(data) - 1, int(round(p / 100.0 * (len(data) - 1))))]
+
+
+class Tracer:
+    """
+    记录格式：(span 名, invocation 名, trace_id, 开始 ns, 耗时 ns, 线程 id)
+    invocation 自身也记一条（span 名 == invocation 名），用来看整次热键的总耗时
+    """
+
+    def __init__(self, capacity=4096, enabled=True):
+        self.enabled = enabled
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self._reset(capacity)
+
+    def _reset(self, capacity):
+        self.capacity = max(16, int(capacity))
+        self._slots = [None] * self.capacity
+        self._counter = itertools.count()
+
+    def configure(self, enabled=True, capacity=None):
+        self.enabled = bool(enabled)
+        if capacity is not None and int(capacity) != self.capacity:
+            self._reset(capacity)
+
+    def clear(self):
+        self._reset(self.capacity)
+
+    # ---------- 记录 ----------
+    def _record(self, rec):
+        self._slots[next(self._counter) % self.capacity] = rec
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def invocation(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Invocation(self, name)
+
+    def traced(self, name):
+        """装饰器：整个函数算一次 invocation"""
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.invocation(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    # ---------- 导出 ----------
+    def records(self):
+        """缓冲区里现存的记录，按开始时间排序"""
+        return sorted((r for r in list(self._slots) if r is not None), key=lambda r: r[3])
+
+    def summary(self) -> dict:
+        """{"invocation/span": {"n", "p50_ms", "p95_ms", "p99_ms", "max_ms"}}"""
+        groups = {}
+        for name, inv, _tid, _start, dur, _thread in self.records():
+            key = name if inv is None or name == inv else f"{inv}/{name}"
+            groups.setdefault(key, []).append(dur)
+
+        out = {}
+        for key in sorted(groups):
+            data = sorted(groups[key])
+            out[key] = {
+                "n": len(data),
+                "p50_ms": _percentile(data, 50) / 1e6,
+                "p95_ms": _percentile(data, 95) / 1e6,
+                "p99_ms": _percentile(data, 99) / 1e6,
+                "max_ms": data[-1] / 1e6,
+            }
+        return out
+
+    def format_summary(self) -> str:
+        summary = self.summary()
+        if not summary:
+            return "（还没有记录）"
+        width = max(len(k) for k in summary)
+        lines = [f"{'stage':<{width}}  {'n':>5}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'max':>8}  (ms)"]
+        for key, s in summary.items():
+            lines.append(f"{key:<{width}}  {s['n']:>5}  {s['p50_ms']:>8.2f}  {s['p95_ms']:>8.2f}"
+                         f"  {s['p99_ms']:>8.2f}  {s['max_ms']:>8.2f}")
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> dict:
+        """Chrome trace event format（"X" 完整事件，时间单位微秒）"""
+        pid = os.getpid()
+        events = []
+        for name, inv, trace_id, start, dur, thread in self.records():
+            events.append({
+                "name": name,
+                "cat": inv or "span",
+                "ph": "X",
+                "ts": start / 1000.0,
+                "dur": dur / 1000.0,
+                "pid": pid,
+                "tid": thread,
+                "args": {"trace_id": trace_id},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def dump_chrome_trace(self, path) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+# 全进程共用一个
+TRACER = Tracer()
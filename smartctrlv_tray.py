@@ -12,11 +12,16 @@ import os
 import sys
 import json
 import threading
+import time
 import locale
 import traceback
 from PIL import Image
 import pystray
 from pystray import MenuItem as item
+from smartctrlv_fileio import write_text_atomic
+from smartctrlv_log import get_logger
+
+log = get_logger("Tray")
 
 # Windows 开机自启动
 try:
@@ -47,7 +52,8 @@ def resource_path(relative_path: str) -> str:
 
 SCRIPT_DIR = get_base_dir()
 CONFIG_PATH = os.path.join(SCRIPT_DIR, "smartctrlv_config.json")
-LOG_DIR = SCRIPT_DIR
+# 和后台共用一个日志目录（smartctrlv_main 在这里写 smartctrlv.log）
+LOG_DIR = smartctrlv_main.LOG_DIR
 
 # ===================== 多语言字典 =====================
 I18N = {
@@ -60,6 +66,10 @@ I18N = {
         "menu_open_settings": "打开设置...",
         "menu_open_config": "打开配置文件",
         "menu_open_logs": "打开日志目录",
+        "menu_trace": "延迟统计",
+        "menu_trace_summary": "查看各阶段耗时 (p50/p95/p99)",
+        "menu_trace_export": "导出 Chrome trace 到日志目录",
+        "trace_title": f"{APP_NAME} 热键各阶段耗时",
         "menu_autostart": "开机自启动",
         "menu_restart_core": "重启后台进程",
         "menu_quit": "退出",
@@ -115,6 +125,10 @@ I18N = {
         "menu_open_settings": "設定を開く...",
         "menu_open_config": "設定ファイルを開く",
         "menu_open_logs": "ログフォルダを開く",
+        "menu_trace": "レイテンシ統計",
+        "menu_trace_summary": "各段階の所要時間 (p50/p95/p99)",
+        "menu_trace_export": "Chrome trace をログフォルダに出力",
+        "trace_title": f"{APP_NAME} ホットキー各段階の所要時間",
         "menu_autostart": "Windows 起動時に自動起動",
         "menu_restart_core": "バックグラウンドを再起動",
         "menu_quit": "終了",
@@ -170,6 +184,10 @@ I18N = {
         "menu_open_settings": "Open settings...",
         "menu_open_config": "Open config file",
         "menu_open_logs": "Open log directory",
+        "menu_trace": "Latency",
+        "menu_trace_summary": "Per-stage latency (p50/p95/p99)",
+        "menu_trace_export": "Export Chrome trace to log directory",
+        "trace_title": f"{APP_NAME} hotkey stage latency",
         "menu_autostart": "Run at system startup",
         "menu_restart_core": "Restart backend",
         "menu_quit": "Quit",
@@ -302,7 +320,7 @@ class ConfigManager:
                     user_cfg = json.load(f)
                 deep_update(cfg, user_cfg)
             except Exception as e:
-                print("[Tray] 读取配置失败:", e)
+                log.error("读取配置失败: %s", e)
         else:
             self.save(cfg)
         return cfg
@@ -311,10 +329,9 @@ class ConfigManager:
         if cfg is None:
             cfg = self.config
         try:
-            with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-                json.dump(cfg, f, indent=2, ensure_ascii=False)
+            write_text_atomic(CONFIG_PATH, json.dumps(cfg, indent=2, ensure_ascii=False), errors="strict")
         except Exception as e:
-            print("[Tray] 写入配置失败:", e)
+            log.error("写入配置失败: %s", e)
 
     def reload(self):
         self.config = self.load_or_create()
@@ -487,6 +504,36 @@ def show_status_window(config: dict, lang: str):
     win.mainloop()
 
 
+def show_trace_window(lang: str):
+    """各阶段耗时汇总（等宽字体，方便对齐）"""
+    import tkinter as tk
+    from tkinter import ttk
+
+    win = tk.Tk()
+    win.title(tr(lang, "trace_title"))
+    win.resizable(True, True)
+
+    frame = ttk.Frame(win, padding=15)
+    frame.pack(fill=tk.BOTH, expand=True)
+
+    text = smartctrlv_main.TRACER.format_summary()
+    lbl = tk.Label(frame, text=text, font=("Consolas", 10), justify=tk.LEFT, anchor="nw")
+    lbl.pack(fill=tk.BOTH, expand=True)
+
+    btn = ttk.Button(frame, text=tr(lang, "btn_ok"), command=win.destroy)
+    btn.pack(pady=10)
+
+    win.mainloop()
+
+
+def export_trace() -> str:
+    """把环形缓冲区里的记录导出成 Chrome trace JSON，返回文件路径"""
+    name = time.strftime("smartctrlv_trace_%Y%m%d_%H%M%S.json")
+    path = smartctrlv_main.TRACER.dump_chrome_trace(os.path.join(LOG_DIR, name))
+    log.info("trace 已导出: %s", path)
+    return path
+
+
 # ===================== 开机自启动 =====================
 def is_autostart_enabled() -> bool:
     if winreg is None or os.name != "nt":
@@ -523,7 +570,7 @@ def set_autostart_enabled(enabled: bool):
                 except FileNotFoundError:
                     pass
     except Exception as e:
-        print("[Tray] 设置开机自启动失败:", e)
+        log.error("设置开机自启动失败: %s", e)
 
 
 # ===================== 托盘应用 =====================
@@ -588,6 +635,18 @@ class TrayApp:
             if os.path.isdir(LOG_DIR):
                 os.startfile(LOG_DIR)
 
+        def show_trace(icon, item):
+            threading.Thread(target=lambda: show_trace_window(self.lang), daemon=True).start()
+
+        def dump_trace(icon, item):
+            try:
+                export_trace()
+            except Exception as e:
+                log.error("导出 trace 失败: %s", e)
+                return
+            if os.path.isdir(LOG_DIR):
+                os.startfile(LOG_DIR)
+
         def show_status(icon, item):
             threading.Thread(target=lambda: show_status_window(cfg, self.lang), daemon=True).start()
 
@@ -613,6 +672,10 @@ class TrayApp:
             item(tr(self.lang, "menu_open_settings"), open_settings),
             item(tr(self.lang, "menu_open_config"), open_config),
             item(tr(self.lang, "menu_open_logs"), open_logs),
+            item(tr(self.lang, "menu_trace"), pystray.Menu(
+                item(tr(self.lang, "menu_trace_summary"), show_trace),
+                item(tr(self.lang, "menu_trace_export"), dump_trace),
+            )),
             pystray.Menu.SEPARATOR,
             item(tr(self.lang, "menu_language"), pystray.Menu(
                 item(tr(self.lang, "menu_lang_auto"), set_lang("auto"),
@@ -653,7 +716,7 @@ class TrayApp:
             return
         self.backend_running = True
         threading.Thread(target=smartctrlv_main.main, daemon=True).start()
-        print("[Tray] 后台已启动")
+        log.info("后台已启动")
 
     def stop_backend(self):
         if not self.backend_running:
@@ -663,7 +726,7 @@ class TrayApp:
         except Exception:
             pass
         self.backend_running = False
-        print("[Tray] 后台已停止")
+        log.info("后台已停止")
 
     def restart_backend(self):
         try:
@@ -674,7 +737,7 @@ class TrayApp:
             smartctrlv_main.start_hooks()
         except Exception:
             pass
-        print("[Tray] 后台已重启")
+        log.info("后台已重启")
 
     def run(self):
         self.start_backend()
@@ -684,8 +747,14 @@ class TrayApp:
             tr(self.lang, "tray_tooltip"),
             self.get_menu()
         )
+        # 批量建文件等操作的汇总结果用托盘气泡通知
+        smartctrlv_main.get_backend().notifier = self.notify
         self.icon.run()
 
+    def notify(self, title, message):
+        if self.icon:
+            self.icon.notify(message, title)
+
 
 def main():
     app = TrayApp()
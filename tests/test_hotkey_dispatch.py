@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Ctrl+V 热键回调（suppress，在键盘钩子里同步调用）：钩子里只入队，原生粘贴在 router 线程里注入"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smartctrlv_log  # noqa: E402
+import smartctrlv_main as m  # noqa: E402
+from smartctrlv_backend import FakeBackend, set_backend  # noqa: E402
+
+
+class RecordingBackend(FakeBackend):
+    """记下每次注入按键时所在的线程和 is_simulating"""
+
+    def __init__(self):
+        super().__init__()
+        self.sends = []
+
+    def send_keys(self, combo):
+        self.sends.append((combo, threading.get_ident(), m.is_simulating))
+        super().send_keys(combo)
+
+
+@pytest.fixture
+def backend():
+    smartctrlv_log.configure(to_file=False, console=False)
+    backend = RecordingBackend()
+    old = set_backend(backend)
+    m.start_dispatcher()
+    yield backend
+    m.stop_dispatcher()
+    set_backend(old)
+
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_native_paste_is_injected_off_the_hook_thread(backend):
+    backend.set_foreground(100, r"C:\Windows\notepad.exe")
+    hook_thread = threading.get_ident()
+
+    for _ in range(5):
+        m.on_ctrl_v_hotkey()
+        time.sleep(0.03)
+
+    assert wait_for(lambda: len(backend.sends) == 5)
+    assert all(combo == "ctrl+v" for combo, _, _ in backend.sends)
+    assert all(thread != hook_thread for _, thread, _ in backend.sends)
+    assert all(simulating for _, _, simulating in backend.sends)
+    assert m.is_simulating is False
+
+
+def test_coalesced_explorer_presses_fall_back_off_the_hook_thread(backend, monkeypatch):
+    backend.set_foreground(200, r"C:\Windows\explorer.exe")
+    release = threading.Event()
+    monkeypatch.setattr(m, "on_ctrl_v_explorer", lambda ctx=None: release.wait(2))
+    hook_thread = threading.get_ident()
+
+    for _ in range(3):
+        m.on_ctrl_v_hotkey()
+        time.sleep(0.03)
+
+    assert wait_for(lambda: len(backend.sends) == 2)
+    assert all(thread != hook_thread and simulating for _, thread, simulating in backend.sends)
+    release.set()
+
+
+def test_menu_hotkey_double_press_does_not_paste(backend, monkeypatch):
+    monkeypatch.setattr(m, "on_hotkey_menu", lambda: time.sleep(0.05))
+
+    m.dispatch_hotkey("menu", m.on_hotkey_menu, fallback=None)
+    m.dispatch_hotkey("menu", m.on_hotkey_menu, fallback=None)
+    time.sleep(0.1)
+
+    assert backend.sends == []
+    assert m.get_dispatch_stats()["coalesced"] == 1
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Explorer 里 Ctrl+V 粘贴一份比前缀采样还大的动作计划（FakeBackend 无头驱动）"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import smartctrlv_log  # noqa: E402
+import smartctrlv_main as m  # noqa: E402
+from smartctrlv_backend import ANSWER_YES, FakeBackend, set_backend  # noqa: E402
+
+
+@pytest.fixture
+def explorer(tmp_path):
+    smartctrlv_log.configure(to_file=False, console=False)
+    backend = FakeBackend()
+    backend.default_answer = ANSWER_YES
+    old = set_backend(backend)
+    backend.open_explorer(0x1001, str(tmp_path))
+    m.CLIPBOARD_CACHE.clear()
+    yield backend
+    set_backend(old)
+    m.CLIPBOARD_CACHE.clear()
+
+
+def scaffold_plan(n_files):
+    actions = [
+        {"type": "create_file", "path": f"pkg{i % 10}/mod_{i}.py", "content": f"VALUE = {i}\n" * 5}
+        for i in range(n_files)
+    ]
+    actions.append({"type": "run_command", "command": "python -m compileall -q ."})
+    return json.dumps({"actions": actions}, indent=2)
+
+
+@pytest.mark.parametrize("n_files", [3, 60, 200])
+def test_plan_larger_than_sample_runs_from_hotkey(explorer, tmp_path, n_files):
+    text = scaffold_plan(n_files)
+    if n_files > 3:
+        assert len(text) > m.CONFIG["explorer"]["sample_chars"]
+    explorer.clipboard_text = text
+
+    m.on_ctrl_v_explorer()
+
+    created = [p for p in tmp_path.rglob("*.py")]
+    assert len(created) == n_files
+    assert (tmp_path / "pkg0" / "mod_0.py").read_text(encoding="utf-8") == "VALUE = 0\n" * 5
+    assert explorer.console_commands == [(str(tmp_path), "python -m compileall -q .")]
+    assert len(explorer.message_boxes) == 1
+    assert explorer.notifications and "计划已执行" in explorer.notifications[-1][1]
+
+
+def test_large_non_plan_text_is_still_rejected_by_sample(explorer, tmp_path):
+    explorer.clipboard_text = "\n".join(f"some log line {i} with spaces and (stuff)" for i in range(2000))
+
+    m.on_ctrl_v_explorer()
+
+    assert list(tmp_path.iterdir()) == []
+    assert explorer.message_boxes == []